@@ -0,0 +1,3 @@
+"""
+Benchmarks of the simulation on synthetic plans. Run them with python -m benchmarks.run --help.
+"""
@@ -0,0 +1,62 @@
+"""
+Checks that importing lifechoices stays cheap.
+
+    python -m benchmarks.imports --budget-ms 150
+
+Imports lifechoices in fresh interpreters and keeps the best of --repeat runs,
+less the time numpy takes to import, which it cannot do without.
+It exits with 1 if that is over the budget, or if importing lifechoices
+imported pandas or a plotting library, which should only load when they are used.
+"""
+from typing import Optional, Sequence, Set, Tuple
+import argparse
+import os
+import subprocess
+import sys
+
+FORBIDDEN = ("pandas", "matplotlib", "plotly", "dash")
+
+_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(" ".join(sorted(sys.modules)))
+"""
+
+
+def import_time(module: str, repeat: int) -> Tuple[float, Set[str]]:
+    """ The best time importing module took in repeat new interpreters, and the modules it left imported. """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best, modules = float("inf"), set()
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _SCRIPT.format(module=module)],
+                             cwd=root, capture_output=True, text=True, check=True).stdout.splitlines()
+        best, modules = min(best, float(out[0])), set(out[1].split())
+    return best, modules
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Checks how long importing lifechoices takes.")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="the most importing lifechoices may take on top of numpy")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters to import in, the best one is kept")
+    args = parser.parse_args(argv)
+
+    numpy_seconds, _ = import_time("numpy", args.repeat)
+    seconds, modules = import_time("lifechoices", args.repeat)
+    own_ms = 1000 * (seconds - numpy_seconds)
+    print(f"import lifechoices {1000 * seconds:.1f}ms, {own_ms:.1f}ms on top of numpy, budget {args.budget_ms:.1f}ms")
+
+    failed = False
+    imported = [name for name in FORBIDDEN if name in modules]
+    if imported:
+        print(f"import lifechoices imported {', '.join(imported)}")
+        failed = True
+    if own_ms > args.budget_ms:
+        print(f"import lifechoices is {own_ms - args.budget_ms:.1f}ms over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
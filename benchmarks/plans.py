@@ -0,0 +1,88 @@
+"""
+Synthetic plans of any size for the benchmarks.
+
+Every plan is made from a seed, so the same arguments always give the same plan.
+Transfers cycle through every Transfer subclass, and bridges are spread over the horizon.
+"""
+from typing import List, Tuple
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+import random
+
+from lifechoices.classes import (
+    APR, Period, Account, Plan, Bridge, DateBridge, CallbackBridge,
+    Once, Daily, Weekly, BiWeekly, Monthly, Yearly, NYearly,
+)
+
+FROM_DATE = datetime(2020, 1, 1)
+
+TRANSFER_TYPES = (Once, Daily, Weekly, BiWeekly, Monthly, Yearly, NYearly)
+
+
+@dataclass(frozen=True)
+class PlanSize:
+    """ How big a synthetic plan is. """
+    accounts: int
+    transfers: int
+    years: int
+    date_bridges: int = 0
+    callback_bridges: int = 0
+
+    @property
+    def name(self) -> str:
+        return f"a{self.accounts}-t{self.transfers}-y{self.years}-d{self.date_bridges}-c{self.callback_bridges}"
+
+
+def _apr(rnd: random.Random) -> APR:
+    return APR(rnd.uniform(-0.02, 0.08), rnd.choice([Period.DAILY, Period.MONTHLY, Period.YEARLY]))
+
+
+def _transfer(k: int, names: List[str], years: int, rnd: random.Random):
+    """ The k-th transfer of a plan, of the k-th transfer type in turn. """
+    kind = TRANSFER_TYPES[k % len(TRANSFER_TYPES)]
+    to_account = rnd.choice(names)
+    from_account = rnd.choice([None] + [n for n in names if n != to_account])
+    name, amount = f"Transfer{k}", rnd.uniform(-500, 1000)
+    if kind is Once:
+        return Once(name, amount, to_account, from_account, date=FROM_DATE + timedelta(days=rnd.randrange(1, 365 * years + 1)))
+    if kind is Daily:
+        return Daily(name, amount / 30, to_account, from_account, APR=_apr(rnd))
+    if kind is Weekly:
+        return Weekly(name, amount, to_account, from_account, dayOfWeek=rnd.randrange(7), APR=_apr(rnd))
+    if kind is BiWeekly:
+        return BiWeekly(name, amount, to_account, from_account, dayOfWeek=rnd.randrange(7), weekOffset=rnd.randrange(2), APR=_apr(rnd))
+    if kind is Monthly:
+        return Monthly(name, amount, to_account, from_account, dayOfMonth=rnd.randint(1, 28), APR=_apr(rnd))
+    if kind is Yearly:
+        return Yearly(name, amount, to_account, from_account, month=rnd.randint(1, 12), dayOfMonth=rnd.randint(1, 28), APR=_apr(rnd))
+    return NYearly(name, amount, to_account, from_account, nyears=rnd.randint(2, 5), month=rnd.randint(1, 12),
+                   dayOfMonth=rnd.randint(1, 28), firstYear=FROM_DATE.year + rnd.randrange(5), APR=_apr(rnd))
+
+
+def _raise_amounts(plan: Plan) -> Plan:
+    """ A bridge function, like a raise: every tenth transfer moves 1% more from then on. """
+    transfers = [replace(t, amount=t.amount * 1.01) if k % 10 == 0 else t for k, t in enumerate(plan.transfers)]
+    return Plan(plan.accounts, transfers)
+
+
+def _never(data) -> bool:
+    """ A callback that is asked about every day and never activates, which is what most of them cost. """
+    return data.get("Account0", 0.0) > 1e300
+
+
+def synthetic_plan(size: PlanSize, seed: int = 0) -> Tuple[Plan, List[Bridge], datetime, datetime]:
+    """ A starting plan, its bridges, and the dates to simulate it between. """
+    rnd = random.Random(seed)
+    names = [f"Account{i}" for i in range(size.accounts)]
+    accounts = [Account(name, rnd.uniform(0, 10000), _apr(rnd), FROM_DATE) for name in names]
+    transfers = [_transfer(k, names, size.years, rnd) for k in range(size.transfers)]
+    to_date = FROM_DATE + timedelta(days=365 * size.years)
+
+    # Date bridges on different days, so no two activate together
+    days = 365 * size.years
+    bridges: List[Bridge] = [
+        DateBridge(f"DateBridge{i}", _raise_amounts, FROM_DATE + timedelta(days=(i + 1) * days // (size.date_bridges + 1)))
+        for i in range(size.date_bridges)
+    ]
+    bridges += [CallbackBridge(f"CallbackBridge{i}", _raise_amounts, _never) for i in range(size.callback_bridges)]
+    return Plan(accounts, transfers), bridges, FROM_DATE, to_date
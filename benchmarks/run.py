@@ -0,0 +1,157 @@
+"""
+Times the simulation on synthetic plans and checks it against an earlier run.
+
+    python -m benchmarks.run --suite quick --save baseline.json
+    python -m benchmarks.run --suite quick --compare baseline.json
+
+Every case times _generate_from_plan, plot_accounts with wide and tall data on each engine,
+and wide_to_tall on the wide data, recording the best wall time of --repeat runs
+and the peak memory tracemalloc sees in one more run. With --compare it exits with 1
+if anything got slower or bigger than the baseline by more than the tolerance.
+It only needs lifechoices itself, never dash or plotly.
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from dataclasses import dataclass
+import argparse
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from lifechoices.main import plot_accounts, wide_to_tall
+from lifechoices.schedule import _generate_from_plan
+from benchmarks.plans import PlanSize, synthetic_plan
+
+
+@dataclass(frozen=True)
+class Case:
+    """ A plan size and what to run on it. The loop engine is left out of the biggest plan. """
+    size: PlanSize
+    engines: Tuple[str, ...] = ("loop", "vectorized", "events")
+    resolution: str = "daily"
+
+    @property
+    def name(self) -> str:
+        return f"{self.size.name}-{self.resolution}"
+
+
+SUITES: Dict[str, List[Case]] = {
+    "quick": [
+        Case(PlanSize(1, 1, 1)),
+        Case(PlanSize(1, 7, 1, 1, 1)),
+        Case(PlanSize(10, 100, 10, 5, 5)),
+    ],
+}
+SUITES["full"] = SUITES["quick"] + [
+    Case(PlanSize(50, 1000, 30, 20, 20)),
+    Case(PlanSize(10, 100, 30, 200, 200)),
+    Case(PlanSize(100, 2000, 50, 50, 50)),
+    # Every day of it would be 18 million rows
+    Case(PlanSize(500, 5000, 100, 20, 20), engines=("vectorized", "events"), resolution="month-end"),
+]
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """ The best wall time of repeat calls of fn, and the peak memory of one more call. """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "peak_bytes": peak}
+
+
+def run_case(case: Case, repeat: int) -> Dict[str, Dict[str, float]]:
+    """ The measurements of one case, keyed by case/what was run. """
+    plan, bridges, from_date, to_date = synthetic_plan(case.size)
+    results = {f"{case.name}/generate_from_plan": measure(lambda: _generate_from_plan(plan), repeat)}
+    # Bridges print when they activate
+    with redirect_stdout(io.StringIO()):
+        for engine in case.engines:
+            for shape, tall_data in (("wide", False), ("tall", True)):
+                results[f"{case.name}/plot_accounts-{shape}/{engine}"] = measure(
+                    lambda: plot_accounts(plan, bridges, from_date, to_date, tall_data, engine, case.resolution), repeat)
+        wide = plot_accounts(plan, bridges, from_date, to_date, False, case.engines[-1], case.resolution)
+    results[f"{case.name}/wide_to_tall"] = measure(lambda: wide_to_tall(wide), repeat)
+    return results
+
+
+def compare(
+        baseline: Dict[str, Dict[str, float]],
+        current: Dict[str, Dict[str, float]],
+        tolerance: float,
+        memory_tolerance: float,
+        min_seconds: float,
+) -> List[str]:
+    """
+    The measurements that got worse than the baseline by more than the tolerances, as messages.
+    Times within min_seconds of the baseline are never a regression, they are mostly noise.
+    """
+    regressions = []
+    for key in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[key], current[key]
+        if new["seconds"] > old["seconds"] * (1 + tolerance) and new["seconds"] - old["seconds"] > min_seconds:
+            regressions.append(f"{key}: {old['seconds']:.4f}s -> {new['seconds']:.4f}s")
+        if new["peak_bytes"] > old["peak_bytes"] * (1 + memory_tolerance):
+            regressions.append(f"{key}: {old['peak_bytes'] / 1e6:.2f}MB -> {new['peak_bytes'] / 1e6:.2f}MB")
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks lifechoices on synthetic plans.")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per measurement, the best one is kept")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a JSON file from --save to check the results against")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="how much slower is a regression, 0.5 is 50%%")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="how much more peak memory is a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.02, help="time differences smaller than this are ignored")
+    args = parser.parse_args(argv)
+
+    results: Dict[str, Dict[str, float]] = {}
+    for case in SUITES[args.suite]:
+        for key, value in run_case(case, args.repeat).items():
+            results[key] = value
+            print(f"{key:<70} {value['seconds']:>10.4f}s {value['peak_bytes'] / 1e6:>10.2f}MB", flush=True)
+
+    imported = [name for name in ("dash", "plotly") if name in sys.modules]
+    if imported:
+        print(f"The benchmarks imported {', '.join(imported)}, they have to run without them.")
+        return 1
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "suite": args.suite,
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(baseline, results, args.tolerance, args.memory_tolerance, args.min_seconds)
+        if regressions:
+            print(f"{len(regressions)} regressions against {args.compare}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions against {args.compare}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
 from lifechoices import *
 from datetime import datetime
+from dataclasses import replace
+from concurrent.futures import CancelledError
+import uuid
 import pandas as pd
 
 # First we will create some constants
@@ -38,9 +41,9 @@ Transfers_Old = [Monthly("Savings", -1000, "Checkings"),
 # This bridge moves all the money in our current plan's account, and puts it in our old person savings account.
 # All bridges do is take a plan and output a new plan. They activate on a date.
 def retirement_bridge(p: Plan) -> Plan:
-    Accounts_Old[0].amount = p.accounts[0].amount
+    # Accounts are frozen, so we make a new one holding the money instead of changing the old one
     return Plan(
-        accounts=Accounts_Old,
+        accounts=[replace(Accounts_Old[0], amount=p.accounts[0].amount)] + Accounts_Old[1:],
         transfers=Transfers_Old
     )
 
@@ -51,10 +54,18 @@ Bridges = [
     DateBridge("Retirement", retirement_bridge, RETIREMENT_DATE)
 ]
 
+# Freezing the plan and its bridges lets us cache its simulations while we play with the dates
+Compiled_Plan = CompiledPlan.compile(Starting_Plan, Bridges)
+
+# Dragging the dates fires many callbacks at once, the service simulates them off the request threads
+# and cancels the ones a newer date range replaced
+Service = ServiceThread()
+
 
 # And now we plot!
 # Just to be fancy, we will use plotly dash
 import dash
+import dash.exceptions
 import dash_html_components as html
 import dash_core_components as dcc
 import plotly.express as px
@@ -62,33 +73,49 @@ import plotly.express as px
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
-app.layout = html.Div([
-    dcc.DatePickerRange(
-        id='date-picker',
-        min_date_allowed=datetime(1995, 8, 5),
-        max_date_allowed=datetime(2100, 8, 5),
-        initial_visible_month=datetime.now(),
-        start_date=strip_date_timestamp(datetime.now()),
-        end_date=strip_date_timestamp(datetime.now()+timedelta(days=50*365))
-    ),
-    dcc.Graph(id='my-plot')
-])
+
+
+# The layout is a function so every page load gets an id of its own, and the service only cancels
+# the callbacks of the same browser tab when new dates come in, never the ones of other users
+def layout():
+    return html.Div([
+        dcc.DatePickerRange(
+            id='date-picker',
+            min_date_allowed=datetime(1995, 8, 5),
+            max_date_allowed=datetime(2100, 8, 5),
+            initial_visible_month=datetime.now(),
+            start_date=strip_date_timestamp(datetime.now()),
+            end_date=strip_date_timestamp(datetime.now()+timedelta(days=50*365))
+        ),
+        dcc.Graph(id='my-plot'),
+        dcc.Store(id='session-id', data=str(uuid.uuid4())),
+    ])
+
+
+app.layout = layout
+
 
 @app.callback(
     dash.dependencies.Output('my-plot', 'figure'),
     [dash.dependencies.Input('date-picker', 'start_date'),
-     dash.dependencies.Input('date-picker', 'end_date')])
-def plot(start_date: str, end_date: str):
+     dash.dependencies.Input('date-picker', 'end_date')],
+    [dash.dependencies.State('session-id', 'data')])
+def plot(start_date: str, end_date: str, session_id: str):
     start_date = datetime.strptime(start_date.split('T')[0], '%Y-%m-%d')
     end_date = datetime.strptime(end_date.split('T')[0], '%Y-%m-%d')
-    data = plot_accounts(
-        starting_plan=Starting_Plan,
-        bridges=Bridges,
-        from_date=start_date,
-        to_date=end_date,
-        tall_data=True
-    )
-    df = pd.DataFrame(data)
+    # Moving only the end date back is a slice of the last simulation, not a new one
+    try:
+        result = Service.simulate(
+            Compiled_Plan,
+            from_date=start_date,
+            to_date=end_date,
+            session=session_id,
+        )
+    except CancelledError:
+        # The user already picked other dates, which another callback is plotting
+        raise dash.exceptions.PreventUpdate
+    # A few thousand points look the same as every day, and are much quicker to send and draw
+    df = downsample(result, n_points=1000).to_pandas(tall=True).dropna()
     fig = px.line(df, x="Date", color="Account", y="Value")
     return fig
 
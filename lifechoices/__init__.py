@@ -1,3 +1,21 @@
 from lifechoices.main import *
 from lifechoices.classes import *
 from lifechoices.utils import *
+from lifechoices.engine import *
+from lifechoices.growth import *
+from lifechoices.resolution import *
+from lifechoices.result import *
+from lifechoices.montecarlo import *
+from lifechoices.scenarios import *
+from lifechoices.cache import *
+from lifechoices.recurrence import *
+from lifechoices.checkpoint import *
+from lifechoices.instrumentation import *
+from lifechoices.state import *
+from lifechoices.calendar import *
+from lifechoices.downsampling import *
+from lifechoices.solver import *
+from lifechoices.serialize import *
+from lifechoices.store import *
+from lifechoices.ledger import *
+from lifechoices.service import *
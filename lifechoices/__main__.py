@@ -0,0 +1,10 @@
+"""
+Simulates plan modules in a batch and writes their balances to files, see python -m lifechoices --help
+and lifechoices.batch.
+"""
+import sys
+
+from lifechoices.batch import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Simulating many plan modules in one batch, without the Dash app.
+
+    python -m lifechoices plans/ --out results/ --format parquet --resolution month-end --workers 8
+
+A plan module is a python file like example_transactions.py that defines Starting_Plan and, if it has any, Bridges,
+or a plan saved with lifechoices.serialize.save_plan.
+Every module is loaded and simulated in a worker process, and its balances are written to <out>/<name>.csv
+or <out>/<name>.parquet as tall Date, Account, Value rows, one stretch of the simulation at a time,
+so a worker holds no more than a few years of one plan in memory however long the simulation runs.
+Writing Parquet needs pyarrow, which is only imported when it is asked for.
+When every plan is done, <out>/summary.csv has a row per plan with how long it took,
+how much it wrote, and the error if it failed.
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple
+from dataclasses import dataclass, fields, astuple
+from datetime import datetime, timedelta
+import argparse
+import csv
+import fnmatch
+import importlib.util
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+
+import numpy as np
+
+from lifechoices.classes import Bridge, Plan
+from lifechoices.engine import _iter_blocks
+from lifechoices.resolution import as_resolution
+from lifechoices.serialize import read_plan
+from lifechoices.utils import strip_date_timestamp
+
+FORMATS = ("csv", "parquet")
+
+
+@dataclass(frozen=True)
+class BatchOptions:
+    """ What every plan of a batch is simulated over, and where and how its balances are written. """
+    from_date: datetime
+    to_date: datetime
+    out: str = "."
+    format: str = "csv"
+    engine: str = "events"
+    resolution: str = "daily"
+
+
+@dataclass(frozen=True)
+class PlanSummary:
+    """ How simulating one plan module went. """
+    plan: str
+    path: str
+    status: str  # "ok" or "failed"
+    seconds: float  # loading, simulating and writing
+    dates: int = 0
+    values: int = 0  # rows written, a value per account per date
+    output: str = ""
+    error: str = ""
+
+
+def load_plan(path: str) -> Tuple[Plan, List[Bridge]]:
+    """
+    The Starting_Plan and Bridges of a plan module. A module without Bridges has none.
+    A .json or .lcplan file is a plan lifechoices.serialize.save_plan wrote, which is read without running any python.
+    """
+    if path.endswith((".json", ".lcplan")):
+        return read_plan(path)
+    name = "_lifechoices_plan_" + os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    if spec is None or spec.loader is None:
+        raise ValueError(f"{path} is not a python module.")
+    module = importlib.util.module_from_spec(spec)
+    # Plan modules may import the modules next to them
+    directory = os.path.dirname(os.path.abspath(path))
+    sys.path.insert(0, directory)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.modules.pop(name, None)
+        sys.path.remove(directory)
+    if not hasattr(module, "Starting_Plan"):
+        raise ValueError(f"{path} does not define Starting_Plan.")
+    return module.Starting_Plan, list(getattr(module, "Bridges", []))
+
+
+def find_plans(paths: Iterable[str], pattern: str = "*transactions.py") -> List[str]:
+    """ The files in paths, and the files matching pattern in the directories in paths and below them, sorted. """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found += [os.path.join(root, f) for f in files if fnmatch.fnmatch(f, pattern)]
+        elif os.path.isfile(path):
+            found.append(path)
+        else:
+            raise ValueError(f"{path} is not a file or a directory.")
+    return sorted(dict.fromkeys(found))
+
+
+def plan_names(paths: Sequence[str]) -> List[str]:
+    """
+    A name for the output of each plan module, from its path below the directory all of them are in,
+    so that many users' transactions.py files get different names.
+    """
+    if not paths:
+        return []
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    return [os.path.splitext(os.path.relpath(os.path.abspath(p), base))[0].replace(os.sep, "-") for p in paths]
+
+
+class _CsvWriter:
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(["Date", "Account", "Value"])
+
+    def write(self, dates: np.ndarray, names: List[str], values: np.ndarray):
+        days = np.datetime_as_string(dates, unit="D").tolist()
+        self._csv.writerows(zip(np.repeat(days, len(names)).tolist(), names * len(days), values.reshape(-1).tolist()))
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Writing Parquet needs pyarrow, install it or use --format csv.") from e
+        self._pa = pa
+        self._schema = pa.schema([("Date", pa.timestamp("us")), ("Account", pa.string()), ("Value", pa.float64())])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, dates: np.ndarray, names: List[str], values: np.ndarray):
+        pa = self._pa
+        self._writer.write_table(pa.table({
+            "Date": pa.array(np.repeat(dates.astype("datetime64[us]"), len(names)), pa.timestamp("us")),
+            "Account": pa.array(names * len(dates), pa.string()),
+            "Value": pa.array(values.reshape(-1), pa.float64()),
+        }, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def simulate_to_file(path: str, name: str, options: BatchOptions) -> PlanSummary:
+    """ Loads a plan module and writes its balances to options.out, never raising but reporting what failed. """
+    start = perf_counter()
+    output = os.path.join(options.out, f"{name}.{options.format}")
+    n_dates = n_values = 0
+    writer = None
+    try:
+        plan, bridges = load_plan(path)
+        resolution = as_resolution(options.resolution, options.from_date)
+        writer = _ParquetWriter(output) if options.format == "parquet" else _CsvWriter(output)
+        # Bridges print when they activate, which from hundreds of plans at once is only noise
+        with redirect_stdout(io.StringIO()):
+            for dates, names, values in _iter_blocks(plan, bridges, options.from_date, options.to_date, resolution,
+                                                     events=options.engine == "events"):
+                if len(dates):
+                    writer.write(dates, names, values)
+                    n_dates += len(dates)
+                    n_values += values.size
+    except Exception as e:
+        return PlanSummary(name, path, "failed", perf_counter() - start, n_dates, n_values, output if writer else "",
+                           f"{type(e).__name__}: {e}")
+    finally:
+        if writer is not None:
+            writer.close()
+    return PlanSummary(name, path, "ok", perf_counter() - start, n_dates, n_values, output)
+
+
+def run_batch(paths: Sequence[str], options: BatchOptions, workers: Optional[int] = None) -> List[PlanSummary]:
+    """
+    Simulates every plan module in paths with simulate_to_file, in a pool of worker processes,
+    and returns their summaries in the order of paths. With one worker they run in this process.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    os.makedirs(options.out, exist_ok=True)
+    names = plan_names(paths)
+    if workers == 1:
+        return [_report(simulate_to_file(path, name, options)) for path, name in zip(paths, names)]
+    summaries: List[Optional[PlanSummary]] = [None] * len(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(simulate_to_file, path, name, options): k for k, (path, name) in enumerate(zip(paths, names))}
+        for future in as_completed(futures):
+            summaries[futures[future]] = _report(future.result())
+    return summaries
+
+
+def _report(summary: PlanSummary) -> PlanSummary:
+    """ Prints how a plan went as soon as it is done. """
+    detail = f"{summary.dates} dates" if summary.status == "ok" else summary.error
+    print(f"{summary.plan:<40} {summary.status:<7} {summary.seconds:>9.3f}s {detail}", flush=True)
+    return summary
+
+
+def write_summary(summaries: Iterable[PlanSummary], path: str):
+    """ Writes summaries to a csv file, with a column per field of PlanSummary. """
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([f.name for f in fields(PlanSummary)])
+        writer.writerows(astuple(s) for s in summaries)
+
+
+def _date(text: str) -> datetime:
+    return datetime.strptime(text, "%Y-%m-%d")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m lifechoices", description="Simulates plan modules and writes their balances to files.")
+    parser.add_argument("paths", nargs="+", help="plan modules, or directories to look for them in")
+    parser.add_argument("--pattern", default="*transactions.py", help="the file names to look for in directories")
+    parser.add_argument("--out", default="results", help="the directory to write the balances and summary.csv to")
+    parser.add_argument("--format", choices=FORMATS, default="csv", help="parquet needs pyarrow")
+    parser.add_argument("--from-date", type=_date, default=strip_date_timestamp(datetime.now()), help="YYYY-MM-DD, today by default")
+    parser.add_argument("--to-date", type=_date, help="YYYY-MM-DD, --years after --from-date by default")
+    parser.add_argument("--years", type=int, default=50)
+    parser.add_argument("--engine", choices=("vectorized", "events"), default="events")
+    parser.add_argument("--resolution", default="daily", help="daily, weekly, month-end or year-end")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes, 1 runs every plan in this one")
+    args = parser.parse_args(argv)
+
+    to_date = args.to_date or args.from_date + timedelta(days=365 * args.years)
+    options = BatchOptions(args.from_date, to_date, args.out, args.format, args.engine, args.resolution)
+    if args.format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        parser.error("--format parquet needs pyarrow, install it or use --format csv.")
+    try:
+        as_resolution(options.resolution, options.from_date)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        paths = find_plans(args.paths, args.pattern)
+    except ValueError as e:
+        parser.error(str(e))
+    if not paths:
+        parser.error(f"No plan modules found in {', '.join(args.paths)}.")
+
+    start = perf_counter()
+    summaries = run_batch(paths, options, args.workers)
+    write_summary(summaries, os.path.join(args.out, "summary.csv"))
+    failed = sum(s.status != "ok" for s in summaries)
+    print(f"{len(summaries) - failed} of {len(summaries)} plans simulated in {perf_counter() - start:.2f}s, "
+          f"summary in {os.path.join(args.out, 'summary.csv')}")
+    return 1 if failed else 0
@@ -0,0 +1,152 @@
+"""
+Caching simulations of the same plan.
+
+A CompiledPlan is a frozen copy of a starting plan and its bridges that can be used as a dictionary key.
+A SimulationCache keeps the results of the last few simulations of compiled plans. Because a simulation
+only depends on what happened before a day, a simulation that stops earlier than a cached one
+with the same start is the first rows of it, so it is sliced out instead of being run again.
+"""
+from typing import Any, Hashable, Iterable, Optional, Tuple, Union
+from collections import OrderedDict
+from copy import deepcopy
+from dataclasses import dataclass, field, fields, is_dataclass
+from datetime import datetime, timedelta
+
+from lifechoices.classes import Bridge, Plan
+from lifechoices.main import simulate
+from lifechoices.engine import _number_of_days
+from lifechoices.resolution import Resolution, as_resolution
+from lifechoices.result import SimulationResult
+from lifechoices.utils import strip_date_timestamp
+
+
+def _freeze(obj: Any) -> Hashable:
+    """ A hashable copy of the values in a plan or bridge, with functions compared as they are. """
+    if is_dataclass(obj):
+        return (type(obj),) + tuple(_freeze(getattr(obj, f.name)) for f in fields(obj))
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(x) for x in obj)
+    if isinstance(obj, dict):
+        return tuple((k, _freeze(v)) for k, v in obj.items())
+    return obj
+
+
+@dataclass(frozen=True)
+class CompiledPlan:
+    """
+    A starting plan and its bridges, frozen.
+    Two compiled plans are equal and hash the same when their accounts, transfers and bridges hold the same values,
+    with bridges compared by the functions they call. It keeps its own copy of the plan,
+    so changing the plan afterwards does not change what it simulates.
+    """
+    key: Hashable
+    starting_plan: Plan = field(compare=False, repr=False)
+    bridges: Tuple[Bridge, ...] = field(compare=False, repr=False)
+
+    @classmethod
+    def compile(cls, starting_plan: Plan, bridges: Iterable[Bridge]) -> "CompiledPlan":
+        starting_plan, bridges = deepcopy(starting_plan), tuple(deepcopy(list(bridges)))
+        return cls(_freeze((starting_plan, bridges)), starting_plan, bridges)
+
+    def simulate(
+            self,
+            from_date: datetime,
+            to_date: datetime,
+            engine: str = "vectorized",
+            resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+    ) -> SimulationResult:
+        """ Runs lifechoices.main.simulate on the plan, which leaves the plan as it is. """
+        return simulate(self.starting_plan, list(self.bridges), from_date, to_date, engine, resolution)
+
+
+class SimulationCache:
+    """
+    The results of the last maxsize simulations of compiled plans,
+    keyed by the plan, the start date, the engine and the resolution, with the number of days simulated.
+    A simulation of no more days than a cached one is a slice of it.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results: "OrderedDict[Tuple, Tuple[int, SimulationResult]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def clear(self):
+        self._results.clear()
+
+    def _key(self, compiled: CompiledPlan, from_date: datetime, engine: str, resolution: Resolution) -> Tuple:
+        return compiled, from_date, engine, resolution.key
+
+    def lookup(
+            self,
+            compiled: CompiledPlan,
+            from_date: datetime,
+            to_date: datetime,
+            engine: str = "vectorized",
+            resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+    ) -> Optional[SimulationResult]:
+        """ The cached result of a simulation, or a slice of a longer one, or None if there is none, counting a hit or a miss. """
+        resolution = as_resolution(resolution, from_date)
+        key = self._key(compiled, from_date, engine, resolution)
+        n = _number_of_days(from_date, to_date)
+        if key in self._results:
+            cached_n, result = self._results[key]
+            if 0 < n <= cached_n:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result if n == cached_n else result.until(strip_date_timestamp(from_date) + timedelta(days=n))
+        self.misses += 1
+        return None
+
+    def put(
+            self,
+            compiled: CompiledPlan,
+            from_date: datetime,
+            to_date: datetime,
+            engine: str,
+            resolution: Union[str, Iterable[datetime], Resolution],
+            result: SimulationResult,
+    ):
+        """ Caches the result of a simulation, unless a longer one of the same plan is cached. """
+        resolution = as_resolution(resolution, from_date)
+        key = self._key(compiled, from_date, engine, resolution)
+        n = _number_of_days(from_date, to_date)
+        if key not in self._results or self._results[key][0] < n:
+            self._results[key] = (n, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def simulate(
+            self,
+            compiled: CompiledPlan,
+            from_date: datetime,
+            to_date: datetime,
+            engine: str = "vectorized",
+            resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+    ) -> SimulationResult:
+        """ Same as compiled.simulate, only looked up in the cache first. """
+        resolution = as_resolution(resolution, from_date)
+        result = self.lookup(compiled, from_date, to_date, engine, resolution)
+        if result is None:
+            result = compiled.simulate(from_date, to_date, engine, resolution)
+            self.put(compiled, from_date, to_date, engine, resolution, result)
+        return result
+
+
+default_cache = SimulationCache()
+
+
+def simulate_cached(
+        compiled: CompiledPlan,
+        from_date: datetime,
+        to_date: datetime,
+        engine: str = "vectorized",
+        resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+) -> SimulationResult:
+    """ Simulates a compiled plan through default_cache. """
+    return default_cache.simulate(compiled, from_date, to_date, engine, resolution)
@@ -0,0 +1,46 @@
+"""
+The calendar of the days a simulation runs over, worked out once.
+
+Every simulated day the engines need the weekday, the day of the month, the month and the year of the day,
+the parity of its week of the month for biweekly transfers, and the days since the same day last month
+for monthly ones. Working those out from a datetime every day means building new datetimes, so instead
+calendar_table works them out for a whole horizon as integer arrays, with a row per day.
+The array engines and recurrence masks read whole columns of it, and the day by day loop
+reads single rows from calendar_lists.
+"""
+from typing import Dict, List
+from datetime import datetime
+
+import numpy as np
+
+FIELDS = ("year", "month", "day", "weekday", "weekOfMonth", "weekOfMonthParity", "daysSinceLastMonth")
+
+
+def calendar_table(first_day: datetime, n: int) -> Dict[str, np.ndarray]:
+    """
+    The calendar fields of the n days starting at the day of first_day, as arrays with a row per day.
+    weekday counts from 0 for Monday like datetime.weekday, weekOfMonth is lifechoices.utils.weekOfMonth,
+    and daysSinceLastMonth is (date - lifechoices.utils.monthdelta(date, -1)).days.
+    """
+    days = np.datetime64(first_day.date(), "D") + np.arange(n)
+    months = days.astype("datetime64[M]")
+    month_starts = months.astype("datetime64[D]")
+    day = (days - month_starts).astype(np.int64) + 1
+    previous_month_length = (month_starts - (months - 1).astype("datetime64[D]")).astype(np.int64)
+    first_weekday = (month_starts.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    week_of_month = (day + first_weekday + 6) // 7
+    return {
+        "year": days.astype("datetime64[Y]").astype(np.int64) + 1970,
+        "month": months.astype(np.int64) % 12 + 1,
+        "day": day,
+        "weekday": (days.astype(np.int64) + 3) % 7,
+        "weekOfMonth": week_of_month,
+        "weekOfMonthParity": week_of_month % 2,
+        # The same day last month, or the last day of it when it is shorter
+        "daysSinceLastMonth": np.maximum(previous_month_length, day),
+    }
+
+
+def calendar_lists(first_day: datetime, n: int) -> Dict[str, List[int]]:
+    """ The fields of calendar_table as lists, which are quicker than arrays to read one day at a time. """
+    return {key: column.tolist() for key, column in calendar_table(first_day, n).items()}
@@ -0,0 +1,283 @@
+"""
+Checkpoints of a simulation, and picking it back up after the plan is edited.
+
+simulate_resumable keeps the state of the simulation at the start of every stretch:
+right after every bridge activates, and every checkpoint_every days in between.
+resimulate works out the first day an edit can change a balance on and runs the simulation
+again from the last checkpoint before that day, keeping the rows of the previous result before it.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from functools import partial
+
+import numpy as np
+
+from lifechoices.classes import Bridge, DateBridge, Plan, Transfer
+from lifechoices.schedule import _next_firing
+from lifechoices.state import _edit_brought_in
+from lifechoices.engine import _first_block, _number_of_days, _simulate_stretches
+from lifechoices.resolution import Resolution, as_resolution
+from lifechoices.result import SimulationResult
+from lifechoices.utils import strip_date_timestamp
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    """
+    The state of a simulation at the end of a day: the plan in effect,
+    with the balances of its accounts and the amounts of its transfers as they were that day,
+    and the names of the bridges that had not activated yet.
+    bridge is the name of the bridge that activated at the end of the day, if one did.
+    """
+    day: int  # Days since the day of from_date
+    date: datetime
+    plan: Plan
+    pending: Tuple[str, ...]
+    bridge: Optional[str] = None
+
+    @property
+    def balances(self) -> Dict[str, float]:
+        return {a.name: a.amount for a in self.plan.accounts}
+
+    @property
+    def transfer_amounts(self) -> Dict[str, float]:
+        return {t.name: t.amount for t in self.plan.transfers}
+
+
+@dataclass
+class PlanDiff:
+    """
+    Edits to a starting plan and its bridges, matched by name.
+    A transfer replaces the transfers with its name in the starting plan and the ones a bridge brings in,
+    while the ones a bridge carries over from the plan before it carry the edited one over.
+    A transfer with a new name is added to the starting plan. A bridge replaces the bridge with its name,
+    or is added if there is none.
+    """
+    transfers: List[Transfer] = field(default_factory=list)
+    removed_transfers: List[str] = field(default_factory=list)
+    bridges: List[Bridge] = field(default_factory=list)
+    removed_bridges: List[str] = field(default_factory=list)
+
+    def transfer_edits(self) -> Dict[str, Optional[Transfer]]:
+        """ The new version of every edited transfer by name, None for the removed ones. """
+        edits: Dict[str, Optional[Transfer]] = {t.name: t for t in self.transfers}
+        edits.update((name, None) for name in self.removed_transfers)
+        return edits
+
+    def apply_to_bridges(self, bridges: Iterable[Bridge]) -> List[Bridge]:
+        new = {b.name: b for b in self.bridges}
+        kept = [new.pop(b.name, b) for b in bridges if b.name not in self.removed_bridges]
+        return kept + list(new.values())
+
+
+def _edit_transfers(plan: Plan, edits: Dict[str, Optional[Transfer]], added: Iterable[Transfer] = ()) -> Plan:
+    """ A new plan with the accounts of plan and its transfers edited, leaving plan as it is. """
+    transfers = [edits.get(t.name, t) for t in plan.transfers]
+    return Plan(accounts=plan.accounts, transfers=[t for t in transfers if t is not None] + list(added))
+
+
+def _edited(edits: Dict[str, Optional[Transfer]], transfer: Transfer) -> Optional[Transfer]:
+    return edits.get(transfer.name, transfer)
+
+
+def _with_edits(bridges: Iterable[Bridge], edits: Dict[str, Optional[Transfer]]) -> List[Bridge]:
+    """ The bridges, giving plans with the transfer edits made to the transfers they bring in (see _edit_brought_in). """
+    if not edits:
+        return list(bridges)
+    return [replace(b, bridge_function=partial(_edit_brought_in, b.bridge_function, partial(_edited, edits))) for b in bridges]
+
+
+@dataclass(frozen=True)
+class ResumableResult:
+    """
+    The result of simulate_resumable or resimulate, with its checkpoints
+    and everything needed to run it again from one of them.
+    transfer_edits are the transfer edits made to the transfers the bridges bring in so far.
+    """
+    result: SimulationResult
+    checkpoints: Tuple[Checkpoint, ...]
+    starting_plan: Plan
+    bridges: Tuple[Bridge, ...]
+    from_date: datetime
+    to_date: datetime
+    resolution: Resolution
+    engine: str
+    checkpoint_every: int
+    transfer_edits: Dict[str, Optional[Transfer]] = field(default_factory=dict)
+    days_simulated: int = 0  # How many days the simulation that made it ran for
+
+
+def _run(
+        plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+        resolution: Resolution,
+        events: bool,
+        checkpoint_every: int,
+        start_day: int = 0,
+        activated: Iterable[str] = (),
+        bridge: Optional[str] = None,
+        activations: Optional[List[Tuple[str, datetime]]] = None,
+) -> Tuple[List[Tuple[np.ndarray, List[str], np.ndarray]], List[Checkpoint]]:
+    """
+    The blocks of the simulation from the end of start_day, and a checkpoint at the start of every stretch.
+    activated are the names of the bridges that activated by then, bridge the one that activated on start_day.
+    The bridges that activate after that are appended to activations, if given.
+    """
+    first_day = strip_date_timestamp(from_date)
+    activated = list(activated)
+    last_bridge: List[Optional[str]] = [bridge]
+
+    def before_bridge(bridge: Bridge, _: Plan):
+        last_bridge[0] = bridge.name
+
+    daily = resolution.name == "daily"
+    output_dates = () if daily or not events else resolution.dates(resolution.first_day, _number_of_days(from_date, to_date) + 1)
+    blocks, checkpoints = [], []
+    for st in _simulate_stretches(plan, bridges, from_date, to_date, events, output_dates, events and daily,
+                                  before_bridge, checkpoint_every, start_day, activations):
+        bridge, last_bridge[0] = last_bridge[0], None
+        if bridge is not None:
+            activated.append(bridge)
+        day = (st.first_day - first_day).days - 1
+        checkpoints.append(Checkpoint(day, first_day + timedelta(days=day), st.plan,
+                                      tuple(b.name for b in bridges if b.name not in activated), bridge))
+        keep = resolution.mask(st.first_day, int(st.rows[-1]) + 1)[st.rows]
+        blocks.append((np.datetime64(st.first_day, "us") + st.rows[keep].astype("timedelta64[D]"), st.names, st.values[keep]))
+    return blocks, checkpoints
+
+
+def simulate_resumable(
+        starting_plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+        engine: str = "events",
+        resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+        checkpoint_every: int = 365,
+) -> ResumableResult:
+    """
+    Simulates like lifechoices.main.simulate with one of the array engines,
+    keeping a checkpoint after every bridge and every checkpoint_every days,
+    so that resimulate can run it again after an edit from the last checkpoint the edit does not change.
+    """
+    if engine not in ("vectorized", "events"):
+        raise ValueError(f"engine must be 'vectorized' or 'events'. Got {engine}")
+    if checkpoint_every < 1:
+        raise ValueError(f"checkpoint_every must be at least 1. Got {checkpoint_every}")
+    resolution = as_resolution(resolution, from_date)
+    # Its accounts and transfers are frozen, so copying the lists is enough to keep it as it is
+    starting_plan, bridges = Plan(list(starting_plan.accounts), list(starting_plan.transfers)), tuple(bridges)
+    activations: List[Tuple[str, datetime]] = []
+    blocks, checkpoints = _run(starting_plan, list(bridges), from_date, to_date, resolution, engine == "events", checkpoint_every,
+                               activations=activations)
+    if from_date in resolution:
+        blocks.insert(0, _first_block(starting_plan, from_date))
+    result = replace(SimulationResult.from_blocks(blocks), bridges=tuple(activations))
+    return ResumableResult(result, tuple(checkpoints), starting_plan, bridges,
+                           from_date, to_date, resolution, engine, checkpoint_every,
+                           days_simulated=_number_of_days(from_date, to_date))
+
+
+def _first_affected_day(previous: ResumableResult, diff: PlanDiff, added: List[Transfer]) -> int:
+    """
+    The first day an edit can change a balance on, as days since the day of from_date,
+    or one past the last day if none can. Checkpoints after bridges split the simulation into epochs
+    with a plan each, and an edited transfer first matters the first time the old or the new version fires
+    in the first epoch it is in, and an added transfer the first time it fires or the first bridge. Conditional bridges can activate on any day, so editing one changes everything.
+    """
+    first_day = strip_date_timestamp(previous.from_date)
+    n = _number_of_days(previous.from_date, previous.to_date)
+    epochs: List[Tuple[int, int, Plan]] = []  # (start day, bridge day that ends it, plan)
+    for ck in previous.checkpoints:
+        if not epochs or ck.bridge is not None:
+            if epochs:
+                epochs[-1] = (epochs[-1][0], ck.day, epochs[-1][2])
+            epochs.append((ck.day, n, ck.plan))
+
+    def first_firing(t: Transfer, start: int) -> int:
+        date = _next_firing(t, first_day + timedelta(days=start))
+        return (date - first_day).days if date is not None else n + 1
+
+    affected = n + 1
+    for name, new in diff.transfer_edits().items():
+        for start, end, plan in epochs:
+            old = next((t for t in plan.transfers if t.name == name), None)
+            if old is not None:
+                day = min(first_firing(t, start) for t in (old, new) if t is not None)
+                if day <= end:
+                    affected = min(affected, day)
+                    break
+    # A bridge may carry the transfers of the plan it is given over, so added ones have to be there before the first
+    for t in added:
+        affected = min(affected, first_firing(t, 0), epochs[0][1] if epochs else n + 1)
+
+    activated = {ck.bridge: ck.day for ck in previous.checkpoints if ck.bridge is not None}
+    old_bridges = {b.name: b for b in previous.bridges}
+    edited: List[Tuple[Optional[Bridge], Optional[Bridge]]] = [(old_bridges.get(b.name), b) for b in diff.bridges]
+    edited += [(old_bridges[name], None) for name in diff.removed_bridges if name in old_bridges]
+    for old, new in edited:
+        if not all(isinstance(b, DateBridge) for b in (old, new) if b is not None) and new is not None:
+            return 1
+        for b in (old, new):
+            if b is None:
+                continue
+            if isinstance(b, DateBridge):
+                day = (b.trigger_date - first_day).days
+                if b.trigger_date == strip_date_timestamp(b.trigger_date) and 0 < day:
+                    affected = min(affected, day)
+            elif b.name in activated:
+                affected = min(affected, activated[b.name])
+    return affected
+
+
+def resimulate(previous: ResumableResult, diff: PlanDiff) -> ResumableResult:
+    """
+    The result of simulate_resumable on the previous plan and bridges with diff applied to them.
+    Only the days from the last checkpoint before the first day the edit can change are simulated again,
+    and the rows before it are taken from the previous result.
+    """
+    edits = diff.transfer_edits()
+    names = {t.name for t in previous.starting_plan.transfers}
+    added = [t for t in diff.transfers if t.name not in names]
+    starting_plan = _edit_transfers(previous.starting_plan, edits, added)
+    bridges = tuple(diff.apply_to_bridges(previous.bridges))
+    transfer_edits = {**previous.transfer_edits, **edits}
+    n = _number_of_days(previous.from_date, previous.to_date)
+
+    affected = _first_affected_day(previous, diff, added)
+    resume_from = max((ck for ck in previous.checkpoints if ck.day < affected), key=lambda ck: ck.day, default=None)
+    if resume_from is None:
+        resumed = simulate_resumable(starting_plan, _with_edits(bridges, transfer_edits), previous.from_date, previous.to_date,
+                                     previous.engine, previous.resolution, previous.checkpoint_every)
+        return replace(resumed, starting_plan=starting_plan, bridges=bridges, transfer_edits=transfer_edits)
+
+    # None of the edited transfers fired before that day, and transfers only grow when they fire,
+    # so the checkpoints before it just need the edits made to them.
+    # Transfers only get added to the starting plan, so to the plans before the first bridge.
+    first_bridge = min((ck.day for ck in previous.checkpoints if ck.bridge is not None), default=n)
+    old_bridges = {b.name for b in previous.bridges}
+    new_bridges = tuple(b.name for b in diff.bridges if b.name not in old_bridges)
+    kept_checkpoints = [
+        replace(ck, plan=_edit_transfers(ck.plan, edits, added if ck.day < first_bridge else ()),
+                pending=tuple(name for name in ck.pending if name not in diff.removed_bridges) + new_bridges)
+        for ck in previous.checkpoints if ck.day <= resume_from.day
+    ]
+    resume_from = kept_checkpoints.pop()
+    pending = [b for b in _with_edits(bridges, transfer_edits) if b.name in resume_from.pending]
+    activated = [b.name for b in bridges if b.name not in resume_from.pending]
+
+    activations = [(name, date) for name, date in previous.result.bridges if date <= resume_from.date]
+    blocks, checkpoints = _run(resume_from.plan, pending, previous.from_date, previous.to_date, previous.resolution,
+                               previous.engine == "events", previous.checkpoint_every, resume_from.day, activated, resume_from.bridge,
+                               activations)
+    first_day = strip_date_timestamp(previous.from_date)
+    kept = previous.result.until(first_day + timedelta(days=resume_from.day + 1) - timedelta(microseconds=1))
+    blocks.insert(0, (kept.dates, list(kept.accounts), kept.values))
+    checkpoints = kept_checkpoints + checkpoints
+    result = replace(SimulationResult.from_blocks(blocks), bridges=tuple(activations))
+    return ResumableResult(result, tuple(checkpoints), starting_plan, bridges,
+                           previous.from_date, previous.to_date, previous.resolution, previous.engine,
+                           previous.checkpoint_every, transfer_edits, n - resume_from.day)
@@ -1,9 +1,10 @@
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Callable, Optional, Dict
 from enum import Enum
 
 from lifechoices.utils import interest_rate_per_period
+from lifechoices.recurrence import EveryNYears, WeekOfMonthParity
 
 
 class Period(Enum):
@@ -12,21 +13,27 @@ class Period(Enum):
     YEARLY = 1
 
 
-@dataclass()
+@dataclass(frozen=True)
 class APR:
     value: float
     period: Period = Period.DAILY
+    daily_value: float = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Converted once here, the simulation asks for the daily rate of every account and transfer
+        if self.period == Period.DAILY:
+            daily_value = self.value
+        else:
+            daily_value = interest_rate_per_period(self.value, Period.DAILY.value/self.period.value)
+        object.__setattr__(self, "daily_value", daily_value)
 
     def to_daily(self) -> "APR":
         if self.period == Period.DAILY:
             return self
-        return APR(
-            value=interest_rate_per_period(self.value, Period.DAILY.value/self.period.value),
-            period=Period.DAILY
-        )
+        return APR(value=self.daily_value, period=Period.DAILY)
 
 
-@dataclass()
+@dataclass(frozen=True, slots=True)
 class Account:
     """
     An account like a bank account, or an asset,
@@ -39,7 +46,7 @@ class Account:
     created_on: datetime
 
 
-@dataclass()
+@dataclass(frozen=True, slots=True)
 class Transfer:
     """
     A transfer is a movement of money between two accounts.
@@ -60,14 +67,18 @@ class Transfer:
             return ValueError(f"to_account and from_account should not be equal. Got {self.to_account}")
 
 
-@dataclass()
+@dataclass(frozen=True, slots=True)
 class Plan:
-    """ A list of accounts and transfers that you plan to make over a period of life. """
+    """
+    A list of accounts and transfers that you plan to make over a period of life.
+    Plans, accounts and transfers are frozen, a bridge changes one by making a new one,
+    like replace(account, amount=0.0) with dataclasses.replace.
+    """
     accounts: List[Account]
     transfers: List[Transfer]
 
 
-@dataclass()
+@dataclass(frozen=True, slots=True)
 class Bridge:
     """
     Represents as a function which takes a plan and returns a plan.
@@ -79,7 +90,7 @@ class Bridge:
         return self.bridge_function(oldPlan)
 
 
-@dataclass()
+@dataclass(frozen=True, slots=True)
 class DateBridge(Bridge):
     """
     A date on which a plan changes into a new plan.
@@ -88,7 +99,7 @@ class DateBridge(Bridge):
     trigger_date: datetime
 
 
-@dataclass()
+@dataclass(frozen=True, slots=True)
 class CallbackBridge(Bridge):
     """
     A logical operation on which a plan changes into a new plan.
@@ -98,7 +109,28 @@ class CallbackBridge(Bridge):
     trigger_function: Callable[[Dict[str, float]], bool]
 
 
-@dataclass()
+@dataclass(frozen=True, slots=True)
+class ThresholdBridge(Bridge):
+    """
+    A plan changing into a new plan the first day the balance of an account is at or above threshold,
+    or at or below it if above is False. Paying off a loan is a ThresholdBridge on the loan reaching 0.
+    It works like a CallbackBridge, but the engines can find that day from the balances themselves
+    instead of asking a python function about every day.
+    """
+    account: str
+    threshold: float
+    above: bool = True
+
+    def met(self, balance):
+        """ Whether a balance, or every one of an array of them, meets the threshold. """
+        return balance >= self.threshold if self.above else balance <= self.threshold
+
+    def trigger_function(self, this_data: Dict[str, float]) -> bool:
+        """ Same as a CallbackBridge's trigger_function, false on days the account does not exist. """
+        return self.account in this_data and bool(self.met(this_data[self.account]))
+
+
+@dataclass(frozen=True, slots=True)
 class Once(Transfer):
     """
     Used to indicate transfers happening exactly once on date provided.
@@ -106,7 +138,7 @@ class Once(Transfer):
     date: datetime = datetime.now()
 
 
-@dataclass()
+@dataclass(frozen=True, slots=True)
 class Daily(Transfer):
     """
     Used to indicate transfers every day
@@ -115,7 +147,7 @@ class Daily(Transfer):
     APR: APR = APR(0)
 
 
-@dataclass()
+@dataclass(frozen=True, slots=True)
 class Weekly(Transfer):
     """
     Used to indicate transfers every week
@@ -131,7 +163,7 @@ class Weekly(Transfer):
             raise ValueError(f"dayOfWeek should be between 0 (Monday) and 6 (Sunday). Got {self.dayOfWeek}")
 
 
-@dataclass()
+@dataclass(frozen=True, slots=True)
 class BiWeekly(Transfer):
     """
     Used to indicate transfers every other week
@@ -150,8 +182,12 @@ class BiWeekly(Transfer):
         if not self.weekOffset in (0, 1):
             raise ValueError(f"weekOffset should be 0 or 1. Got {self.weekOffset}")
 
+    def recurrence(self) -> WeekOfMonthParity:
+        """ The days this transfer fires on. """
+        return WeekOfMonthParity(self.dayOfWeek, self.weekOffset)
 
-@dataclass()
+
+@dataclass(frozen=True, slots=True)
 class Monthly(Transfer):
     """
     Used to indicate monthly transfers done on the dayOfMonth
@@ -167,7 +203,7 @@ class Monthly(Transfer):
 
 
 # TODO: To Be Implemented
-@dataclass()
+@dataclass(frozen=True, slots=True)
 class Yearly(Transfer):
     """
     Used to indicate yearly transfers done
@@ -184,13 +220,18 @@ class Yearly(Transfer):
         if not (1 <= self.dayOfMonth <= 28):
             raise ValueError(f"dayOfMonth needs to be between 1 and 28. Got {self.dayOfMonth}")
 
+    def recurrence(self) -> EveryNYears:
+        """ The days this transfer fires on. """
+        return EveryNYears(self.month, self.dayOfMonth)
+
 
 # TODO: Implement
-@dataclass()
+@dataclass(frozen=True, slots=True)
 class NYearly(Transfer):
     """
     Used to indicate every n years a transfer done
     on the dayOfMonth of month and increasing at APR.
+    The first year it is done in is firstYear.
     """
     nyears: int = 1
     month: int = 1
@@ -202,4 +243,11 @@ class NYearly(Transfer):
         """ Check that all values are valid. """
         if not (self.nyears >= 1):
             raise ValueError(f"nyears needs to be greater than or equal to 1. Got {self.nyears}")
+        if not (1 <= self.month <= 12):
+            raise ValueError(f"month needs to be between 1 and 12. Got {self.month}")
+        if not (1 <= self.dayOfMonth <= 28):
+            raise ValueError(f"dayOfMonth needs to be between 1 and 28. Got {self.dayOfMonth}")
 
+    def recurrence(self) -> EveryNYears:
+        """ The days this transfer fires on, every nyears years starting in firstYear. """
+        return EveryNYears(self.month, self.dayOfMonth, self.nyears, self.firstYear)
@@ -0,0 +1,117 @@
+"""
+Fewer points of a simulation for plotting, that still look like all of them.
+
+A daily simulation over 50 years has about 18,000 points per account, far more than a plot has pixels,
+and sending them all to a browser is most of the time a redraw takes. downsample picks at most
+about n_points of them per account, with one of two algorithms that keep the shape of the line:
+
+"lttb", Largest Triangle Three Buckets, splits the days into buckets and keeps the point of each bucket
+that makes the largest triangle with the point kept before it and the average of the next bucket.
+"minmax" keeps the lowest and the highest point of every bucket, so no peak or trough goes missing.
+
+Every account is picked on its own, but all of them are worked out together with arrays.
+The points kept are the exact balances simulated, and the days bridges activate on and the days after them
+are always kept, so the steps a bridge makes in a line stay where they are.
+"""
+from typing import Any, Dict, Iterable, List, Union
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from lifechoices.result import SimulationResult
+
+METHODS = ("lttb", "minmax")
+
+
+def _lttb(x: np.ndarray, y: np.ndarray, n_points: int) -> np.ndarray:
+    """
+    Which of the rows of y, a column per account, Largest Triangle Three Buckets keeps for each account,
+    as a boolean matrix like y. x is where each row is. NaN balances are never picked over a number.
+    """
+    m, k = y.shape
+    keep = np.zeros((m, k), dtype=bool)
+    keep[[0, -1]] = True
+    # n_points - 2 buckets between the first and the last row, which are always kept
+    edges = np.linspace(1, m - 1, n_points - 1).astype(np.int64)
+    present = ~np.isnan(y)
+    filled = np.where(present, y, 0.0)
+    columns = np.arange(k)
+    previous = np.zeros(k, dtype=np.int64)
+    for i in range(n_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i + 1], edges[i + 2]
+            count = present[next_lo:next_hi].sum(axis=0)
+            next_x = x[next_lo:next_hi].mean()
+            with np.errstate(invalid="ignore", divide="ignore"):
+                next_y = filled[next_lo:next_hi].sum(axis=0) / count
+        else:
+            next_x, next_y = x[-1], y[-1]
+        prev_x, prev_y = x[previous], y[previous, columns]
+        area = np.abs((prev_x - next_x) * (y[lo:hi] - prev_y) - (prev_x - x[lo:hi, None]) * (next_y - prev_y))
+        area[np.isnan(area)] = -1.0
+        previous = lo + np.argmax(area, axis=0)
+        keep[previous, columns] = True
+    return keep
+
+
+def _minmax(y: np.ndarray, n_points: int) -> np.ndarray:
+    """ Which of the rows of y keep the lowest and the highest balance of each of n_points // 2 buckets, per account. """
+    m, k = y.shape
+    keep = np.zeros((m, k), dtype=bool)
+    keep[[0, -1]] = True
+    size = -(-m // max(n_points // 2, 1))
+    buckets = -(-m // size)
+    padded = np.full((buckets * size, k), np.nan)
+    padded[:m] = y
+    padded = padded.reshape(buckets, size, k)
+    starts = (np.arange(buckets) * size)[:, None]
+    columns = np.arange(k)[None, :]
+    lowest = starts + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highest = starts + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    keep[np.minimum(lowest, m - 1), columns] = True
+    keep[np.minimum(highest, m - 1), columns] = True
+    return keep
+
+
+def downsample(
+        result: Union[SimulationResult, List[Dict[str, Any]]],
+        n_points: int = 1000,
+        method: str = "lttb",
+        keep: Iterable[datetime] = (),
+) -> SimulationResult:
+    """
+    A result with at most about n_points dates per account picked from result by method, "lttb" or "minmax",
+    plus the days bridges activated on, the days after them, and the dates in keep.
+    result can also be the rows plot_accounts(..., tall_data=False) returns, which do not know their bridges.
+
+    The dates of the result are the ones any account kept, and an account is NaN on the dates it did not keep,
+    so result.to_pandas(tall=True).dropna() has only the points each account kept, ready to plot.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method should be one of {', '.join(METHODS)}. Got {method}")
+    if n_points < 3:
+        raise ValueError(f"n_points should be at least 3. Got {n_points}")
+    if not isinstance(result, SimulationResult):
+        result = SimulationResult.from_rows(result)
+    m = len(result.dates)
+    if m <= n_points:
+        return result
+
+    y = result.values
+    if method == "lttb":
+        x = (result.dates - result.dates[0]) / np.timedelta64(1, "D")
+        kept = _lttb(x, y, n_points)
+    else:
+        kept = _minmax(y, n_points)
+
+    # The day a bridge activates ends with the old plan and the next one starts with the new one.
+    # A date that was not recorded keeps the first one recorded after it.
+    always = [date for _, date in result.bridges] + [date + timedelta(days=1) for _, date in result.bridges] + list(keep)
+    if always:
+        rows = np.searchsorted(result.dates, np.array(always, dtype="datetime64[us]"))
+        kept[rows[rows < m]] = True
+
+    rows = np.flatnonzero(kept.any(axis=1))
+    return replace(result, dates=result.dates[rows], values=np.where(kept[rows], y[rows], np.nan))
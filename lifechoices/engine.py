@@ -0,0 +1,441 @@
+"""
+Array backed alternatives to the day by day loop in plot_accounts.
+
+Accounts are columns and days are rows. Between two bridges the plan does not change,
+so every recurring transfer can be turned into the list of rows it fires on,
+the transfers summed into a (days, accounts) matrix of flows, and the daily
+account compounding solved in closed form over the whole stretch.
+A ThresholdBridge is found by looking for the first row its account meets the threshold on,
+and we only step through the days one at a time when a CallbackBridge has to be asked
+whether it triggers.
+
+The event driven mode goes one step further and only keeps the rows something happens on:
+a transfer fires, a bridge activates, or the caller asked for that date.
+On every other day an account only earns interest, so it can be skipped over with
+a single multiplication and filled back in afterwards if a daily series is wanted.
+"""
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from dataclasses import dataclass
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from time import perf_counter
+
+import numpy as np
+
+from lifechoices.classes import Account, Bridge, DateBridge, CallbackBridge, ThresholdBridge, Plan
+from lifechoices.schedule import _generate_from_plan, _GenerateFromPlanOutput
+from lifechoices.growth import GrowthTable
+from lifechoices.state import _with_amounts
+from lifechoices.resolution import Resolution, as_resolution
+from lifechoices.instrumentation import Instrumentation, active_instrumentation
+from lifechoices.utils import strip_date_timestamp
+
+# Compounding is solved in closed form one block at a time so the powers of the growth
+# factor stay close to one and the result stays as precise as the day by day loop.
+_BLOCK_DAYS = 365
+# Long stretches without a bridge are simulated a few years at a time,
+# so the arrays held in memory do not grow with the length of the simulation.
+_CHUNK_DAYS = 4 * 365
+
+
+def _number_of_days(from_date: datetime, to_date: datetime) -> int:
+    """ The number of days plot_accounts steps through after the start day. """
+    start = strip_date_timestamp(from_date)
+    if to_date <= start:
+        return 0
+    return -((start - to_date) // timedelta(days=1))
+
+
+def _compound(start: np.ndarray, flows: np.ndarray, growth: np.ndarray, days: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Solves balance[t] = (balance[t-1] + flows[t]) * growth for every row of flows,
+    which is what the daily loop does to each account.
+    If days is given, the rows of flows are only the days listed there (counting from 1)
+    and on the days in between the accounts just compound.
+    """
+    if days is None:
+        days = np.arange(1, len(flows) + 1)
+    out = np.empty_like(flows)
+    balance, day = start, 0
+    for lo in range(0, len(flows), _BLOCK_DAYS):
+        block = flows[lo:lo + _BLOCK_DAYS]
+        powers = growth ** (days[lo:lo + _BLOCK_DAYS] - day)[:, None]
+        out[lo:lo + len(block)] = powers * (balance + np.cumsum(block * (growth / powers), axis=0))
+        balance, day = out[lo + len(block) - 1], days[lo + len(block) - 1]
+    return out
+
+
+def _fill_daily(start: np.ndarray, rows: np.ndarray, values: np.ndarray, growth: np.ndarray, n: int) -> np.ndarray:
+    """
+    The balances on each of n days from the balances on some of those rows.
+    Nothing but interest happens between the rows, so this is exact and not an approximation.
+    """
+    every_row = np.arange(n)
+    previous = np.searchsorted(rows, every_row, side="right")
+    base = np.vstack([start, values])[previous]
+    base_row = np.concatenate([[-1], rows])[previous]
+    return base * growth ** (every_row - base_row)[:, None]
+
+
+def _balances_on(day: int, start: np.ndarray, rows: np.ndarray, values: np.ndarray, growth: np.ndarray) -> np.ndarray:
+    """ The balances on one day, from the balances on some rows like _fill_daily. """
+    previous = np.searchsorted(rows, day, side="right")
+    if previous and rows[previous - 1] == day:
+        return values[previous - 1]
+    base, base_row = (start, -1) if previous == 0 else (values[previous - 1], rows[previous - 1])
+    return base * growth ** (day - base_row)
+
+
+def _crossing_day(trigger: ThresholdBridge, start: float, rows: np.ndarray, values: np.ndarray, growth: float) -> Optional[int]:
+    """
+    The first day the balance of one account meets a threshold, given its balances on some rows.
+    Between two rows the balance only earns interest, so it moves one way and meets the threshold
+    in between only if it does on the first or the last day in between. Only those days get filled in.
+    """
+    previous_rows = np.concatenate([[-1], rows[:-1]])
+    previous = np.concatenate([[start], values[:-1]])
+    gap = rows - previous_rows
+    between = (gap > 1) & (trigger.met(previous * growth) | trigger.met(previous * growth ** (gap - 1)))
+    found = between | trigger.met(values)
+    if not found.any():
+        return None
+    k = int(np.argmax(found))
+    if not between[k]:
+        return int(rows[k])
+    days = np.arange(1, gap[k])
+    return int(previous_rows[k] + days[np.argmax(trigger.met(previous[k] * growth ** days))])
+
+
+def _first_trigger(
+        bridges: List[Union[CallbackBridge, ThresholdBridge]],
+        names: List[str],
+        start: np.ndarray,
+        rows: np.ndarray,
+        values: np.ndarray,
+        growth: np.ndarray,
+        first_day: datetime,
+        n: int,
+        stats: Optional[Instrumentation] = None,
+) -> Tuple[Optional[int], Optional[Bridge]]:
+    """
+    The first of the n days of a stretch a conditional bridge activates on, and the first of bridges that does.
+    ThresholdBridges are grouped by account and direction, and only the one closest to the balance is looked for,
+    and CallbackBridges are asked about every day until then.
+    """
+    column = {name: i for i, name in enumerate(names)}
+    groups: Dict[Tuple[str, bool], List[int]] = {}
+    for k, b in enumerate(bridges):
+        if isinstance(b, ThresholdBridge) and b.account in column:
+            groups.setdefault((b.account, b.above), []).append(k)
+    first, candidates = n, set()
+    for (account, above), members in groups.items():
+        closest = (min if above else max)(members, key=lambda k: bridges[k].threshold)
+        i = column[account]
+        day = _crossing_day(bridges[closest], start[i], rows, values[:, i], growth[i])
+        if day is None or day > first:
+            continue
+        balance = _balances_on(day, start, rows, values, growth)[i]
+        met = {k for k in members if bridges[k].met(balance)}
+        first, candidates = day, (candidates | met if day == first else met)
+    if stats is not None:
+        stats.bridges_tested += sum(isinstance(b, ThresholdBridge) for b in bridges)
+
+    callbacks = [(k, b) for k, b in enumerate(bridges) if isinstance(b, CallbackBridge)]
+    if callbacks:
+        last = min(first, n - 1)
+        daily = values[:last + 1] if len(rows) == n else _fill_daily(start, rows, values, growth, last + 1)
+        for i, row in enumerate(daily.tolist()):
+            this_data = dict(zip(names, row))
+            this_data["Date"] = first_day + timedelta(days=i)
+            if stats is None:
+                triggered = {k for k, b in callbacks if b.trigger_function(this_data)}
+            else:
+                triggered = {k for k, b in callbacks if stats.trigger(b, this_data)}
+            if triggered:
+                first, candidates = i, (candidates | triggered if i == first else triggered)
+                break
+    if not candidates:
+        return None, None
+    return first, bridges[min(candidates)]
+
+
+def _timed(stats: Optional[Instrumentation], phase: str):
+    """ Adds the time the with block takes to phase, if there is an instrumentation. """
+    return nullcontext() if stats is None else stats.phase(phase)
+
+
+@dataclass
+class _Stretch:
+    """
+    A part of the simulation in which the plan does not change.
+    Rows are days counted from first_day, and values, flows and start have a column per name.
+    """
+    first_day: datetime
+    names: List[str]
+    rows: np.ndarray  # the rows balances were computed for
+    values: np.ndarray  # the balances at the end of those rows
+    flows: np.ndarray  # the money transferred in and out of each account on those rows
+    start: np.ndarray  # the balances the stretch started from
+    growth: np.ndarray  # the daily growth of each account
+    accounts: List[Account]  # the accounts of names
+    plan: Plan  # the plan in effect, with the balances and transfer amounts the stretch starts with
+
+
+def _segment_flows(
+        V: _GenerateFromPlanOutput,
+        first_day: datetime,
+        n: int,
+        events: bool = False,
+        output_rows: Iterable[int] = (),
+        calendar: Optional[Dict[str, np.ndarray]] = None,
+        schedules: Optional[Dict[Tuple, Tuple[np.ndarray, np.ndarray]]] = None,
+        stats: Optional[Instrumentation] = None,
+) -> Tuple[np.ndarray, np.ndarray, GrowthTable]:
+    """
+    Works out the transfers of n days of a plan that does not change, starting at first_day.
+    Returns the rows it needs the account balances for (every row, or if events is set only the
+    rows a transfer fires on, the rows in output_rows and the last row), the sum of the transfers in and out
+    of every account on those rows, and the growth table the caller can read the transfer amounts from.
+    calendar and schedules are handed to the GrowthTable.
+    """
+    if stats is not None:
+        tick = perf_counter()
+    G = GrowthTable(V, first_day, n, calendar, schedules)
+    if events:
+        output_rows = np.asarray(output_rows if isinstance(output_rows, np.ndarray) else list(output_rows), dtype=np.int64)
+        output_rows = output_rows[(0 <= output_rows) & (output_rows < n)]
+        rows = np.unique(np.concatenate(G.rows + [output_rows, [n - 1]]))
+    else:
+        rows = np.arange(n)
+    if stats is not None:
+        tick = stats.lap("schedule", tick)
+    column = {name: i for i, name in enumerate(V.accounts_by_name)}
+    flows = np.zeros((len(rows), len(G.accounts)))
+    for k, t in enumerate(G.transfers):
+        fired = np.searchsorted(rows, G.rows[k])
+        amounts = G.firing_amounts(k)
+        if t.from_account:
+            flows[fired, column[t.from_account]] -= amounts
+        if t.to_account:
+            flows[fired, column[t.to_account]] += amounts
+    if stats is not None:
+        stats.lap("transfers", tick)
+    return rows, flows, G
+
+
+def _simulate_stretches(
+        starting_plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+        events: bool = False,
+        output_dates: Iterable[datetime] = (),
+        fill_daily: bool = False,
+        before_bridge: Optional[Callable[[Bridge, Plan], None]] = None,
+        chunk_days: int = _CHUNK_DAYS,
+        start_day: int = 0,
+        activations: Optional[List[Tuple[str, datetime]]] = None,
+) -> Iterator[_Stretch]:
+    """
+    Runs the simulation one stretch between bridges at a time, cutting long stretches into chunks.
+    Every row of a stretch is a day, or if events is set only the days _segment_flows needs.
+    With fill_daily the event rows are filled back in to every day of the stretch.
+    before_bridge is called with every bridge and the plan it is about to be applied to.
+    No stretch is longer than chunk_days.
+    A start_day picks the simulation up at the end of that day, counting from the day of from_date,
+    with starting_plan the plan in effect then and bridges the ones that have not activated yet.
+    The name and day of every bridge that activates is appended to activations, if given.
+    Like the loop, after every stretch it makes a new plan with the balances and transfer amounts
+    of its last day, so that bridges see the current state of the plan they are given.
+    """
+    stats = active_instrumentation()
+    plan = starting_plan
+    first_day = strip_date_timestamp(from_date)
+    n = _number_of_days(from_date, to_date)
+    date_bridges = {(b.trigger_date - first_day).days: b for b in bridges
+                    if isinstance(b, DateBridge) and b.trigger_date == strip_date_timestamp(b.trigger_date)}
+    conditional = [b for b in bridges if isinstance(b, (CallbackBridge, ThresholdBridge))]
+    output_days = np.array(sorted({(d - first_day).days for d in output_dates if d == strip_date_timestamp(d)}), dtype=np.int64)
+
+    with _timed(stats, "schedule"):
+        V = _generate_from_plan(plan)
+    day = start_day
+    while day < n:
+        stop = min([d for d in date_bridges if day < d <= n] + [day + chunk_days, n])
+        segment_start = first_day + timedelta(days=day + 1)
+        start = np.array([a.amount for a in V.accounts_by_name.values()], dtype=float)
+        rows, flows, G = _segment_flows(V, segment_start, stop - day, events, output_days - day - 1, stats=stats)
+        with _timed(stats, "compounding"):
+            values = _compound(start, flows, G.account_growth, rows + 1)
+        names = list(V.accounts_by_name)
+
+        # End the stretch early if a conditional bridge activates in it
+        fired: Optional[Bridge] = None
+        if conditional:
+            with _timed(stats, "bridges"):
+                i, fired = _first_trigger(conditional, names, start, rows, values, G.account_growth, segment_start, stop - day, stats)
+                if fired is not None:
+                    keep = np.searchsorted(rows, i)
+                    balances = _balances_on(i, start, rows, values, G.account_growth)
+                    flows = np.vstack([flows[:keep], flows[keep] if keep < len(rows) and rows[keep] == i else 0 * start])
+                    rows = np.append(rows[:keep], i)
+                    values = np.vstack([values[:keep], balances])
+        if events and fill_daily:
+            with _timed(stats, "compounding"):
+                values = _fill_daily(start, rows, values, G.account_growth, rows[-1] + 1)
+                event_flows, flows = flows, np.zeros_like(values)
+                flows[rows] = event_flows
+                rows = np.arange(rows[-1] + 1)
+        yield _Stretch(segment_start, names, rows, values, flows, start, G.account_growth, G.accounts, plan)
+        last = int(rows[-1])
+        if stats is not None:
+            stats.transfers_applied += sum(int(np.searchsorted(r, last, side="right")) for r in G.rows)
+        day += last + 1
+        this_date = first_day + timedelta(days=day)
+
+        # Carry the plan on in the state the loop would have left it in
+        plan = _with_amounts(plan, dict(zip(names, values[-1].tolist())), G.amounts_by_id(last))
+
+        bridge_activated = False
+        if day in date_bridges:
+            this_bridge = date_bridges.pop(day)
+            if before_bridge is not None:
+                before_bridge(this_bridge, plan)
+            with _timed(stats, "bridges"):
+                plan = this_bridge(plan)
+            bridge_activated = True
+            if activations is not None:
+                activations.append((this_bridge.name, this_date))
+            print(f"Bridge {this_bridge.name} Activated on {this_date}")
+        if fired is not None:
+            if before_bridge is not None:
+                before_bridge(fired, plan)
+            with _timed(stats, "bridges"):
+                plan = fired(plan)
+            if bridge_activated:
+                raise RuntimeError("More than one bridge activated on the same date.")
+            conditional.remove(fired)
+            if activations is not None:
+                activations.append((fired.name, this_date))
+            print(f"Bridge {fired.name} Activated on {this_date}")
+        with _timed(stats, "schedule"):
+            V = _generate_from_plan(plan)
+
+
+def _first_block(starting_plan: Plan, from_date: datetime) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """ The account values plot_accounts starts from. """
+    accounts = _generate_from_plan(starting_plan).accounts_by_name
+    return np.array([from_date], dtype="datetime64[us]"), list(accounts), np.array([[a.amount for a in accounts.values()]], dtype=float)
+
+
+def _iter_blocks(
+        starting_plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+        resolution: Resolution,
+        events: bool = False,
+        activations: Optional[List[Tuple[str, datetime]]] = None,
+) -> Iterator[Tuple[np.ndarray, List[str], np.ndarray]]:
+    """
+    Yields (dates, account names, balances) for the days in resolution of every stretch of the simulation,
+    starting with the first day. Dates are datetime64[us] and balances have a row per date and a column per name.
+    With events, days in resolution are simulated as events and only a daily resolution fills in the days in between.
+    The bridges that activate are appended to activations, see _simulate_stretches.
+    """
+    if from_date in resolution:
+        yield _first_block(starting_plan, from_date)
+    if events:
+        daily = resolution.name == "daily"
+        output_dates = () if daily else resolution.dates(resolution.first_day, _number_of_days(from_date, to_date) + 1)
+        stretches = _simulate_stretches(starting_plan, bridges, from_date, to_date, True, output_dates, daily, activations=activations)
+    else:
+        stretches = _simulate_stretches(starting_plan, bridges, from_date, to_date, activations=activations)
+    stats = active_instrumentation()
+    for st in stretches:
+        with _timed(stats, "output"):
+            keep = resolution.mask(st.first_day, int(st.rows[-1]) + 1)[st.rows]
+            block = np.datetime64(st.first_day, "us") + st.rows[keep].astype("timedelta64[D]"), st.names, st.values[keep]
+        yield block
+
+
+def _to_rows(dates: np.ndarray, names: List[str], values: np.ndarray) -> Iterator[Dict[str, float]]:
+    """ Turns a block of balances into the dictionaries plot_accounts returns. """
+    for date, row_values in zip(dates.tolist(), values.tolist()):
+        this_data = dict(zip(names, row_values))
+        this_data["Date"] = date
+        yield this_data
+
+
+def _iter_rows(blocks: Iterable[Tuple[np.ndarray, List[str], np.ndarray]]) -> Iterator[Dict[str, float]]:
+    """ The rows of every block, timing how long they take to make if there is an instrumentation. """
+    stats = active_instrumentation()
+    for block in blocks:
+        if stats is None:
+            yield from _to_rows(*block)
+        else:
+            with stats.phase("output"):
+                rows = list(_to_rows(*block))
+            yield from rows
+
+
+def iter_vectorized(
+        starting_plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+        resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+) -> Iterator[Dict[str, float]]:
+    """ Yields the rows of simulate_vectorized as they are computed, keeping only the days in resolution. """
+    resolution = as_resolution(resolution, from_date)
+    yield from _iter_rows(_iter_blocks(starting_plan, bridges, from_date, to_date, resolution))
+
+
+def iter_events(
+        starting_plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+        resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+) -> Iterator[Dict[str, float]]:
+    """
+    Yields the rows of simulate_events as they are computed, keeping only the days in resolution.
+    Days in resolution are simulated as events, and only a daily resolution fills in the days in between.
+    """
+    resolution = as_resolution(resolution, from_date)
+    yield from _iter_rows(_iter_blocks(starting_plan, bridges, from_date, to_date, resolution, events=True))
+
+
+def simulate_vectorized(
+        starting_plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+) -> List[Dict[str, float]]:
+    """
+    Produces the same wide data as plot_accounts(..., tall_data=False), up to floating point rounding.
+    """
+    return list(iter_vectorized(starting_plan, bridges, from_date, to_date))
+
+
+def simulate_events(
+        starting_plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+        output_dates: Iterable[datetime] = (),
+        daily: bool = False,
+) -> List[Dict[str, float]]:
+    """
+    Simulates only the days something happens on: a transfer fires, a bridge activates,
+    or the day is one of output_dates. The last day is always reported.
+    The account values on every day it reports are the same as the ones plot_accounts gives, up to floating point rounding.
+
+    If daily is set the days in between are filled back in from those points,
+    which gives the same wide data as plot_accounts(..., tall_data=False).
+    """
+    data = list(_to_rows(*_first_block(starting_plan, from_date)))
+    stretches = _simulate_stretches(starting_plan, bridges, from_date, to_date, True, output_dates, daily)
+    for st in stretches:
+        data.extend(_to_rows(np.datetime64(st.first_day, "us") + st.rows.astype("timedelta64[D]"), st.names, st.values))
+    return data
@@ -0,0 +1,136 @@
+"""
+Growth factors of the transfers and accounts of a plan, computed once per plan.
+
+Every recurring transfer grows by its APR each time it fires, and every account grows by its APR every day.
+Instead of working out those rates again on every simulated day, a GrowthTable works out
+how much compounding each transfer has had before any day in one pass,
+so both the transfer amounts and the account multipliers can be looked up in O(1).
+"""
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from lifechoices.classes import Account, Transfer
+from lifechoices.schedule import _GenerateFromPlanOutput
+from lifechoices.calendar import calendar_table
+from lifechoices.utils import effective_interest_rate_per_t_periods
+
+
+def _base(rate: float, days_per_year: int = 365) -> float:
+    """ What a transfer growing at a daily rate, compounded days_per_year times a year, is multiplied by per day of compounding. """
+    return 1 + effective_interest_rate_per_t_periods(rate, days_per_year, 1 / days_per_year)
+
+
+def _account_interest(a: Account) -> float:
+    """ The interest an account earns on its balance every day. """
+    return effective_interest_rate_per_t_periods(a.APR.daily_value, 365, 1 / 365)
+
+
+class GrowthTable:
+    """
+    The growth of the transfers and accounts of one plan over the n days starting at first_day.
+    Rows are days counted from first_day.
+
+    A transfer's amount on a row is its starting amount times base ** exponent,
+    where the exponent is the number of days of compounding its firings before that row add up to.
+    Transfers on the same schedule share the same array of exponents.
+    Tables of plans simulated side by side can share the calendar of those days
+    and a dictionary of schedules, so every schedule is only worked out once.
+    """
+
+    def __init__(
+            self,
+            V: _GenerateFromPlanOutput,
+            first_day: datetime,
+            n: int,
+            calendar: Optional[Dict[str, np.ndarray]] = None,
+            schedules: Optional[Dict[Tuple, Tuple[np.ndarray, np.ndarray]]] = None,
+    ):
+        self.first_day = first_day
+        self.n = n
+        self.transfers: List[Transfer] = []
+        self.rows: List[np.ndarray] = []
+        self._exponents: List[np.ndarray] = []
+        self._index: Dict[int, int] = {}
+        bases = []
+
+        cal = calendar_table(first_day, n) if calendar is None else calendar
+        schedules = {} if schedules is None else schedules
+
+        def add(key, t: Transfer, mask: np.ndarray, days_per_firing, rate: float, days_per_year: int = 365):
+            """ Registers a transfer firing on mask and compounding days_per_firing days at rate each time. """
+            key = (first_day, n) + key
+            if key not in schedules:
+                exponents = np.zeros(n + 1)
+                np.cumsum(np.where(mask, days_per_firing, 0), out=exponents[1:])
+                schedules[key] = (np.flatnonzero(mask), exponents)
+            rows, exponents = schedules[key]
+            self._index[id(t)] = len(self.transfers)
+            self.transfers.append(t)
+            self.rows.append(rows)
+            self._exponents.append(exponents)
+            bases.append(_base(rate, days_per_year))
+
+        for date, transfers in V.once.items():
+            row = (date - first_day).days
+            mask = np.zeros(n, dtype=bool)
+            if 0 <= row < n and date == first_day + timedelta(days=row):
+                mask[row] = True
+            for t in transfers:
+                add(("once", date), t, mask, 0, 0.0)
+        for t in V.daily:
+            add(("daily",), t, np.ones(n, dtype=bool), 1, t.APR.daily_value)
+        for dayOfWeek, transfers in V.weekly.items():
+            for t in transfers:
+                add(("weekly", dayOfWeek), t, cal["weekday"] == dayOfWeek, 7, t.APR.daily_value)
+        for by_day in V.biweekly.values():
+            for transfers in by_day.values():
+                for t in transfers:
+                    rule = t.recurrence()
+                    add(("biweekly", rule), t, rule.mask(cal), 14, t.APR.daily_value)
+        for dayOfMonth, transfers in V.monthly.items():
+            for t in transfers:
+                add(("monthly", dayOfMonth), t, cal["day"] == dayOfMonth, cal["daysSinceLastMonth"], t.APR.daily_value)
+        for by_day in V.yearly.values():
+            for transfers in by_day.values():
+                for t in transfers:
+                    rule = t.recurrence()
+                    add(("yearly", rule), t, rule.mask(cal), 365, t.APR.daily_value)
+        for by_day in V.nyearly.values():
+            for transfers in by_day.values():
+                for t in transfers:
+                    rule = t.recurrence()
+                    add(("nyearly", rule), t, rule.mask(cal), t.nyears*365, t.APR.daily_value, t.nyears*365)
+
+        self.base = np.array(bases)
+        self.initial = np.array([t.amount for t in self.transfers], dtype=float)
+
+        self.accounts: List[Account] = list(V.accounts_by_name.values())
+        self.account_interest = np.array([_account_interest(a) for a in self.accounts])
+        self.account_growth = 1 + self.account_interest
+
+    def row(self, date: datetime) -> int:
+        """ The row of a date in this table. """
+        return (date - self.first_day).days
+
+    def amount(self, t: Transfer, row: int) -> float:
+        """ The amount a transfer moves if it fires on row. """
+        k = self._index[id(t)]
+        return float(self.initial[k] * self.base[k] ** self._exponents[k][row])
+
+    def firing_amounts(self, k: int) -> np.ndarray:
+        """ The amounts the k-th transfer moves on each of the rows it fires on. """
+        return self.initial[k] * self.base[k] ** self._exponents[k][self.rows[k]]
+
+    def amounts_after(self, row: int) -> np.ndarray:
+        """ The amounts of every transfer once the day at row is over. """
+        return self.initial * self.base ** np.array([e[row + 1] for e in self._exponents])
+
+    def amounts_by_id(self, row: int) -> Dict[int, float]:
+        """ The amounts of every transfer once the day at row is over, by the id() of the transfer. """
+        return {id(t): amount for t, amount in zip(self.transfers, self.amounts_after(row).tolist())}
+
+    def account_multiplier(self, from_row: int, to_row: int) -> np.ndarray:
+        """ How much each account's balance is multiplied by between two rows when nothing is transferred. """
+        return self.account_growth ** (to_row - from_row)
@@ -0,0 +1,110 @@
+"""
+Measuring where the time of a simulation goes.
+
+    with instrument() as stats:
+        plot_accounts(starting_plan, bridges, from_date, to_date)
+    print(stats.report())
+
+While an Instrumentation is active, the engines add up the time spent in each phase of the simulation:
+building the schedules of the transfers, applying the transfers, compounding the accounts,
+testing and applying bridges, and building the output. They also count the transfers applied
+and the times a bridge was asked whether it activates, and time every bridge's trigger_function.
+The engines look for an active Instrumentation once per simulation and measure nothing without one.
+"""
+from typing import Any, Dict, Iterator, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+
+from lifechoices.classes import Bridge
+
+PHASES = ("schedule", "transfers", "compounding", "bridges", "output")
+
+
+@dataclass
+class Instrumentation:
+    """
+    What the simulations run while it was active spent their time on.
+    The loop engine counts every transfer it applies and every trigger_function it calls.
+    The array engines count the transfers in the stretches they compute, a ThresholdBridge
+    as tested once per stretch, and a CallbackBridge once for every day it is asked about.
+    """
+    seconds: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    transfers_applied: int = 0
+    bridges_tested: int = 0
+    bridge_seconds: Dict[str, float] = field(default_factory=dict)  # Time spent in each bridge's trigger_function
+    bridge_calls: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, phase: str, seconds: float):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+
+    def lap(self, phase: str, since: float) -> float:
+        """ Adds the time since since to phase, and returns the time now to start the next lap from. """
+        now = perf_counter()
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + now - since
+        return now
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, perf_counter() - start)
+
+    def trigger(self, bridge: Bridge, this_data: Dict[str, Any]) -> bool:
+        """ Calls bridge.trigger_function on this_data, timing it. """
+        start = perf_counter()
+        triggered = bridge.trigger_function(this_data)
+        self.bridge_seconds[bridge.name] = self.bridge_seconds.get(bridge.name, 0.0) + perf_counter() - start
+        self.bridge_calls[bridge.name] = self.bridge_calls.get(bridge.name, 0) + 1
+        self.bridges_tested += 1
+        return triggered
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ The numbers as plain dictionaries, ready for json.dump. """
+        return {
+            "seconds": dict(self.seconds),
+            "total_seconds": self.total_seconds,
+            "transfers_applied": self.transfers_applied,
+            "bridges_tested": self.bridges_tested,
+            "bridge_seconds": dict(self.bridge_seconds),
+            "bridge_calls": dict(self.bridge_calls),
+        }
+
+    def report(self) -> str:
+        """ A table of the phases and bridges, slowest first. """
+        total = self.total_seconds or 1.0
+        lines = [f"{phase:<12} {seconds:>10.4f}s {100 * seconds / total:>5.1f}%"
+                 for phase, seconds in sorted(self.seconds.items(), key=lambda item: -item[1])]
+        lines.append(f"{self.transfers_applied} transfers applied, {self.bridges_tested} bridge tests")
+        lines += [f"  {name:<30} {seconds:>10.4f}s in {self.bridge_calls[name]} calls"
+                  for name, seconds in sorted(self.bridge_seconds.items(), key=lambda item: -item[1])]
+        return "\n".join(lines)
+
+
+_active: ContextVar[Optional[Instrumentation]] = ContextVar("lifechoices_instrumentation", default=None)
+
+
+def active_instrumentation() -> Optional[Instrumentation]:
+    """ The Instrumentation simulations started now add to, if any. """
+    return _active.get()
+
+
+@contextmanager
+def instrument(stats: Optional[Instrumentation] = None) -> Iterator[Instrumentation]:
+    """
+    Makes stats, or a new Instrumentation, the one the simulations started inside the with block add to.
+    A simulation iterated with iter_accounts adds to the one active when it takes its first step.
+    """
+    stats = Instrumentation() if stats is None else stats
+    token = _active.set(stats)
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
@@ -0,0 +1,195 @@
+"""
+Where the money of a simulation came from and went to.
+
+    ledger = Ledger()
+    result = simulate(starting_plan, bridges, from_date, to_date, engine="loop", ledger=ledger)
+    ledger.transfer_totals_by_year().to_pandas()  # what every transfer moved in every year
+    ledger.cumulative_interest()["Savings"]  # the interest Savings earned up to every day
+
+A Ledger records every transfer the loop engine applies, as the day, the transfer and the amount it moved,
+and the interest every account earns every day, as the day, the account and the interest. They are appended
+to typed arrays from the array module, which hold plain numbers instead of python objects, and read as numpy arrays
+without copying them once the simulation is done. The accounts a transfer moves money between are kept
+once per transfer instead of once per entry, so an entry takes 16 bytes: a monthly transfer over 100 years
+is about 19 KB, and 1,000 of them about 19 MB.
+
+Transfers and accounts are numbered in the order they first show up, and keep their numbers across bridges,
+a transfer being the same one when it has the same name and accounts. Money a bridge moves itself,
+like the balance retirement_bridge moves into a new account, is not a transfer, and is not in the ledger.
+"""
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+from array import array
+from datetime import datetime
+from itertools import repeat
+
+import numpy as np
+
+from lifechoices.result import SimulationResult
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from lifechoices.state import PlanState
+
+OUTSIDE = -1  # The account of money moved to or from no account
+
+
+class Ledger:
+    """
+    The transfers and interest of one simulation, filled by simulate(..., engine="loop", ledger=ledger).
+    Simulating with a ledger again starts it over.
+    """
+
+    def __init__(self):
+        self._begin(None)
+
+    def _begin(self, first_day: Optional[datetime]):
+        self.first_day = first_day
+        self.transfer_names: List[str] = []
+        self.account_names: List[str] = []
+        self._transfer_index: Dict[Tuple[str, Optional[str], Optional[str]], int] = {}
+        self._account_index: Dict[str, int] = {}
+        self._transfer_accounts = array("i")  # from and to of every transfer, one after the other
+        self._transfer_day, self._transfer, self._amount = array("i"), array("i"), array("d")
+        self._interest_day, self._interest_account, self._interest = array("i"), array("i"), array("d")
+        # The ledger ids of the transfers and accounts of the plan being simulated, by their ids in its PlanState
+        self._ids: List[int] = []
+        self._earning: List[Tuple[int, int]] = []  # (id in the PlanState, ledger id) of the accounts that earn interest
+
+    def _account(self, name: Optional[str]) -> int:
+        if name is None:
+            return OUTSIDE
+        if name not in self._account_index:
+            self._account_index[name] = len(self.account_names)
+            self.account_names.append(name)
+        return self._account_index[name]
+
+    def _bind(self, state: "PlanState"):
+        """ Numbers the transfers and accounts of a newly compiled plan. """
+        accounts = [self._account(name) for name in state.names]
+        self._earning = [(k, accounts[k]) for k, rate in enumerate(state.interest[:len(accounts)]) if rate != 0.0]
+        self._ids = []
+        for t in state.transfers:
+            key = (t.name, t.from_account, t.to_account)
+            if key not in self._transfer_index:
+                self._transfer_index[key] = len(self.transfer_names)
+                # Transfers of the same name between other accounts are told apart by them
+                name = t.name if t.name not in self.transfer_names else f"{t.name} ({t.from_account} to {t.to_account})"
+                self.transfer_names.append(name)
+                self._transfer_accounts.extend((self._account(t.from_account), self._account(t.to_account)))
+            self._ids.append(self._transfer_index[key])
+
+    def _add_transfers(self, day: int, ids: Sequence[int], amounts: List[float]):
+        """ Records the transfers of ids, by their ids in the PlanState, moving their amounts on day. """
+        ledger_ids = self._ids
+        self._transfer_day.extend(repeat(day, len(ids)))
+        self._transfer.extend([ledger_ids[k] for k in ids])
+        self._amount.extend([amounts[k] for k in ids])
+
+    def _add_interest(self, day: int, balances: List[float], interest: List[float]):
+        """ Records the interest the balances earn on day, before they are compounded. """
+        for k, account in self._earning:
+            earned = balances[k] * interest[k]
+            if earned:
+                self._interest_day.append(day)
+                self._interest_account.append(account)
+                self._interest.append(earned)
+
+    # The entries as numpy arrays, on top of the memory of the typed arrays
+
+    @property
+    def days(self) -> np.ndarray:
+        """ The day of every transfer, counting from the first day of the simulation as 0. """
+        return np.frombuffer(self._transfer_day, dtype=np.intc)
+
+    @property
+    def transfers(self) -> np.ndarray:
+        """ The transfer of every entry, an index into transfer_names. """
+        return np.frombuffer(self._transfer, dtype=np.intc)
+
+    @property
+    def amounts(self) -> np.ndarray:
+        """ What every transfer moved from its from account to its to account. """
+        return np.frombuffer(self._amount, dtype=np.float64)
+
+    @property
+    def from_accounts(self) -> np.ndarray:
+        """ The account every transfer moved money from, an index into account_names or OUTSIDE. """
+        return np.frombuffer(self._transfer_accounts, dtype=np.intc)[0::2][self.transfers]
+
+    @property
+    def to_accounts(self) -> np.ndarray:
+        return np.frombuffer(self._transfer_accounts, dtype=np.intc)[1::2][self.transfers]
+
+    @property
+    def interest_days(self) -> np.ndarray:
+        return np.frombuffer(self._interest_day, dtype=np.intc)
+
+    @property
+    def interest_accounts(self) -> np.ndarray:
+        """ The account that earned every interest entry, an index into account_names. """
+        return np.frombuffer(self._interest_account, dtype=np.intc)
+
+    @property
+    def interest(self) -> np.ndarray:
+        return np.frombuffer(self._interest, dtype=np.float64)
+
+    def __len__(self) -> int:
+        """ The number of transfers recorded. """
+        return len(self._transfer)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self._transfer_accounts, self._transfer_day, self._transfer, self._amount,
+                  self._interest_day, self._interest_account, self._interest)
+        return sum(len(a) * a.itemsize for a in arrays)
+
+    # Queries
+
+    def _dates(self, days: np.ndarray) -> np.ndarray:
+        return np.datetime64(self.first_day, "D") + days.astype(np.int64)
+
+    def _totals_by_year(self, days: np.ndarray, columns: np.ndarray, values: np.ndarray, names: List[str]) -> SimulationResult:
+        if self.first_day is None:
+            raise RuntimeError("The ledger has not been filled by a simulation yet.")
+        years = self._dates(days).astype("datetime64[Y]").astype(np.int64)
+        first = years.min() if len(years) else self.first_day.year - 1970
+        n_years = int(years.max() - first + 1) if len(years) else 0
+        totals = np.bincount((years - first) * len(names) + columns, weights=values, minlength=n_years * len(names)).astype(np.float64)
+        # The last day of every year
+        dates = (np.arange(first + 1, first + 1 + n_years).astype("datetime64[Y]").astype("datetime64[D]") - 1)
+        return SimulationResult(tuple(names), dates.astype("datetime64[us]"), totals.reshape(n_years, len(names)))
+
+    def transfer_totals_by_year(self) -> SimulationResult:
+        """ What every transfer moved in every year, with a column per transfer name dated the last day of the year. """
+        return self._totals_by_year(self.days, self.transfers, self.amounts, self.transfer_names)
+
+    def interest_totals_by_year(self) -> SimulationResult:
+        """ The interest every account earned in every year, dated the last day of the year. """
+        return self._totals_by_year(self.interest_days, self.interest_accounts, self.interest, self.account_names)
+
+    def cumulative_interest(self) -> SimulationResult:
+        """ The interest every account earned from the start up to every day with any, with a column per account. """
+        if self.first_day is None:
+            raise RuntimeError("The ledger has not been filled by a simulation yet.")
+        days, rows = np.unique(self.interest_days, return_inverse=True)
+        earned = np.zeros((len(days), len(self.account_names)))
+        np.add.at(earned, (rows, self.interest_accounts), self.interest)
+        return SimulationResult(tuple(self.account_names), self._dates(days).astype("datetime64[us]"), np.cumsum(earned, axis=0))
+
+    def net_flows(self) -> Dict[str, float]:
+        """ What the transfers moved into every account in total, less what they moved out of it. """
+        into = np.bincount(self.to_accounts + 1, weights=self.amounts, minlength=len(self.account_names) + 1)
+        out = np.bincount(self.from_accounts + 1, weights=self.amounts, minlength=len(self.account_names) + 1)
+        return dict(zip(self.account_names, (into - out)[1:].tolist()))
+
+    def to_pandas(self) -> "pd.DataFrame":
+        """ The transfers as a DataFrame with Date, Transfer, From, To and Amount columns. """
+        import pandas as pd
+        accounts = self.account_names + ["(outside)"]
+        return pd.DataFrame({
+            "Date": self._dates(self.days).astype("datetime64[ns]"),
+            "Transfer": pd.Categorical.from_codes(self.transfers, self.transfer_names),
+            "From": pd.Categorical.from_codes(np.where(self.from_accounts == OUTSIDE, len(accounts) - 1, self.from_accounts), accounts),
+            "To": pd.Categorical.from_codes(np.where(self.to_accounts == OUTSIDE, len(accounts) - 1, self.to_accounts), accounts),
+            "Amount": self.amounts,
+        }, copy=False)
@@ -1,58 +1,23 @@
-from typing import Dict, List, Union, Any, Set
-from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple, Union, Any
+from dataclasses import replace
 from datetime import datetime, timedelta
-from collections import defaultdict
-
-from lifechoices.classes import Account, Bridge, DateBridge, CallbackBridge, Plan, Once, Daily, Weekly, BiWeekly, Monthly, Yearly, NYearly
-from lifechoices.utils import weekOfMonth, monthdelta, strip_date_timestamp, effective_interest_rate_per_t_periods
-
-import pandas as pd
-
-
-@dataclass(frozen=False)
-class _GenerateFromPlanOutput:
-    once: Dict[datetime, List[Once]]
-    daily: List[Daily]
-    weekly: Dict[int, List[Weekly]]
-    biweekly: Dict[int, Dict[int, List[BiWeekly]]]
-    monthly: Dict[int, List[Monthly]]
-    yearly: Dict[int, Dict[int, List[Yearly]]]
-    nyearly: Dict[int, Dict[int, Dict[int, List[NYearly]]]]
-    accounts_by_name: Dict[str, Account]
-
-
-def _generate_from_plan(p: Plan) -> _GenerateFromPlanOutput:
-    once = defaultdict(list)
-    daily = []
-    weekly = defaultdict(list)
-    biweekly = defaultdict(lambda: defaultdict(list))
-    monthly = defaultdict(list)
-    yearly = defaultdict(lambda: defaultdict(list))
-    nyearly = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-
-    accounts_by_name = {a.name: a for a in p.accounts}
-    for t in p.transfers:
-        t.check()
-        if isinstance(t, Daily):
-            daily.append(t)
-        if isinstance(t, Once):
-            once[t.date].append(t)
-        elif isinstance(t, Weekly):
-            weekly[t.dayOfWeek].append(t)
-        elif isinstance(t, BiWeekly):
-            biweekly[t.weekOffset][t.dayOfWeek].append(t)
-        elif isinstance(t, Monthly):
-            monthly[t.dayOfMonth].append(t)
-        elif isinstance(t, Yearly):
-            yearly[t.month][t.dayOfMonth].append(t)
-        elif isinstance(t, NYearly):
-            for y in range(1997, 30_000, t.nyears):   # TODO: This is such a hack
-                nyearly[y][t.month][t.dayOfMonth].append(t)
-        else:
-            raise TypeError(f"Type '{type(t)}' not recognized.")
-    return _GenerateFromPlanOutput(
-        once, daily, weekly, biweekly, monthly, yearly, nyearly, accounts_by_name
-    )
+from time import perf_counter
+
+from lifechoices.classes import Account, Bridge, DateBridge, CallbackBridge, ThresholdBridge, Plan
+from lifechoices.utils import strip_date_timestamp, _is_dataframe
+from lifechoices.state import PlanState
+from lifechoices.calendar import calendar_lists
+from lifechoices.engine import iter_vectorized, iter_events, _iter_blocks, _number_of_days
+from lifechoices.resolution import Resolution, as_resolution
+from lifechoices.result import SimulationResult
+from lifechoices.instrumentation import active_instrumentation
+from lifechoices.ledger import Ledger
+
+import numpy as np
+
+# pandas takes longer to import than the rest put together, so it is only imported when a DataFrame is asked for
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 # TODO: Append all dates removing the timestamp
@@ -62,6 +27,8 @@ def plot_accounts(
         from_date: datetime,
         to_date: datetime,
         tall_data: bool = True,
+        engine: str = "loop",
+        resolution: Union[str, Iterable[datetime], Resolution] = "daily",
 ) -> List[Dict[str, float]]:
     """
     This is the main data plotting function in the code.
@@ -84,93 +51,216 @@ def plot_accounts(
     Date2 Value3   Value4   ...
     ...   ...      ...
 
+    The engine picks how the simulation is run. "loop" steps through every day in python,
+    "vectorized" computes whole stretches between bridges with numpy arrays,
+    and "events" only computes the days something happens on and fills in the rest (see lifechoices.engine).
+    They all produce the same numbers up to floating point rounding.
+
+    The resolution picks which days are recorded: "daily", "weekly", "month-end", "year-end"
+    or a list of dates (see lifechoices.resolution.Resolution).
+    To get the rows one at a time while the simulation runs, use iter_accounts,
+    and to get them as one matrix of balances, use simulate.
+
+    Plans, accounts and transfers are frozen, so none of the engines change the ones they are given.
+    A bridge is handed a new plan with the balances and transfer amounts of the day it activates on.
+
+    To see where the time goes, run it inside lifechoices.instrumentation.instrument().
+
+    To see where the money came from and went to, simulate with a lifechoices.ledger.Ledger,
+    and engine="loop": the vectorized and events engines sum the transfers of a day without applying them
+    one at a time, so they can not fill one, and simulate raises ValueError if asked to.
+    """
+    data = list(iter_accounts(starting_plan, bridges, from_date, to_date, engine=engine, resolution=resolution))
+
+    # Make our data "tall"
+    if tall_data:
+        stats = active_instrumentation()
+        if stats is None:
+            return wide_to_tall(data)
+        with stats.phase("output"):
+            return wide_to_tall(data)
+
+    return data
+
+
+def iter_accounts(
+        starting_plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+        tall_data: bool = False,
+        engine: str = "loop",
+        resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the rows of plot_accounts(..., tall_data=False) one at a time, as the simulation advances.
+    Only the days in resolution are kept, so the memory this needs depends on how much is recorded
+    and not on how long the simulation runs for.
+    With tall_data every row is split into one {"Account", "Date", "Value"} row per account.
     """
-    plan = starting_plan
+    resolution = as_resolution(resolution, from_date)
+    if engine == "loop":
+        rows = _iter_loop(starting_plan, bridges, from_date, to_date, resolution)
+    elif engine == "vectorized":
+        rows = iter_vectorized(starting_plan, bridges, from_date, to_date, resolution)
+    elif engine == "events":
+        rows = iter_events(starting_plan, bridges, from_date, to_date, resolution)
+    else:
+        raise ValueError(f"engine should be 'loop', 'vectorized' or 'events'. Got {engine}")
+
+    if not tall_data:
+        return rows
+    return ({"Account": account, "Date": row["Date"], "Value": value}
+            for row in rows for account, value in row.items() if account != "Date")
+
+
+def simulate(
+        starting_plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+        engine: str = "vectorized",
+        resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+        ledger: Optional[Ledger] = None,
+) -> SimulationResult:
+    """
+    Runs the same simulation as plot_accounts, but returns a SimulationResult that holds the balances
+    in one matrix instead of a dictionary per day. The array engines fill it without ever making those dictionaries.
+    Use result.to_pandas() or result.to_pandas(tall=True) to get a DataFrame on top of the same memory.
+    The result also has the bridges that activated, and the days they did, as its bridges.
+    Run inside lifechoices.instrumentation.instrument(), the result carries what was measured as its instrumentation.
+    A lifechoices.ledger.Ledger given as ledger is filled with every transfer applied and the interest earned.
+    Only the loop engine, that applies transfers one at a time, can do that, so a ledger needs engine="loop"
+    and not the default "vectorized".
+    """
+    resolution = as_resolution(resolution, from_date)
+    activations: List[Tuple[str, datetime]] = []
+    if ledger is not None and engine != "loop":
+        raise ValueError(f"Only the loop engine fills a ledger, pass engine=\"loop\" with it. Got engine {engine}")
+    if engine == "loop":
+        result = SimulationResult.from_rows(_iter_loop(starting_plan, bridges, from_date, to_date, resolution, activations, ledger))
+    elif engine in ("vectorized", "events"):
+        blocks = _iter_blocks(starting_plan, bridges, from_date, to_date, resolution, engine == "events", activations)
+        result = SimulationResult.from_blocks(blocks)
+    else:
+        raise ValueError(f"engine should be 'loop', 'vectorized' or 'events'. Got {engine}")
+    result = replace(result, bridges=tuple(activations))
+    stats = active_instrumentation()
+    if stats is not None:
+        result = replace(result, instrumentation=stats.to_dict())
+    return result
+
+
+def _iter_loop(
+        starting_plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+        resolution: Resolution,
+        activations: Optional[List[Tuple[str, datetime]]] = None,
+        ledger: Optional[Ledger] = None,
+) -> Iterator[Dict[str, float]]:
+    """
+    Steps through the days between from_date and to_date one at a time,
+    on the plan compiled into lists by id (see lifechoices.state.PlanState).
+    The name and day of every bridge that activates is appended to activations, if given,
+    and the transfers and interest of every day are recorded in ledger.
+    """
+    # Without an active instrumentation every measurement below is skipped by a single check
+    stats = active_instrumentation()
+    if stats is not None:
+        tick = perf_counter()
     bridges_by_date = {b.trigger_date: b for b in bridges if isinstance(b, DateBridge)}
-    V = _generate_from_plan(plan)
+    conditional = [b for b in bridges if isinstance(b, (CallbackBridge, ThresholdBridge))]
+    S = PlanState.compile(starting_plan)
     this_date = strip_date_timestamp(from_date)
-    first_data = {a.name: a.amount for k, a in V.accounts_by_name.items()}
+    if ledger is not None:
+        ledger._begin(this_date)
+        ledger._bind(S)
+    calendar = calendar_lists(this_date + timedelta(days=1), _number_of_days(from_date, to_date))
+    row = -1
+    if stats is not None:
+        stats.lap("schedule", tick)
+    first_data = S.balances_by_name()
     first_data["Date"] = from_date
-    data: List[Dict[str, float]] = [first_data]
+    if from_date in resolution:
+        yield first_data
     while this_date < to_date:
         # Increment our current date
         # We do this at the beginning of the loop because we assume
         # That you know the "true" account values at the end of the start day
         this_date += timedelta(days=1)
+        row += 1
+        if stats is not None:
+            tick = perf_counter()
+        this_bridge = bridges_by_date.pop(this_date, None)
 
-        # Get our references to our transfer lists
-        this_bridge = bridges_by_date[this_date] if this_date in bridges_by_date else None
-        weeklyref = V.weekly[this_date.weekday()]
-        biweeklyref = V.biweekly[weekOfMonth(this_date) % 2][this_date.weekday()]
-        monthlyref = V.monthly[this_date.day]
-        yearlyref = V.yearly[this_date.month][this_date.day]
-        nyearlyref = V.nyearly[this_date.year][this_date.month][this_date.day]
-        this_transactions = V.once[this_date] + V.daily + weeklyref + biweeklyref + monthlyref + yearlyref + nyearlyref
-
-        # Iterate over transactions
-        for t in this_transactions:
-            if t.from_account:
-                V.accounts_by_name[t.from_account].amount -= t.amount
-            if t.to_account:
-                V.accounts_by_name[t.to_account].amount += t.amount
-
-        # Handle transaction APR
-        # TODO: Handle the math of these for i in range statements with exponential functions instead to make it faster
-        for t in V.daily:
-            t.amount += effective_interest_rate_per_t_periods(t.APR.to_daily().value, 365, 1 / 365) * t.amount
-        for t in weeklyref:
-            t.amount += effective_interest_rate_per_t_periods(t.APR.to_daily().value, 365, 7 / 365) * t.amount
-        for t in biweeklyref:
-            t.amount += effective_interest_rate_per_t_periods(t.APR.to_daily().value, 365, 14 / 365) * t.amount
-        for t in monthlyref:
-            last_date = monthdelta(this_date, -1)
-            nb_days = this_date - last_date
-            t.amount += effective_interest_rate_per_t_periods(t.APR.to_daily().value, 365, nb_days.days / 365) * t.amount
-        for t in yearlyref:
-            t.amount += effective_interest_rate_per_t_periods(t.APR.to_daily().value, 365, 1.0) * t.amount
-        for t in nyearlyref:
-            t.amount += effective_interest_rate_per_t_periods(t.APR.to_daily().value, t.nyears*365, 1.0) * t.amount
+        # Apply today's transfers, their amounts grow with their APR as they fire
+        applied = S.apply_transfers(this_date, calendar, row, ledger)
+        if stats is not None:
+            tick = stats.lap("transfers", tick)
+            stats.transfers_applied += applied
 
         # Handle account APR
-        for _, a in V.accounts_by_name.items():
-            a.amount += effective_interest_rate_per_t_periods(a.APR.to_daily().value, 365, 1 / 365) * a.amount
+        if ledger is not None:
+            ledger._add_interest(row + 1, S.balances, S.interest)
+        S.compound()
+        if stats is not None:
+            tick = stats.lap("compounding", tick)
 
-        # Add our data to our output
-        this_data = {a.name: a.amount for _, a in V.accounts_by_name.items()}
-        this_data["Date"] = this_date
-        data.append(this_data)
+        # Add our data to our output, only made on days it is recorded or a callback is asked about
+        recorded = this_date in resolution
+        if recorded or conditional:
+            this_data = S.balances_by_name()
+            this_data["Date"] = this_date
+        if stats is not None:
+            tick = stats.lap("output", tick)
 
         # Handle Bridges
+        # Bridges are handed a new plan with the balances and transfer amounts of today
         bridge_activated = False
         if this_bridge is not None:
-            plan = this_bridge(plan)
-            V = _generate_from_plan(plan)
-            if bridge_activated:
-                raise RuntimeError("More than one bridge activated on the same date.")
+            plan = this_bridge(S.to_plan())
+            if stats is not None:
+                tick = stats.lap("bridges", tick)
+            S = PlanState.compile(plan)
+            if ledger is not None:
+                ledger._bind(S)
+            if stats is not None:
+                tick = stats.lap("schedule", tick)
             bridge_activated = True
-            del bridges_by_date[this_date]
+            if activations is not None:
+                activations.append((this_bridge.name, this_date))
             print(f"Bridge {this_bridge.name} Activated on {this_date}")
 
         # Handle Callback Bridges
-        for i, b in enumerate(bridges):
-            if isinstance(b, CallbackBridge) and b.trigger_function(this_data):
-                plan = b(plan)
-                V = _generate_from_plan(plan)
+        for i, b in enumerate(conditional):
+            triggered = b.trigger_function(this_data) if stats is None else stats.trigger(b, this_data)
+            if triggered:
+                plan = b(S.to_plan())
+                if stats is not None:
+                    tick = stats.lap("bridges", tick)
+                S = PlanState.compile(plan)
+                if ledger is not None:
+                    ledger._bind(S)
+                if stats is not None:
+                    tick = stats.lap("schedule", tick)
                 if bridge_activated:
                     raise RuntimeError("More than one bridge activated on the same date.")
                 bridge_activated = True
-                del bridges[i]
+                del conditional[i]
+                if activations is not None:
+                    activations.append((b.name, this_date))
                 print(f"Bridge {b.name} Activated on {this_date}")
                 break
+        if stats is not None:
+            stats.lap("bridges", tick)
 
-    # Make our data "tall"
-    if tall_data:
-        return wide_to_tall(data)
-
-    return data
+        if recorded:
+            yield this_data
 
 
-def wide_to_tall(data: Union[List[Dict[str, Any]], pd.DataFrame]) -> Union[Dict[str, List[Any]], pd.DataFrame]:
+def wide_to_tall(data: Union[List[Dict[str, Any]], "pd.DataFrame"]) -> Union[Dict[str, List[Any]], "pd.DataFrame"]:
     """
     If you use the flag tall_data the data will look like this:
     Date  Account  Value
@@ -185,29 +275,57 @@ def wide_to_tall(data: Union[List[Dict[str, Any]], pd.DataFrame]) -> Union[Dict[
     Date1 Value1   Value2   ...
     Date2 Value3   Value4   ...
     ...   ...      ...
+
+    Accounts come in the order they first appear in, and accounts missing from a row get a NaN value.
+    A DataFrame may have its dates in a Date column or as its index. See tall_to_wide for the inverse.
     """
-    # Handle dataframes
-    if isinstance(data, pd.DataFrame):
-        create_dataframe = True
-        data = [dict(row) for _, row in data.iterrows()]
-    else:
-        create_dataframe = False
+    # Handle dataframes by reshaping their values, every row becomes len(accounts) rows in a row
+    if _is_dataframe(data):
+        import pandas as pd
+        accounts = [c for c in data.columns if c != "Date"]
+        dates = data["Date"].to_numpy() if "Date" in data.columns else data.index.to_numpy()
+        return pd.DataFrame({
+            "Account": np.tile(np.array(accounts, dtype=object), len(data)),
+            "Date": np.repeat(dates, len(accounts)),
+            "Value": data[accounts].to_numpy().reshape(-1),
+        })
+
     # Get the accounts represented in the dataset
-    account_names = {key for row in data for key in row if key != "Date"}
-
-    # Make a list for each output column
-    account, date, value = [], [], []
-    for row in data:
-        for acc in account_names:
-            date.append(row["Date"])
-            account.append(acc)
-            if acc in row:
-                value.append(row[acc])
-            else:
-                value.append(float("NaN"))
-    out = {"Account": account,
-           "Date": date,
-           "Value": value}
-    if create_dataframe:
-        return pd.DataFrame(out)
+    accounts = list(dict.fromkeys(key for row in data for key in row if key != "Date"))
+    nan = float("NaN")
+    return {"Account": accounts * len(data),
+            "Date": [row["Date"] for row in data for _ in accounts],
+            "Value": [row.get(acc, nan) for row in data for acc in accounts]}
+
+
+def tall_to_wide(data: Union[Dict[str, List[Any]], "pd.DataFrame"]) -> Union[List[Dict[str, Any]], "pd.DataFrame"]:
+    """
+    The inverse of wide_to_tall. Dates and accounts keep the order they first appear in.
+    From the columns plot_accounts returns with tall_data it gives back the rows it returns without,
+    leaving out the accounts whose value is NaN. From a DataFrame it gives a DataFrame with a column per account
+    and a Date column.
+    """
+    if _is_dataframe(data):
+        import pandas as pd
+        accounts = pd.unique(data["Account"])
+        n = len(accounts)
+        # What wide_to_tall makes is every account in the same order for every date, which is just a reshape
+        if n and len(data) % n == 0 and (data["Account"].to_numpy() == np.tile(accounts, len(data) // n)).all():
+            out = pd.DataFrame(data["Value"].to_numpy().reshape(-1, n), columns=list(accounts))
+            out["Date"] = data["Date"].to_numpy()[::n]
+            return out
+        dates = pd.unique(data["Date"])
+        out = data.pivot(index="Date", columns="Account", values="Value").reindex(index=dates, columns=accounts)
+        out = out.reset_index().rename_axis(columns=None)
+        return out[list(accounts) + ["Date"]]
+
+    rows: Dict[Any, Dict[str, Any]] = {}
+    for account, date, value in zip(data["Account"], data["Date"], data["Value"]):
+        row = rows.setdefault(date, {})
+        if value == value:  # NaN is an account missing from that row
+            row[account] = value
+    out = []
+    for date, row in rows.items():
+        row["Date"] = date
+        out.append(row)
     return out
@@ -0,0 +1,322 @@
+"""
+Monte Carlo simulation of a plan with uncertain account APRs and inflation.
+
+The transfers of a plan do not depend on how fast its accounts grow, so the schedule of a plan
+(where every stretch between bridges starts, which days money moves on and how much) is worked out once.
+Every path then only draws its rates, compounds the accounts over those stretches in closed form,
+and asks the bridges what the next plan starts with.
+Paths are spread over a pool of processes, and only the percentiles of the balances are returned.
+They are simulated a block of dates at a time, each path picking up where it stopped, and the percentiles
+of a block are taken before the next one, so at most _BLOCK_BYTES of balances are held at once
+however many paths and dates there are. Balances are float64 throughout, so millions keep their cents.
+"""
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass
+from contextlib import nullcontext
+from datetime import datetime
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+from lifechoices.classes import APR, Bridge, CallbackBridge, ThresholdBridge, Plan
+from lifechoices.schedule import _generate_from_plan
+from lifechoices.state import _with_amounts
+from lifechoices.engine import _compound, _number_of_days, _simulate_stretches
+from lifechoices.resolution import Resolution, as_resolution
+from lifechoices.result import SimulationResult
+from lifechoices.utils import effective_interest_rate_per_t_periods
+
+# How many bytes the balances of every path for one block of dates may take
+_BLOCK_BYTES = 1 << 26
+
+
+@dataclass(frozen=True)
+class Normal:
+    """ A normally distributed rate. """
+    mean: float
+    std: float
+
+    def sample(self, rng: np.random.Generator) -> float:
+        return float(rng.normal(self.mean, self.std))
+
+
+@dataclass(frozen=True)
+class Uniform:
+    """ A rate drawn uniformly between low and high. """
+    low: float
+    high: float
+
+    def sample(self, rng: np.random.Generator) -> float:
+        return float(rng.uniform(self.low, self.high))
+
+
+Distribution = Union[Normal, Uniform, float]
+
+
+def _sample(distribution: Distribution, rng: np.random.Generator) -> float:
+    """ Draws from a distribution, a plain number is a rate that does not change. """
+    if isinstance(distribution, (int, float)):
+        return float(distribution)
+    return distribution.sample(rng)
+
+
+@dataclass
+class _CompiledStretch:
+    """ A stretch of the simulation as every path sees it, see lifechoices.engine._Stretch. """
+    names: List[str]
+    aprs: List[APR]
+    days: np.ndarray  # the days balances are computed for, counting from 1
+    flows: np.ndarray
+    keep: np.ndarray  # which of those days are recorded
+    out_rows: np.ndarray  # the rows of the result they are recorded in
+    columns: List[int]  # the columns of the result names are in
+    # If the stretch starts with a bridge, the balances it starts from are offset + weights @ the balances before it
+    offset: Optional[np.ndarray] = None
+    weights: Optional[np.ndarray] = None
+
+
+class _PathSchedule:
+    """
+    Everything about a simulation that is the same for every path.
+    Built by running the event driven engine once with the rates in the plan.
+
+    Every path gets the transfers the bridges gave while it was built. The balances a bridge hands
+    to the next plan are measured once, by giving it a copy of the plan with every account empty
+    and then with one dollar in each account, which is exact as long as the new balances are
+    sums of the old ones plus constants, like moving an account into a new one or paying into it.
+    """
+
+    def __init__(self, starting_plan: Plan, bridges: List[Bridge], from_date: datetime, to_date: datetime, resolution: Resolution):
+        if any(isinstance(b, (CallbackBridge, ThresholdBridge)) for b in bridges):
+            raise ValueError("monte_carlo only supports DateBridges, when a conditional bridge activates depends on the path.")
+        V = _generate_from_plan(starting_plan)
+        self.start = np.array([a.amount for a in V.accounts_by_name.values()], dtype=float)
+
+        applied: List[Tuple[Bridge, np.ndarray, np.ndarray, np.ndarray]] = []
+
+        def before_bridge(bridge: Bridge, plan: Plan):
+            balance = np.array([a.amount for a in _generate_from_plan(plan).accounts_by_name.values()], dtype=float)
+            offset, weights = _measure_bridge(bridge, plan)
+            applied.append((bridge, balance, offset, weights))
+
+        column: Dict[str, int] = {name: i for i, name in enumerate(V.accounts_by_name)}
+        self.start_columns = list(column.values())
+        self.first_in_resolution = from_date in resolution
+        dates = [np.array([from_date], dtype="datetime64[us]")] if self.first_in_resolution else []
+        n_rows = len(dates)
+        output_dates = resolution.dates(resolution.first_day, _number_of_days(from_date, to_date) + 1)
+        self.stretches: List[_CompiledStretch] = []
+        for st in _simulate_stretches(starting_plan, bridges, from_date, to_date, True, output_dates, before_bridge=before_bridge):
+            for name in st.names:
+                column.setdefault(name, len(column))
+            keep = resolution.mask(st.first_day, int(st.rows[-1]) + 1)[st.rows]
+            out_rows = np.arange(n_rows, n_rows + keep.sum())
+            dates.append(np.datetime64(st.first_day, "us") + st.rows[keep].astype("timedelta64[D]"))
+            n_rows += len(dates[-1])
+            if not applied and self.stretches:
+                # A long stretch the engine cut into chunks, which a path can compound in one go
+                last = self.stretches[-1]
+                last.days = np.concatenate([last.days, st.rows + 1 + last.days[-1]])
+                last.flows = np.vstack([last.flows, st.flows])
+                last.keep = np.concatenate([last.keep, keep])
+                last.out_rows = np.concatenate([last.out_rows, out_rows])
+                continue
+            stretch = _CompiledStretch(
+                names=st.names,
+                aprs=[a.APR for a in st.accounts],
+                days=st.rows + 1,
+                flows=st.flows,
+                keep=keep,
+                out_rows=out_rows,
+                columns=[column[name] for name in st.names],
+            )
+            if applied:
+                bridge, balance, stretch.offset, stretch.weights = applied.pop()
+                if not np.allclose(stretch.offset + stretch.weights @ balance, st.start, rtol=1e-9, atol=1e-6):
+                    raise ValueError(f"Bridge {bridge.name} does not hand balances on as sums of the old ones, monte_carlo can not reuse it.")
+            self.stretches.append(stretch)
+        self.accounts = tuple(column)
+        self.dates = np.concatenate(dates) if dates else np.array([], dtype="datetime64[us]")
+
+    def run(
+            self,
+            rngs: Sequence[np.random.Generator],
+            apr: Dict[str, Distribution],
+            inflation: Optional[Distribution],
+            first_row: int,
+            last_row: int,
+            state: Optional["_PathState"] = None,
+    ) -> Tuple[np.ndarray, "_PathState"]:
+        """
+        Simulates a path per random generator over the rows of the result from first_row up to last_row,
+        picking up where state, from the call for the rows before, left off.
+        Returns their balances with a matrix per path, that has a row per date and a column per account,
+        and where the paths are for the next call. All the paths are compounded together, as columns next to each other.
+        """
+        k = len(rngs)
+        draws = []
+        for rng in rngs:
+            rates = {name: _sample(distribution, rng) for name, distribution in apr.items()}
+            draws.append((rates, 0.0 if inflation is None else _sample(inflation, rng)))
+        out = np.full((k, last_row - first_row, len(self.accounts)), np.nan)
+        if self.first_in_resolution and first_row == 0 < last_row:
+            out[:, 0, self.start_columns] = self.start
+        if state is None:
+            state = _PathState(0, 0, np.tile(self.start, (k, 1)))
+        stretch, done, balance = state.stretch, state.day, state.balance
+        while stretch < len(self.stretches):
+            st = self.stretches[stretch]
+            kept = np.flatnonzero(st.keep)
+            # Up to the first day recorded in a row past last_row, or the end of the stretch if there is none
+            after = np.searchsorted(st.out_rows, last_row)
+            end = int(kept[after]) if after < len(kept) else len(st.days)
+            if end <= done:
+                break
+            if done == 0 and st.weights is not None:
+                balance = st.offset + balance @ st.weights.T
+            growth = np.array([[
+                1 + effective_interest_rate_per_t_periods(APR(rates.get(name, a.value) - shift, a.period).daily_value, 365, 1 / 365)
+                for name, a in zip(st.names, st.aprs)
+            ] for rates, shift in draws])
+            days = st.days[done:end] - (st.days[done - 1] if done else 0)
+            values = _compound(balance.reshape(-1), np.tile(st.flows[done:end], k), growth.reshape(-1), days)
+            values = values.reshape(end - done, k, len(st.names))
+            keep = st.keep[done:end]
+            recorded = int(st.keep[:done].sum())
+            rows = st.out_rows[recorded:recorded + int(keep.sum())] - first_row
+            out[:, rows[:, None], st.columns] = values[keep].transpose(1, 0, 2)
+            balance = values[-1]
+            if end < len(st.days):
+                done = end
+                break
+            stretch, done = stretch + 1, 0
+        return out, _PathState(stretch, done, balance)
+
+
+@dataclass
+class _PathState:
+    """ Where a chunk of paths is: the stretch it is in, how many of its days are done, and the balances after them. """
+    stretch: int
+    day: int
+    balance: np.ndarray  # (paths, accounts)
+
+
+def _measure_bridge(bridge: Bridge, plan: Plan) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Gives a bridge versions of plan with no money in it, and with one dollar in each account,
+    returning the balances of the plan it gives for no money and how much each dollar adds to them.
+    """
+    given = list(_generate_from_plan(plan).accounts_by_name)
+    n = len(given)
+    outputs, names = [], None
+    for amounts in np.vstack([np.zeros(n), np.eye(n)]).tolist():
+        accounts = _generate_from_plan(bridge(_with_amounts(plan, dict(zip(given, amounts))))).accounts_by_name
+        if names is not None and list(accounts) != names:
+            raise ValueError(f"Bridge {bridge.name} gives different accounts for different balances, monte_carlo can not reuse it.")
+        names = list(accounts)
+        outputs.append([a.amount for a in accounts.values()])
+    outputs = np.array(outputs, dtype=float).reshape(n + 1, -1)
+    return outputs[0], (outputs[1:] - outputs[0]).T
+
+
+@dataclass(frozen=True)
+class MonteCarloResult:
+    """
+    Percentiles of the balance of every account on every recorded date, over n_paths simulations.
+    bands has a matrix like SimulationResult.values for every one of percentiles.
+    """
+    accounts: Tuple[str, ...]
+    dates: np.ndarray  # datetime64[us]
+    percentiles: Tuple[float, ...]
+    bands: np.ndarray  # float64 (percentiles, dates, accounts)
+    n_paths: int
+
+    def percentile(self, p: float) -> SimulationResult:
+        """ One of the percentiles as a SimulationResult. """
+        return SimulationResult(self.accounts, self.dates, self.bands[self.percentiles.index(p)])
+
+    def to_pandas(self) -> "pd.DataFrame":
+        """ The bands as tall data, with a Percentile column next to Date, Account and Value. """
+        import pandas as pd
+        return pd.concat([self.percentile(p).to_pandas(tall=True).assign(Percentile=p) for p in self.percentiles], ignore_index=True)
+
+
+# The schedule and distributions a worker process simulates paths with, set once per process
+_worker_args: Tuple = ()
+
+
+def _init_worker(*args):
+    global _worker_args
+    _worker_args = args
+
+
+def _run_paths(job: Tuple) -> Tuple[np.ndarray, _PathState]:
+    return _paths(*_worker_args, *job)
+
+
+def _paths(schedule: _PathSchedule, apr: Dict[str, Distribution], inflation: Optional[Distribution],
+           seeds: Sequence[np.random.SeedSequence], first_row: int, last_row: int,
+           state: Optional[_PathState]) -> Tuple[np.ndarray, _PathState]:
+    """
+    Simulates a path per seed over rows first_row to last_row, returning a (paths, dates, accounts) array.
+    The generators start over from the seeds every call, so every call draws the same rates for a path.
+    """
+    return schedule.run([np.random.default_rng(seed) for seed in seeds], apr, inflation, first_row, last_row, state)
+
+
+def monte_carlo(
+        starting_plan: Plan,
+        bridges: List[Bridge],
+        from_date: datetime,
+        to_date: datetime,
+        n_paths: int = 1000,
+        apr: Optional[Dict[str, Distribution]] = None,
+        inflation: Optional[Distribution] = None,
+        percentiles: Iterable[float] = (5, 25, 50, 75, 95),
+        resolution: Union[str, Iterable[datetime], Resolution] = "month-end",
+        seed: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        chunk_size: int = 250,
+) -> MonteCarloResult:
+    """
+    Simulates n_paths versions of a plan, each with its own account APRs and inflation, in a pool of processes.
+
+    apr maps an account name to the distribution of its APR value, which every account with that name gets
+    for the whole path, keeping the period of its APR. Accounts not in apr keep the value in the plan.
+    A draw from inflation is taken off the APR value of every account, so balances are in today's money.
+    Distributions are Normal, Uniform or a plain number.
+
+    Only DateBridges are supported, and they should give the same accounts whatever balances they are given.
+    The same seed gives the same result whatever max_workers is, and max_workers=1 runs without a pool.
+    """
+    resolution = as_resolution(resolution, from_date)
+    percentiles = tuple(percentiles)
+    apr = dict(apr or {})
+    schedule = _PathSchedule(starting_plan, bridges, from_date, to_date, resolution)
+    seeds = np.random.SeedSequence(seed).spawn(n_paths)
+    chunks = [seeds[i:i + chunk_size] for i in range(0, n_paths, chunk_size)]
+    states: List[Optional[_PathState]] = [None] * len(chunks)
+    n_rows, n_accounts = len(schedule.dates), len(schedule.accounts)
+    # Percentiles need every path on a date, so the paths are simulated a block of dates at a time,
+    # holding every path for that block only
+    block = max(1, _BLOCK_BYTES // (8 * n_paths * max(n_accounts, 1)))
+    bands = np.empty((len(percentiles), n_rows, n_accounts))
+    if max_workers == 1:
+        pool, run = None, lambda jobs: [_paths(schedule, apr, inflation, *job) for job in jobs]
+    else:
+        # Imported here so that importing lifechoices does not load multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(schedule, apr, inflation))
+        run = lambda jobs: list(pool.map(_run_paths, jobs))
+    with pool or nullcontext():
+        for first_row in range(0, n_rows, block):
+            last_row = min(first_row + block, n_rows)
+            done = run([(chunk, first_row, last_row, state) for chunk, state in zip(chunks, states)])
+            paths = np.empty((n_paths, last_row - first_row, n_accounts))
+            for c, (i, (chunk, state)) in enumerate(zip(range(0, n_paths, chunk_size), done)):
+                paths[i:i + len(chunk)] = chunk
+                states[c] = state
+            bands[:, first_row:last_row] = np.percentile(paths, percentiles, axis=0)
+    return MonteCarloResult(schedule.accounts, schedule.dates, percentiles, bands, n_paths)
@@ -0,0 +1,98 @@
+"""
+Rules for when a recurring transfer fires.
+
+A rule answers whether it fires on a date and which date it fires on next with a little arithmetic,
+and can mark the days it fires on in a calendar (see lifechoices.calendar.calendar_table) all at once,
+so a plan never has to list the dates a transfer fires on ahead of time.
+"""
+from typing import Dict, Optional, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from lifechoices.utils import weekOfMonth
+
+
+class Recurrence:
+    """ When a recurring transfer fires. Rules are frozen, so transfers with the same rule can share its schedule. """
+
+    def fires(self, date: datetime) -> bool:
+        """ Whether the rule fires on the day of date. """
+        raise NotImplementedError
+
+    def next_after(self, date: datetime) -> datetime:
+        """ The first day after the day of date that the rule fires on. """
+        raise NotImplementedError
+
+    def mask(self, calendar: Dict[str, np.ndarray]) -> np.ndarray:
+        """ Which days of a calendar the rule fires on. """
+        raise NotImplementedError
+
+    def fires_on(self, calendar: Dict[str, Sequence[int]], row: int) -> bool:
+        """ Whether the rule fires on one row of a calendar, like fires without making a datetime. """
+        raise NotImplementedError
+
+
+@dataclass(frozen=True)
+class EveryNYears(Recurrence):
+    """
+    Fires on the dayOfMonth of month every nyears years, counting from firstYear.
+    Without a firstYear it counts from year 0, which for nyears = 1 is every year.
+    """
+    month: int
+    dayOfMonth: int
+    nyears: int = 1
+    firstYear: Optional[int] = None
+
+    def _fires_in(self, year: int) -> bool:
+        first = self.firstYear or 0
+        return year >= first and (year - first) % self.nyears == 0
+
+    def fires(self, date: datetime) -> bool:
+        return date.month == self.month and date.day == self.dayOfMonth and self._fires_in(date.year)
+
+    def fires_on(self, calendar: Dict[str, Sequence[int]], row: int) -> bool:
+        return (calendar["month"][row] == self.month and calendar["day"][row] == self.dayOfMonth
+                and self._fires_in(calendar["year"][row]))
+
+    def next_after(self, date: datetime) -> datetime:
+        year = date.year if (date.month, date.day) < (self.month, self.dayOfMonth) else date.year + 1
+        first = self.firstYear or 0
+        if year < first:
+            year = first
+        year += -(year - first) % self.nyears
+        return datetime(year, self.month, self.dayOfMonth)
+
+    def mask(self, calendar: Dict[str, np.ndarray]) -> np.ndarray:
+        first = self.firstYear or 0
+        year = calendar["year"]
+        return ((calendar["month"] == self.month) & (calendar["day"] == self.dayOfMonth)
+                & (year >= first) & ((year - first) % self.nyears == 0))
+
+
+@dataclass(frozen=True)
+class WeekOfMonthParity(Recurrence):
+    """
+    Fires on dayOfWeek (0 is Monday) in the weeks of the month (see lifechoices.utils.weekOfMonth)
+    whose number is even for a weekOffset of 0, or odd for a weekOffset of 1.
+    """
+    dayOfWeek: int
+    weekOffset: int
+
+    def fires(self, date: datetime) -> bool:
+        return date.weekday() == self.dayOfWeek and weekOfMonth(date) % 2 == self.weekOffset
+
+    def fires_on(self, calendar: Dict[str, Sequence[int]], row: int) -> bool:
+        return calendar["weekday"][row] == self.dayOfWeek and calendar["weekOfMonthParity"][row] == self.weekOffset
+
+    def next_after(self, date: datetime) -> datetime:
+        day = datetime(date.year, date.month, date.day)
+        day += timedelta(days=(self.dayOfWeek - day.weekday() - 1) % 7 + 1)
+        # Week numbers restart with every month, so the parity can repeat, but never three weeks in a row
+        while weekOfMonth(day) % 2 != self.weekOffset:
+            day += timedelta(days=7)
+        return day
+
+    def mask(self, calendar: Dict[str, np.ndarray]) -> np.ndarray:
+        return (calendar["weekOfMonthParity"] == self.weekOffset) & (calendar["weekday"] == self.dayOfWeek)
@@ -0,0 +1,70 @@
+from typing import Iterable, List, Tuple, Union
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from lifechoices.utils import strip_date_timestamp
+
+
+RESOLUTIONS = ("daily", "weekly", "month-end", "year-end")
+
+
+class Resolution:
+    """
+    Which days of a simulation get recorded.
+    "daily" records every day, "weekly" every seventh day counting from the first day,
+    "month-end" and "year-end" the last day of every month or year,
+    and a list of dates records only those dates.
+    """
+
+    def __init__(self, resolution: Union[str, Iterable[datetime]], from_date: datetime):
+        self.first_day = strip_date_timestamp(from_date)
+        if isinstance(resolution, str):
+            if resolution not in RESOLUTIONS:
+                raise ValueError(f"resolution should be one of {RESOLUTIONS} or a list of dates. Got {resolution}")
+            self.name = resolution
+            self._dates = None
+        else:
+            self.name = "dates"
+            self._dates = np.array(sorted({strip_date_timestamp(d) for d in resolution}), dtype="datetime64[D]")
+
+    @property
+    def key(self) -> Tuple:
+        """ What the recorded days depend on besides the first day, usable as a dictionary key. """
+        return (self.name,) if self._dates is None else (self.name, self._dates.tobytes())
+
+    def __contains__(self, date: datetime) -> bool:
+        day = strip_date_timestamp(date)
+        if self.name == "daily":
+            return True
+        if self.name == "weekly":
+            return (day - self.first_day).days % 7 == 0
+        if self.name == "month-end":
+            return (day + timedelta(days=1)).day == 1
+        if self.name == "year-end":
+            return day.month == 12 and day.day == 31
+        return np.datetime64(day.date(), "D") in self._dates
+
+    def mask(self, first_day: datetime, n: int) -> np.ndarray:
+        """ Which of the n days starting at first_day get recorded. """
+        days = np.datetime64(first_day.date(), "D") + np.arange(n)
+        if self.name == "daily":
+            return np.ones(n, dtype=bool)
+        if self.name == "weekly":
+            return (days - np.datetime64(self.first_day.date(), "D")).astype(np.int64) % 7 == 0
+        if self.name == "month-end":
+            return (days + 1).astype("datetime64[M]") != days.astype("datetime64[M]")
+        if self.name == "year-end":
+            return (days + 1).astype("datetime64[Y]") != days.astype("datetime64[Y]")
+        return np.isin(days, self._dates)
+
+    def dates(self, first_day: datetime, n: int) -> List[datetime]:
+        """ The days that get recorded among the n days starting at first_day. """
+        return [first_day + timedelta(days=i) for i in np.flatnonzero(self.mask(first_day, n)).tolist()]
+
+
+def as_resolution(resolution: Union[str, Iterable[datetime], Resolution], from_date: datetime) -> Resolution:
+    """ Accepts anything plot_accounts takes as a resolution. """
+    if isinstance(resolution, Resolution):
+        return resolution
+    return Resolution(resolution, from_date)
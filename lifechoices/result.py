@@ -0,0 +1,133 @@
+"""
+The columnar result of a simulation.
+
+Instead of a dictionary per day, a SimulationResult keeps every balance in one float64 matrix
+with a row per date and a column per account, next to a datetime64 array of the dates
+and the names of the accounts. The pandas views are built on top of the same memory.
+"""
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@dataclass(frozen=True)
+class SimulationResult:
+    """
+    The balance of every account on every recorded date.
+    Accounts that do not exist on a date, because a bridge added or removed them, are NaN.
+    """
+    accounts: Tuple[str, ...]
+    dates: np.ndarray  # datetime64[us], one per row of values
+    values: np.ndarray  # float64 (dates, accounts), C contiguous
+    # The bridges that activated and the days they did, the plan changes at the end of that day
+    bridges: Tuple[Tuple[str, datetime], ...] = field(default=(), compare=False, repr=False)
+    # What lifechoices.instrumentation measured while simulate made it, if it was instrumented
+    instrumentation: Optional[Dict[str, Any]] = field(default=None, compare=False, repr=False)
+
+    @classmethod
+    def from_blocks(cls, blocks: Iterable[Tuple[np.ndarray, List[str], np.ndarray]]) -> "SimulationResult":
+        """
+        Builds a result from the (dates, account names, balances) blocks the array engines yield.
+        Accounts that only exist on days that are not recorded are left out.
+        """
+        blocks = [block for block in blocks if len(block[0])]
+        column: Dict[str, int] = {}
+        for _, names, _ in blocks:
+            for name in names:
+                column.setdefault(name, len(column))
+        n = sum(len(dates) for dates, _, _ in blocks)
+        values = np.full((n, len(column)), np.nan)
+        row = 0
+        for dates, names, block in blocks:
+            values[row:row + len(dates), [column[name] for name in names]] = block
+            row += len(dates)
+        dates = np.concatenate([dates for dates, _, _ in blocks]) if blocks else np.array([], dtype="datetime64[us]")
+        return cls(tuple(column), dates.astype("datetime64[us]"), values)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "SimulationResult":
+        """ Builds a result from the rows plot_accounts(..., tall_data=False) returns. """
+        rows = list(rows)
+        column: Dict[str, int] = {}
+        for row in rows:
+            for name in row:
+                if name != "Date":
+                    column.setdefault(name, len(column))
+        values = np.full((len(rows), len(column)), np.nan)
+        for i, row in enumerate(rows):
+            for name, value in row.items():
+                if name != "Date":
+                    values[i, column[name]] = value
+        return cls(tuple(column), np.array([row["Date"] for row in rows], dtype="datetime64[us]"), values)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __getitem__(self, account: str) -> np.ndarray:
+        """ The balances of one account, as a view into values. """
+        return self.values[:, self.accounts.index(account)]
+
+    def until(self, last_date: datetime) -> "SimulationResult":
+        """
+        The rows dated on or before last_date. Balances and dates are views into this result,
+        unless an account only shows up after last_date, in which case its column is left out.
+        """
+        n = int(np.searchsorted(self.dates, np.datetime64(last_date, "us"), side="right"))
+        values = self.values[:n]
+        bridges = tuple((name, date) for name, date in self.bridges if date <= last_date)
+        present = ~np.isnan(values).all(axis=0)
+        if present.all():
+            return SimulationResult(self.accounts, self.dates[:n], values, bridges)
+        accounts = tuple(name for name, here in zip(self.accounts, present.tolist()) if here)
+        return SimulationResult(accounts, self.dates[:n], values[:, present], bridges)
+
+    def to_numpy(self) -> np.ndarray:
+        """ The (dates, accounts) matrix of balances itself, not a copy. """
+        return self.values
+
+    def to_pandas(self, tall: bool = False) -> "pd.DataFrame":
+        """
+        The result as a DataFrame without copying the balances.
+        Wide, the frame is indexed by Date with a column per account.
+        Tall, it has the Date, Account and Value columns plot_accounts returns with tall_data,
+        where Value is a view into values and Account is categorical.
+        """
+        import pandas as pd
+        if not tall:
+            return pd.DataFrame(
+                self.values,
+                index=pd.DatetimeIndex(self.dates, name="Date"),
+                columns=pd.Index(self.accounts, name="Account"),
+                copy=False,
+            )
+        n_accounts = len(self.accounts)
+        return pd.DataFrame({
+            "Account": pd.Categorical.from_codes(np.tile(np.arange(n_accounts), len(self.dates)), self.accounts),
+            "Date": np.repeat(self.dates, n_accounts),
+            "Value": self.values.reshape(-1),
+        }, copy=False)
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        """ The result as the rows plot_accounts(..., tall_data=False) returns. """
+        present = ~np.isnan(self.values)
+        rows = []
+        for date, row_values, row_present in zip(self.dates.tolist(), self.values.tolist(), present.tolist()):
+            row = {name: value for name, value, here in zip(self.accounts, row_values, row_present) if here}
+            row["Date"] = date
+            rows.append(row)
+        return rows
+
+    def to_tall(self) -> Dict[str, List[Any]]:
+        """ The result as the columns plot_accounts(..., tall_data=True) returns. """
+        n_accounts = len(self.accounts)
+        dates: List[datetime] = np.repeat(self.dates, n_accounts).tolist()
+        return {
+            "Account": list(self.accounts) * len(self.dates),
+            "Date": dates,
+            "Value": self.values.reshape(-1).tolist(),
+        }
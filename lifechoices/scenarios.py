@@ -0,0 +1,239 @@
+"""
+Many variants of a plan simulated side by side.
+
+Every scenario is split at the days any of them has a bridge on, so between two of those days
+none of the plans change. The transfers of each scenario are turned into flows like the array engines do,
+sharing one calendar and the schedules their transfers have in common, and the accounts of all the
+scenarios are stacked into one row of balances that is compounded in a single pass.
+"""
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+from lifechoices.classes import Bridge, CallbackBridge, DateBridge, Plan, ThresholdBridge
+from lifechoices.schedule import _generate_from_plan, _GenerateFromPlanOutput
+from lifechoices.calendar import calendar_table
+from lifechoices.growth import GrowthTable
+from lifechoices.state import _with_amounts
+from lifechoices.engine import _CHUNK_DAYS, _balances_on, _compound, _first_trigger, _number_of_days, _segment_flows
+from lifechoices.resolution import Resolution, as_resolution
+from lifechoices.result import SimulationResult
+from lifechoices.utils import strip_date_timestamp
+
+
+@dataclass
+class _Scenario:
+    """ The state of one scenario while it is simulated. """
+    name: str
+    plan: Plan
+    V: Optional[_GenerateFromPlanOutput]
+    date_bridges: Dict[int, DateBridge]
+    conditional: List[Union[CallbackBridge, ThresholdBridge]]
+    start: Optional[np.ndarray] = None  # the balances the next stretch starts from
+    G: Optional[GrowthTable] = None
+    columns: Optional[slice] = None  # its columns in the stacked balances
+
+    def reset_start(self):
+        """ Starts the next stretch from the accounts of the plan, right after a bridge gave it. """
+        self.start = np.array([a.amount for a in self.V.accounts_by_name.values()], dtype=float)
+
+
+@dataclass(frozen=True)
+class ScenarioResult:
+    """
+    The balances of every scenario of run_scenarios on the same dates.
+    values has a matrix like SimulationResult.values per scenario, over the accounts of all of them,
+    so an account a scenario does not have is NaN.
+    """
+    scenarios: Tuple[str, ...]
+    accounts: Tuple[str, ...]
+    dates: np.ndarray  # datetime64[us]
+    values: np.ndarray  # float64 (scenarios, dates, accounts)
+
+    def __len__(self) -> int:
+        return len(self.scenarios)
+
+    def __getitem__(self, scenario: str) -> SimulationResult:
+        """ The result of one scenario, as a view into values. """
+        return SimulationResult(self.accounts, self.dates, self.values[self.scenarios.index(scenario)])
+
+    def items(self) -> Iterator[Tuple[str, SimulationResult]]:
+        for scenario in self.scenarios:
+            yield scenario, self[scenario]
+
+    def to_pandas(self) -> "pd.DataFrame":
+        """ Tall data with a Scenario column next to the Date, Account and Value columns of every scenario. """
+        import pandas as pd
+        return pd.concat([
+            result.to_pandas(tall=True).assign(Scenario=pd.Categorical([scenario] * (len(self.dates) * len(self.accounts)), self.scenarios))
+            for scenario, result in self.items()
+        ], ignore_index=True)
+
+
+def _stacked_flows(scenarios: List[_Scenario], parts: List[Tuple[np.ndarray, np.ndarray, GrowthTable]]) -> Tuple[np.ndarray, np.ndarray]:
+    """ Puts the flows of every scenario next to each other, on the rows any of them needs. """
+    rows = np.unique(np.concatenate([part_rows for part_rows, _, _ in parts]))
+    flows = np.zeros((len(rows), scenarios[-1].columns.stop))
+    for s, (part_rows, part_flows, _) in zip(scenarios, parts):
+        flows[np.searchsorted(rows, part_rows), s.columns] = part_flows
+    return rows, flows
+
+
+def _first_triggered(
+        scenarios: List[_Scenario],
+        start: np.ndarray,
+        rows: np.ndarray,
+        values: np.ndarray,
+        growth: np.ndarray,
+        segment_start: datetime,
+        n: int,
+) -> Tuple[Optional[int], Dict[int, Bridge]]:
+    """ The first day any scenario's conditional bridges activate on, and the bridge each scenario activates that day. """
+    first, fired = None, {}
+    for k, s in enumerate(scenarios):
+        if not s.conditional:
+            continue
+        c = s.columns
+        day, bridge = _first_trigger(s.conditional, list(s.V.accounts_by_name), start[c], rows, values[:, c], growth[c], segment_start, n)
+        if bridge is None or (first is not None and day > first):
+            continue
+        if first is None or day < first:
+            first, fired = day, {}
+        fired[k] = bridge
+    return first, fired
+
+
+def _iter_scenario_blocks(
+        scenarios: List[_Scenario],
+        from_date: datetime,
+        to_date: datetime,
+        resolution: Resolution,
+        schedules: Optional[Dict[Tuple, Tuple[np.ndarray, np.ndarray]]] = None,
+) -> Iterator[Tuple[np.ndarray, List[Tuple[int, List[str]]], np.ndarray]]:
+    """
+    Yields the days in resolution of every stretch of all the scenarios, as the dates, which scenario and accounts
+    each column is, and the stacked balances. Like the other engines it carries every scenario on
+    in a new plan with the balances and transfer amounts of the end of each stretch.
+    """
+    first_day = strip_date_timestamp(from_date)
+    n = _number_of_days(from_date, to_date)
+    events = resolution.name != "daily"
+    output_days = np.flatnonzero(resolution.mask(first_day, n + 1)) if events else np.array([], dtype=np.int64)
+    calendar = calendar_table(first_day + timedelta(days=1), n)
+    schedules = {} if schedules is None else schedules
+
+    for s in scenarios:
+        s.V = _generate_from_plan(s.plan)
+        s.reset_start()
+    if from_date in resolution:
+        yield (np.array([from_date], dtype="datetime64[us]"), [(k, list(s.V.accounts_by_name)) for k, s in enumerate(scenarios)],
+               np.concatenate([s.start for s in scenarios])[None, :])
+    day = 0
+    while day < n:
+        stop = min([d for s in scenarios for d in s.date_bridges if day < d <= n] + [day + _CHUNK_DAYS, n])
+        segment_start = first_day + timedelta(days=day + 1)
+        segment_calendar = {key: value[day:stop] for key, value in calendar.items()}
+        parts = []
+        column = 0
+        for s in scenarios:
+            parts.append(_segment_flows(s.V, segment_start, stop - day, events, output_days - day - 1, segment_calendar, schedules))
+            s.G = parts[-1][2]
+            s.columns = slice(column, column + len(s.G.accounts))
+            column = s.columns.stop
+        rows, flows = _stacked_flows(scenarios, parts)
+        start = np.concatenate([s.start for s in scenarios])
+        growth = np.concatenate([s.G.account_growth for s in scenarios])
+        values = _compound(start, flows, growth, rows + 1)
+
+        fired: Dict[int, Bridge] = {}
+        if any(s.conditional for s in scenarios):
+            i, fired = _first_triggered(scenarios, start, rows, values, growth, segment_start, stop - day)
+            if i is not None:
+                keep = np.searchsorted(rows, i)
+                balances = _balances_on(i, start, rows, values, growth)
+                rows = np.append(rows[:keep], i)
+                values = np.vstack([values[:keep], balances])
+
+        keep = resolution.mask(segment_start, int(rows[-1]) + 1)[rows]
+        yield (np.datetime64(segment_start, "us") + rows[keep].astype("timedelta64[D]"),
+               [(k, list(s.V.accounts_by_name)) for k, s in enumerate(scenarios)], values[keep])
+        last = int(rows[-1])
+        day += last + 1
+        this_date = first_day + timedelta(days=day)
+
+        for k, s in enumerate(scenarios):
+            s.start = values[-1, s.columns]
+            s.plan = _with_amounts(s.plan, dict(zip(s.V.accounts_by_name, s.start.tolist())), s.G.amounts_by_id(last))
+            s.V = _generate_from_plan(s.plan)
+            bridge_activated = False
+            if day in s.date_bridges:
+                this_bridge = s.date_bridges.pop(day)
+                s.plan = this_bridge(s.plan)
+                s.V = _generate_from_plan(s.plan)
+                s.reset_start()
+                bridge_activated = True
+                print(f"Bridge {this_bridge.name} Activated on {this_date} in {s.name}")
+            if k in fired:
+                s.plan = fired[k](s.plan)
+                s.V = _generate_from_plan(s.plan)
+                s.reset_start()
+                if bridge_activated:
+                    raise RuntimeError("More than one bridge activated on the same date.")
+                s.conditional.remove(fired[k])
+                print(f"Bridge {fired[k].name} Activated on {this_date} in {s.name}")
+
+
+def run_scenarios(
+        scenarios: Union[Mapping[str, Tuple[Plan, List[Bridge]]], Sequence[Tuple[Plan, List[Bridge]]]],
+        from_date: datetime,
+        to_date: datetime,
+        resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+        schedules: Optional[Dict[Tuple, Tuple[np.ndarray, np.ndarray]]] = None,
+) -> ScenarioResult:
+    """
+    Simulates many (starting plan, bridges) pairs over the same dates in one pass,
+    giving every one the same balances plot_accounts would, up to floating point rounding.
+    Scenarios are named by the keys of a mapping, or by their position in a list.
+    The calendar and the schedules of transfers are worked out once for all of them,
+    and all their accounts are compounded together.
+
+    Variants of a plan usually share accounts, transfers and bridges, which is safe because they are frozen,
+    and the plans given are not changed.
+    A schedules dictionary kept between calls shares the schedules with later batches of variants of the same plans.
+    """
+    if not isinstance(scenarios, Mapping):
+        scenarios = {str(i): scenario for i, scenario in enumerate(scenarios)}
+    resolution = as_resolution(resolution, from_date)
+    first_day = strip_date_timestamp(from_date)
+    states = []
+    for name, (plan, bridges) in scenarios.items():
+        states.append(_Scenario(
+            name=name,
+            plan=plan,
+            V=None,
+            date_bridges={(b.trigger_date - first_day).days: b for b in bridges
+                          if isinstance(b, DateBridge) and b.trigger_date == strip_date_timestamp(b.trigger_date)},
+            conditional=[b for b in bridges if isinstance(b, (CallbackBridge, ThresholdBridge))],
+        ))
+
+    blocks = list(_iter_scenario_blocks(states, from_date, to_date, resolution, schedules)) if states else []
+    column: Dict[str, int] = {}
+    for _, groups, _ in blocks:
+        for _, names in groups:
+            for name in names:
+                column.setdefault(name, len(column))
+    dates = np.concatenate([dates for dates, _, _ in blocks]) if blocks else np.array([], dtype="datetime64[us]")
+    values = np.full((len(states), len(dates), len(column)), np.nan)
+    row = 0
+    for block_dates, groups, block in blocks:
+        offset = 0
+        for k, names in groups:
+            values[k][row:row + len(block_dates), [column[name] for name in names]] = block[:, offset:offset + len(names)]
+            offset += len(names)
+        row += len(block_dates)
+    return ScenarioResult(tuple(scenarios), tuple(column), dates.astype("datetime64[us]"), values)
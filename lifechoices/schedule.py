@@ -0,0 +1,69 @@
+from typing import Dict, List, Optional
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from collections import defaultdict
+
+from lifechoices.classes import Account, Plan, Transfer, Once, Daily, Weekly, BiWeekly, Monthly, Yearly, NYearly
+from lifechoices.utils import monthdelta
+
+
+@dataclass(frozen=False)
+class _GenerateFromPlanOutput:
+    once: Dict[datetime, List[Once]]
+    daily: List[Daily]
+    weekly: Dict[int, List[Weekly]]
+    biweekly: Dict[int, Dict[int, List[BiWeekly]]]
+    monthly: Dict[int, List[Monthly]]
+    yearly: Dict[int, Dict[int, List[Yearly]]]
+    nyearly: Dict[int, Dict[int, List[NYearly]]]  # By month and day, check t.recurrence() for the year
+    accounts_by_name: Dict[str, Account]
+
+
+def _generate_from_plan(p: Plan) -> _GenerateFromPlanOutput:
+    once = defaultdict(list)
+    daily = []
+    weekly = defaultdict(list)
+    biweekly = defaultdict(lambda: defaultdict(list))
+    monthly = defaultdict(list)
+    yearly = defaultdict(lambda: defaultdict(list))
+    nyearly = defaultdict(lambda: defaultdict(list))
+
+    accounts_by_name = {a.name: a for a in p.accounts}
+    for t in p.transfers:
+        t.check()
+        if isinstance(t, Daily):
+            daily.append(t)
+        elif isinstance(t, Once):
+            once[t.date].append(t)
+        elif isinstance(t, Weekly):
+            weekly[t.dayOfWeek].append(t)
+        elif isinstance(t, BiWeekly):
+            biweekly[t.weekOffset][t.dayOfWeek].append(t)
+        elif isinstance(t, Monthly):
+            monthly[t.dayOfMonth].append(t)
+        elif isinstance(t, Yearly):
+            yearly[t.month][t.dayOfMonth].append(t)
+        elif isinstance(t, NYearly):
+            nyearly[t.month][t.dayOfMonth].append(t)
+        else:
+            raise TypeError(f"Type '{type(t)}' not recognized.")
+    return _GenerateFromPlanOutput(
+        once, daily, weekly, biweekly, monthly, yearly, nyearly, accounts_by_name
+    )
+
+
+def _next_firing(t: Transfer, after: datetime) -> Optional[datetime]:
+    """ The first day after the day of after that plot_accounts applies t on, or None if it never does again. """
+    after = datetime(after.year, after.month, after.day)
+    if isinstance(t, Daily):
+        return after + timedelta(days=1)
+    elif isinstance(t, Once):
+        return t.date if t.date > after and t.date == datetime(t.date.year, t.date.month, t.date.day) else None
+    elif isinstance(t, Weekly):
+        return after + timedelta(days=(t.dayOfWeek - after.weekday() - 1) % 7 + 1)
+    elif isinstance(t, Monthly):
+        this_month = after.replace(day=t.dayOfMonth)
+        return this_month if this_month > after else monthdelta(this_month, 1)
+    elif isinstance(t, (BiWeekly, Yearly, NYearly)):
+        return t.recurrence().next_after(after)
+    raise TypeError(f"Type '{type(t)}' not recognized.")
@@ -0,0 +1,275 @@
+"""
+Writing plans down as data, so they can be sent to other processes, cached by content and loaded without running python.
+
+A bridge normally calls a python function, like retirement_bridge in example_transactions.py, which cannot be
+written to a file or sent to a worker cheaply. A bridge whose function is one of the actions here instead,
+like
+
+    DateBridge("Retirement", Actions((
+        ReplaceAccounts(Accounts_Old),
+        ReplaceTransfers(Transfers_Old),
+    )), RETIREMENT_DATE)
+
+is only data: it pickles, compares and hashes by value, and plan_to_json writes it down with its plan.
+
+The format is JSON with a version, where every account, transfer, bridge and action is an object with its "type"
+and its fields, and datetimes and APRs are objects too. plan_to_bytes is the same data pickled, which is half the size
+and loads about as quickly as pickling the plan itself, and plan_from_bytes reads it with an unpickler that loads no classes,
+so neither form runs any code from the file. plan_hash is a hash of the JSON with sorted keys, which stays the same
+across processes and runs for plans with the same values.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass, fields, replace
+from datetime import datetime
+from functools import lru_cache
+import hashlib
+import io
+import json
+import pickle
+
+from lifechoices.classes import (
+    APR, Account, Bridge, CallbackBridge, DateBridge, ThresholdBridge, Period, Plan,
+    Transfer, Once, Daily, Weekly, BiWeekly, Monthly, Yearly, NYearly,
+)
+
+FORMAT_VERSION = 1
+_MAGIC = b"LCPLAN"
+
+
+def _tuple(obj, name: str):
+    """ Makes a field of a frozen action a tuple, so lists given to it can not be changed afterwards. """
+    object.__setattr__(obj, name, tuple(getattr(obj, name)))
+
+
+@dataclass(frozen=True)
+class MoveBalance:
+    """ Moves fraction of the balance of from_account to to_account, or out of the plan if to_account is None. """
+    from_account: str
+    to_account: Optional[str]
+    fraction: float = 1.0
+
+    def __call__(self, plan: Plan) -> Plan:
+        moved = next(a.amount for a in plan.accounts if a.name == self.from_account) * self.fraction
+        accounts = [replace(a, amount=a.amount - moved) if a.name == self.from_account else
+                    replace(a, amount=a.amount + moved) if a.name == self.to_account else a
+                    for a in plan.accounts]
+        return Plan(accounts, list(plan.transfers))
+
+
+@dataclass(frozen=True)
+class ReplaceAccounts:
+    """
+    Replaces the accounts of the plan with accounts. If carry_balances, an account with the name of an old one
+    starts with its own amount plus the balance of the old one. The money in old accounts that are not replaced is gone.
+    """
+    accounts: Tuple[Account, ...]
+    carry_balances: bool = True
+
+    def __post_init__(self):
+        _tuple(self, "accounts")
+
+    def __call__(self, plan: Plan) -> Plan:
+        old = {a.name: a.amount for a in plan.accounts} if self.carry_balances else {}
+        accounts = [replace(a, amount=a.amount + old[a.name]) if a.name in old else a for a in self.accounts]
+        return Plan(accounts, list(plan.transfers))
+
+
+@dataclass(frozen=True)
+class ChangeAPR:
+    """ Changes the APR account grows at. """
+    account: str
+    APR: APR
+
+    def __call__(self, plan: Plan) -> Plan:
+        return Plan([replace(a, APR=self.APR) if a.name == self.account else a for a in plan.accounts], list(plan.transfers))
+
+
+@dataclass(frozen=True)
+class AddTransfers:
+    """ Adds transfers after the ones of the plan. """
+    transfers: Tuple[Transfer, ...]
+
+    def __post_init__(self):
+        _tuple(self, "transfers")
+
+    def __call__(self, plan: Plan) -> Plan:
+        return Plan(list(plan.accounts), list(plan.transfers) + list(self.transfers))
+
+
+@dataclass(frozen=True)
+class RemoveTransfers:
+    """ Removes the transfers with any of names. """
+    names: Tuple[str, ...]
+
+    def __post_init__(self):
+        _tuple(self, "names")
+
+    def __call__(self, plan: Plan) -> Plan:
+        return Plan(list(plan.accounts), [t for t in plan.transfers if t.name not in self.names])
+
+
+@dataclass(frozen=True)
+class ReplaceTransfers:
+    """ Replaces the transfers of the plan with transfers. """
+    transfers: Tuple[Transfer, ...]
+
+    def __post_init__(self):
+        _tuple(self, "transfers")
+
+    def __call__(self, plan: Plan) -> Plan:
+        return Plan(list(plan.accounts), list(self.transfers))
+
+
+@dataclass(frozen=True)
+class Actions:
+    """ Does every one of actions in turn. """
+    actions: Tuple[Any, ...]
+
+    def __post_init__(self):
+        _tuple(self, "actions")
+
+    def __call__(self, plan: Plan) -> Plan:
+        for action in self.actions:
+            plan = action(plan)
+        return plan
+
+
+# Everything the format can hold, by the name written in its "type"
+_TYPES = {cls.__name__: cls for cls in (
+    Account, Plan, Transfer, Once, Daily, Weekly, BiWeekly, Monthly, Yearly, NYearly, DateBridge, ThresholdBridge,
+    MoveBalance, ReplaceAccounts, ChangeAPR, AddTransfers, RemoveTransfers, ReplaceTransfers, Actions,
+)}
+# The fields of each type, and whether they are floats, which are written as floats even when given an int
+_FIELDS = {name: [(f.name, f.type is float) for f in fields(cls) if f.init] for name, cls in _TYPES.items()}
+
+
+def _encode(value: Any, where: str) -> Any:
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, datetime):
+        return {"type": "datetime", "value": value.isoformat()}
+    if isinstance(value, APR):
+        return {"type": "APR", "value": float(value.value), "period": value.period.name}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v, where) for v in value]
+    name = type(value).__name__
+    if _TYPES.get(name) is not type(value):
+        if isinstance(value, CallbackBridge):
+            raise ValueError(f"{where} is a CallbackBridge, whose trigger is python. Use a DateBridge or a ThresholdBridge.")
+        raise ValueError(f"{where} is {value!r}, which is not one of the accounts, transfers, bridges or actions "
+                         f"of lifechoices.serialize, so it can not be written down.")
+    data = {"type": name}
+    for field_name, is_float in _FIELDS[name]:
+        v = getattr(value, field_name)
+        data[field_name] = float(v) if is_float and isinstance(v, int) else _encode(v, f"{where}.{field_name}")
+    return data
+
+
+@lru_cache(maxsize=1024)
+def _apr(value: float, period: str) -> APR:
+    # APRs are frozen, so the transfers of a plan that grow at the same rate can share one
+    return APR(value, Period[period])
+
+
+def _decode(data: Any) -> Any:
+    if type(data) is list:
+        return [_decode(v) for v in data]
+    if type(data) is not dict:
+        return data
+    name = data.get("type")
+    if name == "datetime":
+        return datetime.fromisoformat(data["value"])
+    if name == "APR":
+        return _apr(data["value"], data["period"])
+    if name not in _TYPES:
+        raise ValueError(f"Unknown type {name!r} in plan.")
+    # Most fields are numbers and strings, which are as they were written
+    kwargs = {}
+    for field_name, _ in _FIELDS[name]:
+        if field_name in data:
+            v = data[field_name]
+            kwargs[field_name] = _decode(v) if type(v) in (dict, list) else v
+    try:
+        return _TYPES[name](**kwargs)
+    except TypeError as e:
+        raise ValueError(f"Invalid {name} in plan: {e}") from e
+
+
+def plan_to_dict(starting_plan: Plan, bridges: Iterable[Bridge] = ()) -> Dict[str, Any]:
+    """ A starting plan and its bridges as JSON data. Raises ValueError for bridges that call python functions. """
+    return {
+        "version": FORMAT_VERSION,
+        "plan": _encode(starting_plan, "plan"),
+        "bridges": [_encode(b, f"bridges[{k}]") for k, b in enumerate(bridges)],
+    }
+
+
+def plan_from_dict(data: Dict[str, Any]) -> Tuple[Plan, List[Bridge]]:
+    """ The starting plan and bridges of data from plan_to_dict. """
+    version = data.get("version")
+    if not isinstance(version, int) or not 1 <= version <= FORMAT_VERSION:
+        raise ValueError(f"Plan format version should be between 1 and {FORMAT_VERSION}. Got {version}")
+    try:
+        plan = _decode(data["plan"])
+        bridges = _decode(data.get("bridges", []))
+    except KeyError as e:
+        raise ValueError(f"Missing {e} in plan.") from e
+    if not isinstance(plan, Plan):
+        raise ValueError(f"plan should be a Plan. Got {type(plan).__name__}")
+    for b in bridges:
+        if not isinstance(b, Bridge):
+            raise ValueError(f"bridges should be bridges. Got {type(b).__name__}")
+    return plan, bridges
+
+
+def plan_to_json(starting_plan: Plan, bridges: Iterable[Bridge] = (), indent: Optional[int] = None) -> str:
+    return json.dumps(plan_to_dict(starting_plan, bridges), indent=indent)
+
+
+def plan_from_json(text: str) -> Tuple[Plan, List[Bridge]]:
+    return plan_from_dict(json.loads(text))
+
+
+class _DataUnpickler(pickle.Unpickler):
+    """ Loads only lists, dicts, strings and numbers, never a class or a function. """
+
+    def find_class(self, module, name):
+        raise ValueError(f"Plan data should not reference {module}.{name}.")
+
+
+def plan_to_bytes(starting_plan: Plan, bridges: Iterable[Bridge] = ()) -> bytes:
+    """ The data of plan_to_dict, pickled after a header. """
+    return _MAGIC + pickle.dumps(plan_to_dict(starting_plan, bridges), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def plan_from_bytes(data: bytes) -> Tuple[Plan, List[Bridge]]:
+    if not data.startswith(_MAGIC):
+        raise ValueError("Not a plan written by plan_to_bytes.")
+    try:
+        loaded = _DataUnpickler(io.BytesIO(memoryview(data)[len(_MAGIC):])).load()
+    except pickle.UnpicklingError as e:
+        raise ValueError(f"Invalid plan data: {e}") from e
+    return plan_from_dict(loaded)
+
+
+def plan_hash(starting_plan: Plan, bridges: Iterable[Bridge] = ()) -> str:
+    """ The sha256 of the JSON of a plan with sorted keys, the same for plans with the same values. """
+    text = json.dumps(plan_to_dict(starting_plan, bridges), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def save_plan(path: str, starting_plan: Plan, bridges: Iterable[Bridge] = ()):
+    """ Writes a plan to path, as JSON if it ends with .json and as plan_to_bytes otherwise. """
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            f.write(plan_to_json(starting_plan, bridges, indent=1))
+    else:
+        with open(path, "wb") as f:
+            f.write(plan_to_bytes(starting_plan, bridges))
+
+
+def read_plan(path: str) -> Tuple[Plan, List[Bridge]]:
+    """ The starting plan and bridges save_plan wrote to path. """
+    with open(path, "rb") as f:
+        data = f.read()
+    return plan_from_bytes(data) if data.startswith(_MAGIC) else plan_from_json(data.decode())
@@ -0,0 +1,206 @@
+"""
+Simulations for interactive apps, run off the event loop, shared between callers and dropped when nobody wants them.
+
+Dragging the dates of the Dash app fires a burst of callbacks, and each of them used to simulate in its own
+request thread even when the user had already moved on. A SimulationService runs simulations in an executor
+from asyncio, and
+
+- callers asking for the same simulation while it runs wait for the same run of it,
+- a new call for a session cancels the calls of that session still waiting, whose callers get CancelledError,
+  and a simulation nobody waits for anymore is cancelled too, if the executor has not started it yet,
+- progressive yields a simulation at a coarse resolution first, which is quick to make and to draw,
+  and then at the resolution asked for.
+
+Finished simulations are kept in a SimulationCache, which the service only touches from the event loop,
+so the executor threads never share it.
+
+    service = SimulationService()
+    async for result in service.progressive(Compiled_Plan, start_date, end_date, session=user_id):
+        send(result.to_pandas(tall=True))
+
+A ServiceThread runs a service on an event loop of its own, for frameworks whose callbacks are not async, like Dash.
+"""
+from typing import AsyncIterator, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+from dataclasses import dataclass
+from datetime import datetime
+from concurrent.futures import Executor, ThreadPoolExecutor
+import asyncio
+import threading
+
+from lifechoices.cache import CompiledPlan, SimulationCache
+from lifechoices.resolution import Resolution, as_resolution
+from lifechoices.result import SimulationResult
+
+
+def _simulate(compiled: CompiledPlan, from_date: datetime, to_date: datetime, engine: str, resolution: Resolution) -> SimulationResult:
+    # At the top of the module, so a process pool can pickle it
+    return compiled.simulate(from_date, to_date, engine, resolution)
+
+
+@dataclass
+class _Run:
+    """ A simulation in the executor, and how many calls are waiting for it. """
+    future: "asyncio.Future[SimulationResult]"
+    waiters: int = 0
+
+
+@dataclass
+class ServiceStats:
+    """ What the calls to a service came to. """
+    calls: int = 0
+    cache_hits: int = 0
+    coalesced: int = 0  # calls that waited for a simulation another call started
+    simulated: int = 0  # simulations the executor finished
+    superseded: int = 0  # calls cancelled by a newer call of their session
+    dropped: int = 0  # simulations cancelled before they finished because nobody waited for them
+
+
+class SimulationService:
+    """
+    Runs simulations of compiled plans in executor, a pool of threads by default, and caches them in cache.
+    coarse_resolution is what progressive simulates first.
+    """
+
+    def __init__(
+            self,
+            executor: Optional[Executor] = None,
+            cache: Optional[SimulationCache] = None,
+            coarse_resolution: Union[str, Iterable[datetime]] = "month-end",
+    ):
+        self._own_executor = executor is None
+        self.executor = ThreadPoolExecutor(thread_name_prefix="lifechoices") if executor is None else executor
+        self.cache = SimulationCache() if cache is None else cache
+        self.coarse_resolution = coarse_resolution
+        self.stats = ServiceStats()
+        self._runs: Dict[Tuple, _Run] = {}
+        self._sessions: Dict[Hashable, List[asyncio.Task]] = {}
+
+    def _supersede(self, session: Optional[Hashable], waiters: List[asyncio.Task]):
+        """ Makes waiters the calls of session, cancelling the ones it had that are still waiting. """
+        if session is None:
+            return
+        for waiter in self._sessions.get(session, ()):
+            if not waiter.done():
+                waiter.cancel()
+                self.stats.superseded += 1
+        self._sessions[session] = waiters
+        for waiter in waiters:
+            waiter.add_done_callback(lambda _: self._forget(session, waiters))
+
+    def _forget(self, session: Hashable, waiters: List[asyncio.Task]):
+        if self._sessions.get(session) is waiters and all(waiter.done() for waiter in waiters):
+            del self._sessions[session]
+
+    def _waiter(self, compiled: CompiledPlan, from_date: datetime, to_date: datetime, engine: str, resolution: Resolution) -> asyncio.Task:
+        self.stats.calls += 1
+        return asyncio.ensure_future(self._wait(compiled, from_date, to_date, engine, resolution))
+
+    async def _wait(self, compiled: CompiledPlan, from_date: datetime, to_date: datetime, engine: str, resolution: Resolution) -> SimulationResult:
+        cached = self.cache.lookup(compiled, from_date, to_date, engine, resolution)
+        if cached is not None:
+            self.stats.cache_hits += 1
+            return cached
+        key = (compiled, from_date, to_date, engine, resolution.key)
+        run = self._runs.get(key)
+        if run is None:
+            loop = asyncio.get_running_loop()
+            run = self._runs[key] = _Run(loop.run_in_executor(self.executor, _simulate, compiled, from_date, to_date, engine, resolution))
+            run.future.add_done_callback(lambda future: self._finished(key, run, compiled, from_date, to_date, engine, resolution))
+        else:
+            self.stats.coalesced += 1
+        run.waiters += 1
+        try:
+            # Shielded, so cancelling one caller does not cancel the run the others wait for
+            return await asyncio.shield(run.future)
+        finally:
+            run.waiters -= 1
+            # Counted here rather than when the future calls back, so stats add up as soon as the callers are cancelled
+            if run.waiters == 0 and run.future.cancel():
+                self.stats.dropped += 1
+                if self._runs.get(key) is run:
+                    del self._runs[key]
+
+    def _finished(self, key: Tuple, run: _Run, compiled: CompiledPlan, from_date: datetime, to_date: datetime, engine: str, resolution: Resolution):
+        if self._runs.get(key) is run:
+            del self._runs[key]
+        if not run.future.cancelled() and run.future.exception() is None:
+            self.stats.simulated += 1
+            self.cache.put(compiled, from_date, to_date, engine, resolution, run.future.result())
+
+    async def simulate(
+            self,
+            compiled: CompiledPlan,
+            from_date: datetime,
+            to_date: datetime,
+            engine: str = "vectorized",
+            resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+            session: Optional[Hashable] = None,
+    ) -> SimulationResult:
+        """
+        Same as compiled.simulate. Raises asyncio.CancelledError if a newer call for the same session
+        comes in before it is done.
+        """
+        waiter = self._waiter(compiled, from_date, to_date, engine, as_resolution(resolution, from_date))
+        self._supersede(session, [waiter])
+        return await waiter
+
+    async def progressive(
+            self,
+            compiled: CompiledPlan,
+            from_date: datetime,
+            to_date: datetime,
+            engine: str = "vectorized",
+            resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+            session: Optional[Hashable] = None,
+    ) -> AsyncIterator[SimulationResult]:
+        """
+        Yields the simulation at coarse_resolution and then at resolution, both started at once,
+        or only the one if they are the same. Stops with asyncio.CancelledError when a newer call for session comes in.
+        """
+        resolution = as_resolution(resolution, from_date)
+        coarse = as_resolution(self.coarse_resolution, from_date)
+        full = self._waiter(compiled, from_date, to_date, engine, resolution)
+        waiters = [full]
+        if coarse.key != resolution.key:
+            waiters.insert(0, self._waiter(compiled, from_date, to_date, engine, coarse))
+        self._supersede(session, waiters)
+        try:
+            for waiter in waiters:
+                yield await waiter
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    def close(self):
+        """ Shuts down the executor, if the service made it. """
+        if self._own_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self) -> "SimulationService":
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+class ServiceThread:
+    """
+    A SimulationService on an event loop in a thread of its own, that blocking code calls into.
+    A call a newer call of its session cancelled raises concurrent.futures.CancelledError,
+    which a Dash callback can turn into dash.exceptions.PreventUpdate.
+    """
+
+    def __init__(self, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.service = SimulationService(**kwargs)
+        self._thread = threading.Thread(target=self.loop.run_forever, name="lifechoices-service", daemon=True)
+        self._thread.start()
+
+    def simulate(self, *args, **kwargs) -> SimulationResult:
+        """ SimulationService.simulate, waited for. """
+        return asyncio.run_coroutine_threadsafe(self.service.simulate(*args, **kwargs), self.loop).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.service.close()
@@ -0,0 +1,279 @@
+"""
+Finding the transfer amounts or bridge dates that just meet a goal.
+
+    spend = TransferAmount("Spending", lo=-5000.0, hi=0.0)
+    result = solve(Starting_Plan, Bridges, [spend], [BalanceConstraint("Checkings", minimum=0.0)],
+                   from_date, datetime(2090, 1, 1), maximize=False)
+    print(result.report())
+
+is the largest monthly spend, the most negative amount, that never takes Checkings below 0 before 2090.
+
+The free variables move together along one line from all of them at lo to all of them at hi,
+and the solver looks for the last point of that line at which every constraint holds, assuming they hold
+on one side of it and not on the other. It keeps a bracket with a point that meets the constraints
+and one that does not, and every iteration simulates a batch of points in it side by side with run_scenarios,
+sharing one calendar and the schedules of the transfers across every batch: the point a secant through
+the margins of the bracket points to, one just past it, and evenly spaced points in between for when
+the margins are not close to a straight line. Balances are sums of transfer amounts, so the secant usually
+lands on the answer in a few iterations, and the evenly spaced points shrink the bracket when it does not.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from functools import partial
+import io
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from lifechoices.classes import Bridge, DateBridge, Plan, Transfer
+from lifechoices.main import simulate
+from lifechoices.scenarios import run_scenarios
+from lifechoices.state import _edit_brought_in
+from lifechoices.resolution import Resolution
+
+
+@dataclass(frozen=True)
+class TransferAmount:
+    """
+    The amount of the transfers named name, between lo and hi, found to within tolerance. It is set in the starting plan
+    and on the transfers of that name a bridge brings in. The ones a bridge carries over keep the amount they have grown to.
+    """
+    name: str
+    lo: float
+    hi: float
+    tolerance: float = 0.01
+
+    def at(self, position: float) -> float:
+        return self.lo + position * (self.hi - self.lo)
+
+    def step(self) -> float:
+        """ The position along the search this variable is found to within. """
+        return self.tolerance / abs(self.hi - self.lo) if self.hi != self.lo else 1.0
+
+
+@dataclass(frozen=True)
+class BridgeDate:
+    """ The day the DateBridge named name activates on, between lo and hi. """
+    name: str
+    lo: datetime
+    hi: datetime
+
+    def at(self, position: float) -> datetime:
+        return self.lo + timedelta(days=round(position * (self.hi - self.lo).days))
+
+    def step(self) -> float:
+        days = abs((self.hi - self.lo).days)
+        return 1 / days if days else 1.0
+
+
+Variable = Union[TransferAmount, BridgeDate]
+
+
+@dataclass(frozen=True)
+class BalanceConstraint:
+    """
+    The balance of account stays at or above minimum, and at or below maximum if given,
+    on every recorded day from start to end, which default to the whole simulation.
+    Days the account does not exist on are not checked.
+    """
+    account: str
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+    def margin(self, accounts: Sequence[str], dates: np.ndarray, values: np.ndarray) -> float:
+        """ How far the balances in values, a row per date and a column per account, stay from breaking it. Negative if they do. """
+        if self.account not in accounts:
+            return np.inf
+        balances = values[:, list(accounts).index(self.account)]
+        window = np.ones(len(dates), dtype=bool)
+        if self.start is not None:
+            window &= dates >= np.datetime64(self.start, "us")
+        if self.end is not None:
+            window &= dates <= np.datetime64(self.end, "us")
+        balances = balances[window & ~np.isnan(balances)]
+        if not len(balances):
+            return np.inf
+        margin = np.inf
+        if self.minimum is not None:
+            margin = min(margin, float((balances - self.minimum).min()))
+        if self.maximum is not None:
+            margin = min(margin, float((self.maximum - balances).min()))
+        return margin
+
+
+@dataclass(frozen=True)
+class Iteration:
+    """ One batch of the search: the points simulated, their margins, and the bracket they left. """
+    positions: Tuple[float, ...]
+    margins: Tuple[float, ...]
+    feasible: Optional[float]  # the furthest point known to meet the constraints
+    infeasible: Optional[float]  # the closest point past it known not to
+
+
+@dataclass(frozen=True)
+class SolveResult:
+    """
+    The values of the variables at the last point that meets every constraint, or None if none does,
+    with the starting plan and bridges that have them, and how the search got there.
+    position is where that point is along the search, 0 is every variable at lo and 1 at hi.
+    """
+    values: Optional[Dict[str, Union[float, datetime]]]
+    position: Optional[float]
+    margin: float
+    starting_plan: Plan
+    bridges: Tuple[Bridge, ...]
+    iterations: Tuple[Iteration, ...]
+
+    @property
+    def feasible(self) -> bool:
+        return self.values is not None
+
+    @property
+    def simulations(self) -> int:
+        return sum(len(it.positions) for it in self.iterations)
+
+    def report(self) -> str:
+        """ The iterations of the search as a table, and what it found. """
+        lines = [f"{'iteration':>9} {'simulated':>9} {'feasible':>12} {'infeasible':>12} {'closest margin':>14}"]
+        for i, it in enumerate(self.iterations, 1):
+            closest = min((m for m in it.margins if m >= 0), default=float("nan"))
+            lines.append(f"{i:>9} {len(it.positions):>9} {_position(it.feasible):>12} {_position(it.infeasible):>12} {closest:>14.4f}")
+        if self.feasible:
+            found = ", ".join(f"{name} = {value}" for name, value in self.values.items())
+            lines.append(f"{found} with a margin of {self.margin:.4f}, in {len(self.iterations)} iterations and {self.simulations} simulations")
+        else:
+            lines.append(f"No point meets the constraints, {self.simulations} simulations")
+        return "\n".join(lines)
+
+
+def _position(s: Optional[float]) -> str:
+    return "-" if s is None else f"{s:.8f}"
+
+
+def _set_amount(amounts: Dict[str, float], transfer: Transfer) -> Transfer:
+    return replace(transfer, amount=amounts[transfer.name]) if transfer.name in amounts else transfer
+
+
+def _with_transfer_amounts(plan: Plan, amounts: Dict[str, float]) -> Plan:
+    if not amounts:
+        return plan
+    return Plan(plan.accounts, [_set_amount(amounts, t) for t in plan.transfers])
+
+
+def _apply(
+        starting_plan: Plan,
+        bridges: Sequence[Bridge],
+        variables: Sequence[Variable],
+        position: float,
+) -> Tuple[Plan, List[Bridge]]:
+    """
+    The starting plan and bridges with every variable at position. A transfer amount is set in the starting plan
+    and on the transfers of that name a bridge brings in, and not on the ones a bridge carries over.
+    """
+    amounts = {v.name: v.at(position) for v in variables if isinstance(v, TransferAmount)}
+    dates = {v.name: v.at(position) for v in variables if isinstance(v, BridgeDate)}
+    applied = []
+    for b in bridges:
+        if b.name in dates:
+            b = replace(b, trigger_date=dates[b.name])
+        if amounts:
+            b = replace(b, bridge_function=partial(_edit_brought_in, b.bridge_function, partial(_set_amount, amounts)))
+        applied.append(b)
+    return _with_transfer_amounts(starting_plan, amounts), applied
+
+
+def _margin(results, k: int, constraints: Sequence[BalanceConstraint]) -> float:
+    return min((c.margin(results.accounts, results.dates, results.values[k]) for c in constraints), default=np.inf)
+
+
+def solve(
+        starting_plan: Plan,
+        bridges: Sequence[Bridge],
+        variables: Sequence[Variable],
+        constraints: Sequence[BalanceConstraint],
+        from_date: datetime,
+        to_date: datetime,
+        maximize: bool = True,
+        batch: int = 4,
+        max_iterations: int = 20,
+        resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+) -> SolveResult:
+    """
+    Moves the variables from lo towards hi, or from hi towards lo if maximize is False,
+    as far as the constraints hold, and returns where they stop holding to within the tolerance of every variable.
+    Every iteration simulates batch plans side by side, at least 3.
+    """
+    if not variables:
+        raise ValueError("solve needs at least one variable.")
+    if batch < 3:
+        raise ValueError(f"batch should be at least 3. Got {batch}")
+    names = {b.name: b for b in bridges}
+    for v in variables:
+        if isinstance(v, BridgeDate) and not isinstance(names.get(v.name), DateBridge):
+            raise ValueError(f"There is no DateBridge named {v.name}.")
+    # The search runs from s = 0, where the constraints should hold, to s = 1, where they should not
+    position = (lambda s: s) if maximize else (lambda s: 1.0 - s)
+    step = min(v.step() for v in variables)
+    schedules: Dict = {}
+
+    def evaluate(points: List[float]) -> List[float]:
+        variants = [_apply(starting_plan, bridges, variables, position(s)) for s in points]
+        # Bridges print when they activate, in every variant of every batch
+        with redirect_stdout(io.StringIO()):
+            results = run_scenarios(variants, from_date, to_date, resolution, schedules)
+        return [_margin(results, k, constraints) for k in range(len(points))]
+
+    iterations: List[Iteration] = []
+    points = np.linspace(0.0, 1.0, batch).tolist()
+    margins = evaluate(points)
+    if margins[0] < 0:
+        iterations.append(Iteration(tuple(points), tuple(margins), None, 0.0))
+        return SolveResult(None, None, margins[0], starting_plan, tuple(bridges), tuple(iterations))
+    lo, lo_margin, hi, hi_margin = _bracket(points, margins, 0.0, margins[0], None, np.nan)
+    iterations.append(Iteration(tuple(points), tuple(margins), lo, hi))
+    while hi is not None and hi - lo > step and len(iterations) < max_iterations:
+        # Where the secant through the bracket crosses a margin of 0, the point just past it,
+        # and the rest evenly spaced in the bracket
+        secant = lo + (hi - lo) * lo_margin / (lo_margin - hi_margin) if np.isfinite(lo_margin - hi_margin) else (lo + hi) / 2
+        secant = min(max(secant, lo + step / 2), hi - step / 2)
+        points = [secant, min(secant + step / 2, hi - step / 4)] + np.linspace(lo, hi, batch)[1:-1].tolist()[:batch - 2]
+        points = sorted(set(points))
+        margins = evaluate(points)
+        lo, lo_margin, hi, hi_margin = _bracket(points, margins, lo, lo_margin, hi, hi_margin)
+        iterations.append(Iteration(tuple(points), tuple(margins), lo, hi))
+
+    plan, solved = _apply(starting_plan, bridges, variables, position(lo))
+    values = {v.name: v.at(position(lo)) for v in variables}
+    # The batches share schedules and run side by side, so check the answer the way a caller would simulate it
+    with redirect_stdout(io.StringIO()):
+        check = simulate(plan, solved, from_date, to_date, resolution=resolution)
+    margin = min((c.margin(check.accounts, check.dates, check.values) for c in constraints), default=np.inf)
+    if not np.isclose(margin, lo_margin, rtol=1e-9, atol=1e-6 * max(1.0, abs(lo_margin))):
+        raise RuntimeError(f"Simulating the values found gives a margin of {margin}, "
+                           f"not the {lo_margin} the search found. Values: {values}")
+    return SolveResult(values, position(lo), margin, plan, tuple(solved), tuple(iterations))
+
+
+def _bracket(
+        points: Sequence[float],
+        margins: Sequence[float],
+        lo: float,
+        lo_margin: float,
+        hi: Optional[float],
+        hi_margin: float,
+) -> Tuple[float, float, Optional[float], float]:
+    """
+    The furthest point that meets the constraints and the closest one past it that does not,
+    from a bracket and the margins of new points in it. hi is None while no point past lo has failed.
+    """
+    inside = sorted((s, m) for s, m in zip(points, margins) if s > lo and (hi is None or s < hi))
+    for s, m in inside:
+        if m >= 0:
+            lo, lo_margin = s, m
+    for s, m in reversed(inside):
+        if m < 0 and s > lo:
+            hi, hi_margin = s, m
+    return lo, lo_margin, hi, hi_margin
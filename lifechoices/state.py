@@ -0,0 +1,156 @@
+"""
+A plan compiled into integer ids and flat lists, which the day by day loop runs on.
+
+Plans, accounts and transfers are frozen specs that the simulation never changes.
+While the loop runs a plan, its accounts are ids into a list of balances, and its transfers are ids into
+parallel lists of the accounts they move money from and to, the amount they move the next time they fire,
+and how much that amount grows every time they do. The schedules of the plan are lists of transfer ids,
+so applying a transfer is a few lookups by index instead of finding accounts by name.
+A Plan with the balances and amounts of the day is only made when a bridge is handed one.
+"""
+from typing import TYPE_CHECKING, Callable, Dict, List, Mapping, Optional, Tuple
+from dataclasses import dataclass, replace
+from datetime import datetime
+
+from lifechoices.classes import Plan, Transfer
+from lifechoices.recurrence import EveryNYears
+from lifechoices.schedule import _generate_from_plan
+from lifechoices.growth import _base, _account_interest
+
+if TYPE_CHECKING:
+    from lifechoices.ledger import Ledger
+
+
+def _with_amounts(plan: Plan, balances: Mapping[str, float], amounts: Optional[Mapping[int, float]] = None) -> Plan:
+    """
+    A new plan like plan, with the balances of its accounts by name,
+    and the amounts of its transfers by the id() of the transfer, if given.
+    """
+    accounts = [replace(a, amount=balances[a.name]) for a in plan.accounts]
+    if amounts is None:
+        return Plan(accounts, list(plan.transfers))
+    return Plan(accounts, [replace(t, amount=amounts[id(t)]) for t in plan.transfers])
+
+
+
+def _edit_brought_in(bridge_function: Callable[[Plan], Plan], edit: Callable[[Transfer], Optional[Transfer]], plan: Plan) -> Plan:
+    """
+    The plan bridge_function gives for plan, with edit made to the transfers it brings in, None dropping one.
+    A transfer is carried over when the bridge hands back the very object it was given, which was edited
+    before the bridge and may have grown since, so it is left as it is. One the bridge makes itself is brought in,
+    even when it is equal to one in plan.
+    """
+    bridged = bridge_function(plan)
+    carried = {id(t) for t in plan.transfers}
+    transfers = [t if id(t) in carried else edit(t) for t in bridged.transfers]
+    return Plan(bridged.accounts, [t for t in transfers if t is not None])
+
+@dataclass
+class PlanState:
+    """
+    The balances and transfer amounts of a plan while it is simulated, by integer id.
+    Money moved to or from no account goes to one more balance, after the ones of names.
+    Monthly transfers compound for the days since the same day last month, so their growth is per day.
+    """
+    plan: Plan
+    names: List[str]  # the accounts by id
+    balances: List[float]
+    interest: List[float]  # the interest each balance earns every day
+    transfers: List[Transfer]  # the transfers by id
+    from_idx: List[int]
+    to_idx: List[int]
+    amounts: List[float]
+    growth: List[float]  # what each amount is multiplied by every time it fires
+    once: Dict[datetime, List[int]]
+    daily: List[int]
+    weekly: Dict[int, List[int]]  # By day of the week
+    biweekly: Dict[int, Dict[int, List[int]]]  # By week of the month parity and day of the week
+    monthly: Dict[int, List[int]]  # By day of the month
+    yearly: Dict[int, Dict[int, List[int]]]  # By month and day
+    nyearly: Dict[int, Dict[int, List[Tuple[int, EveryNYears]]]]  # By month and day, with the years they fire in
+
+    @classmethod
+    def compile(cls, plan: Plan) -> "PlanState":
+        V = _generate_from_plan(plan)
+        names = list(V.accounts_by_name)
+        index = {name: i for i, name in enumerate(names)}
+        outside = len(names)
+        state = cls(
+            plan=plan,
+            names=names,
+            balances=[a.amount for a in V.accounts_by_name.values()] + [0.0],
+            interest=[_account_interest(a) for a in V.accounts_by_name.values()] + [0.0],
+            transfers=[], from_idx=[], to_idx=[], amounts=[], growth=[],
+            once={}, daily=[], weekly={}, biweekly={}, monthly={}, yearly={}, nyearly={},
+        )
+
+        def add(t: Transfer, growth: float) -> int:
+            state.transfers.append(t)
+            state.from_idx.append(index[t.from_account] if t.from_account else outside)
+            state.to_idx.append(index[t.to_account] if t.to_account else outside)
+            state.amounts.append(t.amount)
+            state.growth.append(growth)
+            return len(state.transfers) - 1
+
+        for date, transfers in V.once.items():
+            state.once[date] = [add(t, 1.0) for t in transfers]
+        state.daily = [add(t, _base(t.APR.daily_value)) for t in V.daily]
+        for dayOfWeek, transfers in V.weekly.items():
+            state.weekly[dayOfWeek] = [add(t, _base(t.APR.daily_value) ** 7) for t in transfers]
+        for weekOffset, by_day in V.biweekly.items():
+            state.biweekly[weekOffset] = {dayOfWeek: [add(t, _base(t.APR.daily_value) ** 14) for t in transfers]
+                                          for dayOfWeek, transfers in by_day.items()}
+        for dayOfMonth, transfers in V.monthly.items():
+            state.monthly[dayOfMonth] = [add(t, _base(t.APR.daily_value)) for t in transfers]
+        for month, by_day in V.yearly.items():
+            state.yearly[month] = {day: [add(t, _base(t.APR.daily_value) ** 365) for t in transfers]
+                                   for day, transfers in by_day.items()}
+        for month, by_day in V.nyearly.items():
+            state.nyearly[month] = {day: [(add(t, _base(t.APR.daily_value, t.nyears*365) ** (t.nyears*365)), t.recurrence())
+                                          for t in transfers]
+                                    for day, transfers in by_day.items()}
+        return state
+
+    def apply_transfers(self, date: datetime, calendar: Dict[str, List[int]], row: int, ledger: Optional["Ledger"] = None) -> int:
+        """
+        Applies the transfers that fire on date, the row of calendar (see lifechoices.calendar.calendar_lists),
+        to the balances, growing their amounts, and returns how many there were.
+        They are recorded in ledger as moved on day row + 1, if given.
+        """
+        weekday, day, month = calendar["weekday"][row], calendar["day"][row], calendar["month"][row]
+        yearly = self.yearly.get(month)
+        nyearly = self.nyearly.get(month)
+        monthly = self.monthly.get(day, ())
+        # A monthly transfer compounds for the days since the same day last month, the rest grow by one step
+        groups = (
+            (self.once.get(date, ()), 1),
+            (self.daily, 1),
+            (self.weekly.get(weekday, ()), 1),
+            (self.biweekly.get(calendar["weekOfMonthParity"][row], {}).get(weekday, ()), 1),
+            (monthly, calendar["daysSinceLastMonth"][row]),
+            (yearly.get(day, ()) if yearly else (), 1),
+            ([k for k, rule in nyearly.get(day, ()) if rule.fires_on(calendar, row)] if nyearly else (), 1),
+        )
+        balances, amounts, growth, from_idx, to_idx = self.balances, self.amounts, self.growth, self.from_idx, self.to_idx
+        applied = 0
+        for ids, days in groups:
+            if ledger is not None and ids:
+                ledger._add_transfers(row + 1, ids, amounts)
+            for k in ids:
+                amount = amounts[k]
+                balances[from_idx[k]] -= amount
+                balances[to_idx[k]] += amount
+                amounts[k] = amount * (growth[k] if days == 1 else growth[k] ** days)
+            applied += len(ids)
+        return applied
+
+    def compound(self):
+        """ A day of interest on every balance. """
+        self.balances = [b + i * b for b, i in zip(self.balances, self.interest)]
+
+    def balances_by_name(self) -> Dict[str, float]:
+        return dict(zip(self.names, self.balances))
+
+    def to_plan(self) -> Plan:
+        """ The plan with the balances and transfer amounts it has now, for a bridge to change. """
+        return _with_amounts(self.plan, self.balances_by_name(), {id(t): a for t, a in zip(self.transfers, self.amounts)})
@@ -0,0 +1,251 @@
+"""
+A cache of simulations shared by every process on a machine.
+
+Under gunicorn the Dash app runs in several worker processes, and a SimulationCache in each of them would
+simulate and hold its own copy of the same results. A SharedResultStore keeps results as .npy files
+in a directory instead, by default in /dev/shm where files are shared memory, and every process maps them
+read only with numpy.load(mmap_mode="r"), so they all read the same pages without copying them.
+
+Entries are keyed by the content of the plan, the first day, the engine and the resolution, and like
+SimulationCache a simulation of no more days than a stored one is a slice of it. A process that misses
+takes a file lock for the key, so when many ask for the same missing plan at once one simulates it and
+the rest wait and map what it wrote. A new entry is written under a temporary name and renamed into place,
+so no process ever maps half of one. When the files add up to more than max_bytes, the entries used
+longest ago are deleted. A process still mapping a deleted entry keeps its pages until it lets go of them.
+
+Plans are keyed by lifechoices.serialize.plan_hash, so bridges should be built from the actions of
+lifechoices.serialize, which are only data. A python function can not be keyed by what it does: retirement_bridge in
+example_transactions.py reads the global Accounts_Old, and editing either keeps its name, so a key made from
+the name would keep serving the results from before the edit to every process, long after it restarted.
+So the store refuses plans whose bridges call python functions unless the caller gives a version with them,
+a string they change whenever those functions or anything they read changes. Those functions still have to be
+defined at the top of a module, and are keyed by their module and name along with the version.
+The locks are fcntl locks, which only exist on unix.
+"""
+from typing import Any, Iterable, Optional, Tuple, Union
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import fields, is_dataclass
+from datetime import datetime, timedelta
+from enum import Enum
+from functools import lru_cache
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from lifechoices.cache import CompiledPlan
+from lifechoices.classes import APR
+from lifechoices.engine import _number_of_days
+from lifechoices.resolution import Resolution, as_resolution
+from lifechoices.result import SimulationResult
+from lifechoices.serialize import plan_hash
+from lifechoices.utils import strip_date_timestamp
+
+
+def _function_name(function) -> str:
+    """ The module and name of a function defined at the top of a module, which every process finds the same. """
+    module, name = getattr(function, "__module__", None), getattr(function, "__qualname__", "")
+    if module is None or "<" in name or getattr(sys.modules.get(module), name, None) is not function:
+        raise ValueError(f"{function!r} is not a function defined at the top of a module, so other processes "
+                         f"can not tell it apart. Use the actions of lifechoices.serialize or name it in a module.")
+    return f"{module}.{name}"
+
+
+def _stable(obj: Any) -> Any:
+    """ The values of a plan or bridge as JSON data, with functions by their names. """
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return [type(obj).__name__] + [_stable(getattr(obj, f.name)) for f in fields(obj) if f.init]
+    if isinstance(obj, (list, tuple)):
+        return [_stable(x) for x in obj]
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.name
+    if isinstance(obj, APR):
+        return [obj.value, obj.period.name]
+    if obj is None or isinstance(obj, (str, bool, int, float)):
+        return obj
+    if callable(obj):
+        return _function_name(obj)
+    raise ValueError(f"{obj!r} can not be part of the key of a shared result.")
+
+
+@lru_cache(maxsize=256)
+def content_hash(compiled: CompiledPlan, version: Optional[str] = None) -> str:
+    """
+    A hash of the values of a compiled plan that is the same in every process.
+    Plans with bridges that call python functions need a version, which is hashed with the names of the functions.
+    """
+    try:
+        return plan_hash(compiled.starting_plan, compiled.bridges)
+    except ValueError as e:
+        if version is None:
+            raise ValueError(f"{e} A shared result can only be keyed by the name of a python function, which stays the same "
+                             f"when it or the globals it reads change. Pass a version that changes with them.") from e
+        text = json.dumps([version, _stable((compiled.starting_plan, compiled.bridges))], separators=(",", ":"))
+        return "py-" + hashlib.sha256(text.encode()).hexdigest()
+
+
+class SharedResultStore:
+    """
+    Simulation results in directory, shared by every process that opens a store on it, using at most max_bytes.
+    Each process also keeps the last maxsize results it mapped, so asking again for one is a dictionary lookup.
+    hits and misses count the simulations this process was asked for and did not have to run, or ran.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 1 << 30, maxsize: int = 32):
+        if directory is None:
+            shm = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            directory = os.path.join(shm, "lifechoices-results")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._mapped: "OrderedDict[str, Tuple[int, SimulationResult]]" = OrderedDict()
+        os.makedirs(os.path.join(directory, "locks"), exist_ok=True)
+
+    @contextmanager
+    def _lock(self, name: str):
+        import fcntl
+
+        with open(os.path.join(self.directory, "locks", name + ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _open(self, key: str) -> Optional[Tuple[int, SimulationResult]]:
+        """ The number of days and the result of a stored entry, mapped, or None if there is none. """
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            dates = np.load(os.path.join(path, "dates.npy"), mmap_mode="r")
+            values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+            # The last time an entry was used is when its meta.json was last touched
+            os.utime(os.path.join(path, "meta.json"))
+        except FileNotFoundError:
+            # Not there, or evicted while it was being opened
+            return None
+        if values.shape != (len(dates), len(meta["accounts"])):
+            # A longer simulation replaced the entry between reading its files, which only happens outside the lock
+            return None
+        bridges = tuple((name, datetime.fromisoformat(date)) for name, date in meta["bridges"])
+        return meta["days"], SimulationResult(tuple(meta["accounts"]), dates, values, bridges)
+
+    def _write(self, key: str, n: int, result: SimulationResult):
+        """ Writes an entry next to its place and renames it in, replacing a shorter one if there is one. """
+        staging = tempfile.mkdtemp(prefix=f".{key}-", dir=self.directory)
+        np.save(os.path.join(staging, "dates.npy"), np.ascontiguousarray(result.dates))
+        np.save(os.path.join(staging, "values.npy"), np.ascontiguousarray(result.values))
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({"days": n, "accounts": list(result.accounts),
+                       "bridges": [(name, date.isoformat()) for name, date in result.bridges]}, f)
+        path = self._path(key)
+        if os.path.exists(path):
+            old = tempfile.mkdtemp(prefix=f".{key}-old-", dir=self.directory)
+            os.replace(path, os.path.join(old, key))
+            shutil.rmtree(old, ignore_errors=True)
+        os.replace(staging, path)
+
+    def _entries(self):
+        """ The stored entries as (last used, bytes, key), oldest first. """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(".") or entry.name == "locks" or not entry.is_dir():
+                continue
+            try:
+                used = os.stat(os.path.join(entry.path, "meta.json")).st_mtime
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+            except FileNotFoundError:
+                continue
+            entries.append((used, size, entry.name))
+        return sorted(entries)
+
+    def evict(self, keep: Iterable[str] = ()):
+        """ Deletes the entries used longest ago until the rest fit in max_bytes, except the ones in keep. """
+        keep = set(keep)
+        with self._lock("store"):
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                if key in keep:
+                    continue
+                shutil.rmtree(self._path(key), ignore_errors=True)
+                total -= size
+
+    def nbytes(self) -> int:
+        """ How many bytes the stored entries take. """
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        """ Deletes every stored entry, for every process. """
+        with self._lock("store"):
+            for _, _, key in self._entries():
+                shutil.rmtree(self._path(key), ignore_errors=True)
+        self._mapped.clear()
+
+    def _remember(self, key: str, n: int, result: SimulationResult):
+        self._mapped[key] = (n, result)
+        self._mapped.move_to_end(key)
+        while len(self._mapped) > self.maxsize:
+            self._mapped.popitem(last=False)
+
+    def simulate(
+            self,
+            compiled: CompiledPlan,
+            from_date: datetime,
+            to_date: datetime,
+            engine: str = "vectorized",
+            resolution: Union[str, Iterable[datetime], Resolution] = "daily",
+            version: Optional[str] = None,
+    ) -> SimulationResult:
+        """
+        Same as compiled.simulate, only looked up in the store first and written to it after.
+        If the bridges call python functions, version has to be given, and changed whenever they change.
+        """
+        resolution = as_resolution(resolution, from_date)
+        n = _number_of_days(from_date, to_date)
+        if n <= 0:
+            return compiled.simulate(from_date, to_date, engine, resolution)
+        dates = hashlib.sha256(b"".join(part if isinstance(part, bytes) else str(part).encode() for part in resolution.key))
+        key = hashlib.sha256(
+            f"{content_hash(compiled, version)}|{from_date.isoformat()}|{engine}|{dates.hexdigest()}".encode()
+        ).hexdigest()
+
+        ran = False
+        found = self._mapped.get(key)
+        if found is not None and n <= found[0]:
+            self._mapped.move_to_end(key)
+        else:
+            found = self._open(key)
+            if found is None or not n <= found[0]:
+                # Keys are hex, so their first two letters spread them over 256 lock files
+                with self._lock(key[:2]):
+                    # Another process may have written it while this one waited for the lock
+                    found = self._open(key)
+                    if found is None or not n <= found[0]:
+                        result = compiled.simulate(from_date, to_date, engine, resolution)
+                        self._write(key, n, result)
+                        found = self._open(key) or (n, result)
+                        ran = True
+            self._remember(key, *found)
+        if ran:
+            self.misses += 1
+            self.evict(keep=[key])
+        else:
+            self.hits += 1
+        cached_n, result = found
+        return result if n == cached_n else result.until(strip_date_timestamp(from_date) + timedelta(days=n))
@@ -1,5 +1,6 @@
 from datetime import datetime
 from math import ceil
+import sys
 
 
 def weekOfMonth(dt: datetime):
@@ -81,4 +82,10 @@ def price_at_year(
         interest_rate_per_period=yearly_inflation_rate,
         compounding_times_per_period=1,
         t=(date - today).days/365
-    ) + price
\ No newline at end of file
+    ) + price
+
+
+def _is_dataframe(data) -> bool:
+    """ Whether data is a pandas DataFrame, without importing pandas: if nothing imported it, data cannot be one. """
+    pd = sys.modules.get("pandas")
+    return pd is not None and isinstance(data, pd.DataFrame)
@@ -0,0 +1,70 @@
+import csv
+import textwrap
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from lifechoices.batch import load_plan, main
+from lifechoices import simulate
+
+PLAN_MODULE = textwrap.dedent("""
+    from datetime import datetime
+    from dataclasses import replace
+    from lifechoices import *
+
+    Starting_Plan = Plan([Account("Savings", 1000.0, APR(0.05, Period.YEARLY), datetime(2020, 1, 1))],
+                         [Monthly("Salary", {salary}, "Savings")])
+
+
+    def retire(plan):
+        savings = plan.accounts[0]
+        return Plan([savings, Account("Checkings", 0.0, APR(0.01, Period.YEARLY), datetime(2030, 1, 1))],
+                    [Monthly("Drawdown", 500.0, "Checkings", "Savings")])
+
+
+    Bridges = [DateBridge("Retire", retire, datetime(2030, 1, 1))]
+""")
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.fixture
+def plans(tmp_path):
+    for user, salary in (("alice", 100.0), ("bob", 250.0)):
+        (tmp_path / "plans" / user).mkdir(parents=True)
+        (tmp_path / "plans" / user / "transactions.py").write_text(PLAN_MODULE.format(salary=salary))
+    (tmp_path / "plans" / "broken").mkdir()
+    (tmp_path / "plans" / "broken" / "transactions.py").write_text("Starting_Plan = 1 / 0\n")
+    return tmp_path
+
+
+def test_batch_writes_what_simulate_gives(plans, capsys):
+    out = plans / "results"
+    code = main([str(plans / "plans" / "alice"), str(plans / "plans" / "bob"), "--out", str(out), "--from-date", "2020-01-01",
+                 "--to-date", "2040-01-01", "--resolution", "month-end", "--workers", "1"])
+    assert code == 0
+    for user in ("alice", "bob"):
+        plan, bridges = load_plan(str(plans / "plans" / user / "transactions.py"))
+        expected = simulate(plan, bridges, datetime(2020, 1, 1), datetime(2040, 1, 1), engine="events", resolution="month-end")
+        rows = read_csv(out / f"{user}-transactions.csv")
+        wanted = [(str(date)[:10], account, value)
+                  for date, row in zip(expected.dates, expected.values) for account, value in zip(expected.accounts, row)
+                  if not np.isnan(value)]
+        assert [(r["Date"], r["Account"], float(r["Value"])) for r in rows] == wanted
+    summary = read_csv(out / "summary.csv")
+    assert [(s["plan"], s["status"]) for s in summary] == [("alice-transactions", "ok"), ("bob-transactions", "ok")]
+
+
+def test_a_failed_plan_is_reported_and_exits_1(plans, capsys):
+    out = plans / "results"
+    code = main([str(plans / "plans"), "--out", str(out), "--from-date", "2020-01-01", "--years", "5", "--workers", "2"])
+    assert code == 1
+    summary = {s["plan"]: s for s in read_csv(out / "summary.csv")}
+    assert summary["broken-transactions"]["status"] == "failed"
+    assert "ZeroDivisionError" in summary["broken-transactions"]["error"]
+    assert summary["alice-transactions"]["status"] == summary["bob-transactions"]["status"] == "ok"
+    assert (out / "alice-transactions.csv").exists()
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from lifechoices import APR, Account, CompiledPlan, DateBridge, Monthly, Period, Plan, SimulationCache, simulate
+
+START, END = datetime(2020, 1, 1), datetime(2040, 1, 1)
+
+
+def retire(plan: Plan) -> Plan:
+    return Plan(list(plan.accounts), [t for t in plan.transfers if t.name != "Salary"])
+
+
+def starting_plan(salary=100.0):
+    return Plan([Account("Savings", 1000.0, APR(0.05, Period.YEARLY), START)],
+                [Monthly("Salary", salary, "Savings"), Monthly("Rent", 50.0, None, "Savings")])
+
+
+BRIDGES = [DateBridge("Retire", retire, datetime(2030, 1, 1))]
+
+
+def assert_same(result, expected):
+    assert result.accounts == expected.accounts
+    np.testing.assert_array_equal(result.dates, expected.dates)
+    np.testing.assert_array_equal(result.values, expected.values)
+    assert result.bridges == expected.bridges
+
+
+@pytest.mark.parametrize("resolution", ["daily", "weekly", "month-end"])
+@pytest.mark.parametrize("to_date", [datetime(2025, 6, 30), datetime(2030, 1, 1), datetime(2035, 3, 1, 12)])
+def test_a_shorter_simulation_is_a_slice_of_a_cached_one(resolution, to_date, capsys):
+    cache = SimulationCache()
+    compiled = CompiledPlan.compile(starting_plan(), BRIDGES)
+    cache.simulate(compiled, START, END, resolution=resolution)
+    sliced = cache.simulate(compiled, START, to_date, resolution=resolution)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert_same(sliced, simulate(starting_plan(), BRIDGES, START, to_date, resolution=resolution))
+
+
+def test_what_makes_a_different_simulation(capsys):
+    cache = SimulationCache(maxsize=2)
+    compiled = CompiledPlan.compile(starting_plan(), BRIDGES)
+    cache.simulate(compiled, START, datetime(2030, 1, 1))
+    # A longer simulation and another start are new, and the first one is evicted
+    cache.simulate(compiled, START, END)
+    cache.simulate(compiled, datetime(2021, 1, 1), END)
+    assert cache.misses == 3 and len(cache) == 2
+    assert CompiledPlan.compile(starting_plan(), BRIDGES) == compiled
+    cache.simulate(CompiledPlan.compile(starting_plan(), BRIDGES), START, END)
+    assert cache.hits == 1
+    cache.simulate(CompiledPlan.compile(starting_plan(salary=200.0), BRIDGES), START, END)
+    assert cache.misses == 4
+
+
+def test_compiling_copies_the_plan(capsys):
+    plan = starting_plan()
+    compiled = CompiledPlan.compile(plan, BRIDGES)
+    expected = simulate(starting_plan(), BRIDGES, START, END)
+    plan.transfers.append(Monthly("Bonus", 1000.0, "Savings"))
+    assert_same(SimulationCache().simulate(compiled, START, END), expected)
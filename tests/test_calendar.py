@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from lifechoices.calendar import FIELDS, calendar_lists, calendar_table
+from lifechoices.utils import monthdelta, weekOfMonth
+
+
+def expected(first_day: datetime, n: int):
+    """ The calendar fields worked out a day at a time from datetimes, the way the loop engine used to. """
+    columns = {key: [] for key in FIELDS}
+    for k in range(n):
+        date = first_day + timedelta(days=k)
+        columns["year"].append(date.year)
+        columns["month"].append(date.month)
+        columns["day"].append(date.day)
+        columns["weekday"].append(date.weekday())
+        columns["weekOfMonth"].append(weekOfMonth(date))
+        columns["weekOfMonthParity"].append(weekOfMonth(date) % 2)
+        columns["daysSinceLastMonth"].append((date - monthdelta(date, -1)).days)
+    return columns
+
+
+@pytest.mark.parametrize("first_day, n", [
+    # Over three centuries, through 1900 and 2100, which are not leap years, and 2000, which is
+    (datetime(1899, 12, 25), (datetime(2201, 3, 1) - datetime(1899, 12, 25)).days),
+    # The time of day is dropped
+    (datetime(2024, 2, 28, 13, 45), 400),
+    (datetime(2023, 1, 31), 1),
+])
+def test_calendar_matches_utils(first_day, n):
+    day = datetime(first_day.year, first_day.month, first_day.day)
+    want = expected(day, n)
+    table = calendar_table(first_day, n)
+    lists = calendar_lists(first_day, n)
+    assert set(table) == set(lists) == set(FIELDS)
+    for key in FIELDS:
+        assert table[key].tolist() == want[key], key
+        assert lists[key] == want[key], key
+
+
+def test_empty_calendar():
+    assert all(len(column) == 0 for column in calendar_table(datetime(2020, 1, 1), 0).values())
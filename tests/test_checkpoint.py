@@ -0,0 +1,79 @@
+from dataclasses import replace
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from lifechoices import APR, Account, DateBridge, Monthly, Once, Period, Plan, simulate
+from lifechoices.checkpoint import PlanDiff, resimulate, simulate_resumable
+
+FROM_DATE, TO_DATE = datetime(2020, 1, 1), datetime(2040, 1, 1)
+
+
+def retire(plan):
+    checkings, savings = plan.accounts
+    return Plan([replace(checkings, amount=checkings.amount + savings.amount), replace(savings, amount=0.0)],
+                [t for t in plan.transfers if t.name != "Salary"])
+
+
+def downsize(plan):
+    return Plan(list(plan.accounts), [t for t in plan.transfers if t.name != "Rent"] + [Monthly("Rent", 300.0, None, "Checkings")])
+
+
+STARTING_PLAN = Plan(
+    [Account("Checkings", 20000.0, APR(0.02, Period.YEARLY), FROM_DATE),
+     Account("Savings", 50000.0, APR(0.05, Period.YEARLY), FROM_DATE)],
+    # Spending grows with inflation, and the bridges carry it over as it has grown
+    [Monthly("Salary", 3000.0, "Checkings"),
+     Monthly("Spending", 500.0, None, "Checkings", APR=APR(0.03, Period.YEARLY)),
+     Monthly("Rent", 1000.0, None, "Checkings"),
+     Once("Car", 20000.0, None, "Savings", date=datetime(2033, 6, 1))],
+)
+BRIDGES = [DateBridge("Downsize", downsize, datetime(2028, 1, 1)), DateBridge("Retire", retire, datetime(2032, 1, 1))]
+
+
+def assert_same(result, expected):
+    assert result.accounts == expected.accounts
+    assert np.array_equal(result.dates, expected.dates)
+    np.testing.assert_allclose(result.values, expected.values, rtol=1e-9, atol=1e-6)
+    assert result.bridges == expected.bridges
+
+
+def edited(transfers):
+    edits = {t.name: t for t in transfers}
+    return Plan(STARTING_PLAN.accounts, [edits.get(t.name, t) for t in STARTING_PLAN.transfers])
+
+
+@pytest.mark.parametrize("engine", ["vectorized", "events"])
+@pytest.mark.parametrize("transfers", [
+    # Carried over by both bridges after it has grown
+    [Monthly("Spending", 800.0, None, "Checkings", APR=APR(0.03, Period.YEARLY))],
+    # Fires after the last bridge first, so it resumes from a checkpoint after it
+    [Once("Car", 35000.0, None, "Savings", date=datetime(2033, 6, 1))],
+    [Monthly("Salary", 3500.0, "Checkings")],
+])
+def test_resimulate_is_a_full_simulation_of_the_edited_plan(engine, transfers, capsys):
+    previous = simulate_resumable(STARTING_PLAN, BRIDGES, FROM_DATE, TO_DATE, engine, checkpoint_every=200)
+    resumed = resimulate(previous, PlanDiff(transfers=transfers))
+    assert_same(resumed.result, simulate(edited(transfers), BRIDGES, FROM_DATE, TO_DATE, engine))
+
+
+def test_edits_reach_transfers_a_bridge_brings_in(capsys):
+    # Downsizing brings in a Rent of its own, which the edit replaces as well
+    rent = Monthly("Rent", 700.0, None, "Checkings")
+    previous = simulate_resumable(STARTING_PLAN, BRIDGES, FROM_DATE, TO_DATE, checkpoint_every=200)
+    resumed = resimulate(previous, PlanDiff(transfers=[rent]))
+    bridges = [DateBridge("Downsize", lambda plan: Plan(list(plan.accounts), [t for t in plan.transfers if t.name != "Rent"] + [rent]),
+                          datetime(2028, 1, 1)), BRIDGES[1]]
+    assert_same(resumed.result, simulate(edited([rent]), bridges, FROM_DATE, TO_DATE, "events"))
+
+
+def test_a_transfer_a_bridge_makes_is_brought_in_even_when_equal(capsys):
+    # Downsizing makes a Rent equal to the one before it, which is still one it brings in
+    plan = Plan(STARTING_PLAN.accounts, [t if t.name != "Rent" else Monthly("Rent", 300.0, None, "Checkings") for t in STARTING_PLAN.transfers])
+    rent = Monthly("Rent", 700.0, None, "Checkings")
+    previous = simulate_resumable(plan, BRIDGES, FROM_DATE, TO_DATE, checkpoint_every=200)
+    resumed = resimulate(previous, PlanDiff(transfers=[rent]))
+    bridges = [DateBridge("Downsize", lambda plan: Plan(list(plan.accounts), [t for t in plan.transfers if t.name != "Rent"] + [rent]),
+                          datetime(2028, 1, 1)), BRIDGES[1]]
+    assert_same(resumed.result, simulate(edited([rent]), bridges, FROM_DATE, TO_DATE, "events"))
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+import pytest
+
+from lifechoices import APR, Account, NYearly, Period, Plan, Yearly, simulate
+
+START = datetime(2020, 1, 1)
+
+
+@pytest.mark.parametrize("kind", [Yearly, NYearly])
+@pytest.mark.parametrize("month, day, message", [(13, 1, "month"), (0, 1, "month"), (4, 31, "dayOfMonth"), (2, 29, "dayOfMonth")])
+def test_yearly_dates_are_checked_before_simulating(kind, month, day, message):
+    transfer = kind("Insurance", 1200.0, None, "Savings", month=month, dayOfMonth=day)
+    with pytest.raises(ValueError, match=message):
+        transfer.check()
+    plan = Plan([Account("Savings", 1000.0, APR(0.05, Period.YEARLY), START)], [transfer])
+    for engine in ("loop", "vectorized", "events"):
+        with pytest.raises(ValueError, match=message):
+            simulate(plan, [], START, datetime(2030, 1, 1), engine=engine)
+
+
+def test_nyears_is_checked():
+    with pytest.raises(ValueError, match="nyears"):
+        NYearly("Car", 15000.0, None, "Savings", nyears=0).check()
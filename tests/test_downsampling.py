@@ -0,0 +1,54 @@
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from lifechoices import APR, Account, DateBridge, Monthly, Period, Plan, simulate
+from lifechoices.downsampling import METHODS, downsample
+
+START, END = datetime(2020, 1, 1), datetime(2040, 1, 1)
+
+
+def buy_house(plan: Plan) -> Plan:
+    savings = plan.accounts[0]
+    return Plan([replace(savings, amount=savings.amount - 20000.0), Account("House", 20000.0, APR(0.03, Period.YEARLY), START)],
+                list(plan.transfers))
+
+
+def retire(plan: Plan) -> Plan:
+    return Plan(list(plan.accounts), [Monthly("Drawdown", -800.0, "Savings")])
+
+
+PLAN = Plan([Account("Savings", 1000.0, APR(0.05, Period.YEARLY), START)], [Monthly("Salary", 500.0, "Savings")])
+BRIDGES = [DateBridge("House", buy_house, datetime(2025, 6, 15)), DateBridge("Retire", retire, datetime(2033, 3, 2))]
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_bridges_and_endpoints_are_kept(method, capsys):
+    result = simulate(PLAN, BRIDGES, START, END)
+    assert [name for name, _ in result.bridges] == ["House", "Retire"]
+    small = downsample(result, n_points=200, method=method)
+    rows = np.searchsorted(result.dates, small.dates)
+    assert np.array_equal(result.dates[rows], small.dates)
+    always = [result.dates[0], result.dates[-1]] + [np.datetime64(d + delta, "us") for _, d in result.bridges
+                                                    for delta in (timedelta(0), timedelta(days=1))]
+    for date in always:
+        i, j = np.flatnonzero(small.dates == date), np.flatnonzero(result.dates == date)
+        assert len(i) == 1
+        # Every account that has a balance that day keeps it
+        np.testing.assert_array_equal(small.values[i[0]], result.values[j[0]])
+    # Whatever is kept is the balance simulated, and every account keeps about n_points of them
+    kept = ~np.isnan(small.values)
+    np.testing.assert_array_equal(small.values[kept], result.values[rows][kept])
+    assert (kept.sum(axis=0) <= 200 + 2 + 2 * len(result.bridges)).all()
+    assert len(small) < len(result) // 10
+
+
+def test_short_results_and_bad_arguments(capsys):
+    result = simulate(PLAN, BRIDGES, START, datetime(2020, 6, 1))
+    assert downsample(result, n_points=1000) is result
+    with pytest.raises(ValueError):
+        downsample(result, n_points=2)
+    with pytest.raises(ValueError):
+        downsample(result, method="mean")
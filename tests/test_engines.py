@@ -0,0 +1,104 @@
+from dataclasses import replace
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from lifechoices import (
+    APR, Account, BiWeekly, CallbackBridge, DateBridge, Monthly, Once, Period, Plan, ThresholdBridge, Weekly,
+    Yearly, plot_accounts, simulate,
+)
+
+ENGINES = ["loop", "vectorized", "events"]
+
+# The plan of example_transactions.py, which imports dash
+INFLATION_RATE = .05
+RETIREMENT_DATE = datetime(2045, 1, 1)
+Accounts_Young = [Account("Savings", 0.0, APR(0.1 - INFLATION_RATE, Period.YEARLY), datetime(2020, 10, 2))]
+Transfers_Young = [Monthly("Salary", 1000, "Savings")]
+Starting_Plan = Plan(accounts=Accounts_Young, transfers=Transfers_Young)
+Accounts_Old = [
+    Account("Savings", 0.0, APR(0.07 - INFLATION_RATE, Period.YEARLY), RETIREMENT_DATE),
+    Account("Checkings", 0.0, APR(0.03 - INFLATION_RATE, Period.YEARLY), RETIREMENT_DATE)
+]
+Transfers_Old = [Monthly("Savings", -1000, "Checkings"),
+                 Monthly("Checkings", -900, None)]
+
+
+def retirement_bridge(p: Plan) -> Plan:
+    return Plan(
+        accounts=[replace(Accounts_Old[0], amount=p.accounts[0].amount)] + Accounts_Old[1:],
+        transfers=Transfers_Old
+    )
+
+
+Bridges = [DateBridge("Retirement", retirement_bridge, RETIREMENT_DATE)]
+
+# A mortgage paid off by a ThresholdBridge, next to transfers of every kind and a CallbackBridge
+START = datetime(2020, 1, 1)
+MORTGAGE_PLAN = Plan(
+    [Account("Checkings", 5000.0, APR(0.01, Period.YEARLY), START),
+     Account("Savings", 20000.0, APR(0.05, Period.YEARLY), START),
+     Account("Mortgage", -60000.0, APR(0.04, Period.YEARLY), START)],
+    [BiWeekly("Salary", 2500.0, "Checkings", weekOffset=1),
+     Weekly("Groceries", 150.0, None, "Checkings", dayOfWeek=5, APR=APR(0.03, Period.YEARLY)),
+     Monthly("Payment", 1200.0, "Mortgage", "Checkings", dayOfMonth=15),
+     Monthly("Saving", 300.0, "Savings", "Checkings", dayOfMonth=28),
+     Yearly("Bonus", 5000.0, "Savings", month=12, dayOfMonth=20),
+     Once("Car", 15000.0, None, "Savings", date=datetime(2023, 6, 1))],
+)
+
+
+def paid_off(plan: Plan) -> Plan:
+    return Plan([a for a in plan.accounts if a.name != "Mortgage"],
+                [t for t in plan.transfers if t.name != "Payment"] + [Monthly("Saving more", 1200.0, "Savings", "Checkings", dayOfMonth=15)])
+
+
+def rich(plan: Plan) -> Plan:
+    return Plan(list(plan.accounts), [t for t in plan.transfers if t.name != "Salary"])
+
+
+MORTGAGE_BRIDGES = [
+    ThresholdBridge("Paid off", paid_off, "Mortgage", 0.0),
+    CallbackBridge("Rich", rich, lambda data: data.get("Savings", 0.0) > 150000.0),
+]
+
+CASES = {
+    "example": (Starting_Plan, Bridges, datetime(2020, 10, 2), datetime(2070, 10, 2)),
+    "threshold": (MORTGAGE_PLAN, MORTGAGE_BRIDGES, START, datetime(2040, 1, 1)),
+    "timestamps": (MORTGAGE_PLAN, MORTGAGE_BRIDGES, datetime(2020, 1, 1, 13, 5), datetime(2035, 3, 1, 5, 30)),
+    "one day": (Starting_Plan, Bridges, datetime(2020, 10, 2), datetime(2020, 10, 2)),
+    "one day with timestamps": (MORTGAGE_PLAN, MORTGAGE_BRIDGES, datetime(2021, 3, 1, 9), datetime(2021, 3, 1, 9)),
+}
+
+
+@pytest.mark.parametrize("case", list(CASES))
+@pytest.mark.parametrize("engine", ENGINES[1:])
+def test_engines_agree(case, engine, capsys):
+    plan, bridges, from_date, to_date = CASES[case]
+    expected = simulate(plan, bridges, from_date, to_date, engine="loop")
+    result = simulate(plan, bridges, from_date, to_date, engine=engine)
+    assert result.accounts == expected.accounts
+    assert np.array_equal(result.dates, expected.dates)
+    np.testing.assert_allclose(result.values, expected.values, rtol=1e-9, atol=1e-6)
+    assert result.bridges == expected.bridges
+
+
+@pytest.mark.parametrize("case", list(CASES))
+@pytest.mark.parametrize("engine", ENGINES[1:])
+def test_plot_accounts_agree(case, engine, capsys):
+    plan, bridges, from_date, to_date = CASES[case]
+    expected = plot_accounts(plan, bridges, from_date, to_date, tall_data=False, engine="loop")
+    rows = plot_accounts(plan, bridges, from_date, to_date, tall_data=False, engine=engine)
+    assert [row["Date"] for row in rows] == [row["Date"] for row in expected]
+    for row, want in zip(rows, expected):
+        assert row.keys() == want.keys()
+        for account in want.keys() - {"Date"}:
+            assert row[account] == pytest.approx(want[account], rel=1e-9, abs=1e-6)
+
+
+def test_the_bridges_activate(capsys):
+    plan, bridges, from_date, to_date = CASES["threshold"]
+    result = simulate(plan, bridges, from_date, to_date)
+    assert [name for name, _ in result.bridges] == ["Paid off", "Rich"]
+    assert "Mortgage" in result.accounts
@@ -0,0 +1,12 @@
+from benchmarks.imports import FORBIDDEN, import_time, main
+
+
+def test_import_does_not_load_pandas_or_plotting():
+    _, modules = import_time("lifechoices", repeat=1)
+    assert "pandas" not in modules
+    assert not [name for name in FORBIDDEN if name in modules]
+
+
+def test_import_within_budget(capsys):
+    # Also fails if it imports any of FORBIDDEN
+    assert main(["--repeat", "3"]) == 0, capsys.readouterr().out
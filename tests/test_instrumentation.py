@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from lifechoices import APR, Account, CallbackBridge, DateBridge, Monthly, Period, Plan, ThresholdBridge, simulate
+from lifechoices.instrumentation import PHASES, Instrumentation, active_instrumentation, instrument
+
+START, END = datetime(2020, 1, 1), datetime(2035, 1, 1)
+PLAN = Plan(
+    [Account("Savings", 1000.0, APR(0.05, Period.YEARLY), START), Account("Loan", -5000.0, APR(0.04, Period.YEARLY), START)],
+    [Monthly("Salary", 500.0, "Savings"), Monthly("Payment", 200.0, "Loan", "Savings")],
+)
+
+
+def paid_off(plan: Plan) -> Plan:
+    return Plan([a for a in plan.accounts if a.name != "Loan"], [t for t in plan.transfers if t.name != "Payment"])
+
+
+def bonus(plan: Plan) -> Plan:
+    return Plan(list(plan.accounts), list(plan.transfers) + [Monthly("Bonus", 100.0, "Savings")])
+
+
+BRIDGES = [
+    ThresholdBridge("Paid off", paid_off, "Loan", 0.0),
+    CallbackBridge("Rich", bonus, lambda data: data["Savings"] > 50000.0),
+    DateBridge("Later", bonus, datetime(2030, 1, 1)),
+]
+
+
+@pytest.mark.parametrize("engine", ["loop", "vectorized", "events"])
+def test_instrumented_runs_give_the_same_balances(engine, capsys):
+    plain = simulate(PLAN, BRIDGES, START, END, engine=engine)
+    assert plain.instrumentation is None
+    with instrument() as stats:
+        measured = simulate(PLAN, BRIDGES, START, END, engine=engine)
+    np.testing.assert_array_equal(measured.values, plain.values)
+    np.testing.assert_array_equal(measured.dates, plain.dates)
+    assert measured.bridges == plain.bridges
+    assert measured.instrumentation == stats.to_dict()
+    assert set(PHASES) <= set(stats.seconds) and stats.total_seconds > 0
+    assert stats.transfers_applied > 0
+    assert stats.bridge_calls["Rich"] > 0
+    assert stats.to_dict()["bridge_calls"] == stats.bridge_calls
+    assert "transfers applied" in stats.report()
+
+
+def test_only_active_inside_the_block(capsys):
+    assert active_instrumentation() is None
+    mine = Instrumentation()
+    with instrument(mine) as stats:
+        assert stats is mine and active_instrumentation() is mine
+        with instrument() as inner:
+            assert active_instrumentation() is inner
+        assert active_instrumentation() is mine
+    assert active_instrumentation() is None
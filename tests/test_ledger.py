@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from lifechoices import APR, Account, DateBridge, Ledger, Monthly, Once, Period, Plan, ThresholdBridge, Weekly, simulate
+from lifechoices.serialize import Actions, AddTransfers, ChangeAPR, RemoveTransfers
+
+START, END = datetime(2020, 1, 1), datetime(2040, 1, 1)
+STARTING_PLAN = Plan(
+    [Account("Checkings", 5000.0, APR(0.01, Period.YEARLY), START),
+     Account("Savings", 20000.0, APR(0.05, Period.YEARLY), START),
+     Account("Loan", -30000.0, APR(0.04, Period.YEARLY), START)],
+    [Monthly("Salary", 3000.0, "Checkings"),
+     Weekly("Groceries", 150.0, None, "Checkings", dayOfWeek=5, APR=APR(0.03, Period.YEARLY)),
+     Monthly("Payment", 800.0, "Loan", "Checkings", dayOfMonth=15),
+     Monthly("Saving", 1000.0, "Savings", "Checkings", dayOfMonth=28),
+     Once("Car", 15000.0, None, "Savings", date=datetime(2023, 6, 1))],
+)
+# Bridges that only change transfers and rates, so every dollar that moves is in the ledger
+BRIDGES = [
+    ThresholdBridge("Paid off", Actions((RemoveTransfers(("Payment",)),
+                                         AddTransfers((Monthly("Saving more", 800.0, "Savings", "Checkings", dayOfMonth=15),)))),
+                    "Loan", 0.0),
+    DateBridge("Retirement", Actions((RemoveTransfers(("Salary",)), ChangeAPR("Savings", APR(0.03, Period.YEARLY)))),
+               datetime(2035, 1, 1)),
+]
+
+
+@pytest.mark.parametrize("bridges", [[], BRIDGES])
+def test_balances_are_what_the_ledger_says(bridges, capsys):
+    ledger = Ledger()
+    result = simulate(STARTING_PLAN, bridges, START, END, engine="loop", ledger=ledger)
+    assert [name for name, _ in result.bridges] == [b.name for b in bridges]
+    flows = ledger.net_flows()
+    interest = ledger.cumulative_interest()
+    for account in STARTING_PLAN.accounts:
+        column = result.accounts.index(account.name)
+        earned = interest.values[-1, interest.accounts.index(account.name)]
+        assert account.amount + flows[account.name] + earned == pytest.approx(result.values[-1, column], rel=1e-9)
+    # The ledger does not change the simulation
+    np.testing.assert_array_equal(result.values, simulate(STARTING_PLAN, bridges, START, END, engine="loop").values)
+
+
+def test_totals_by_year_add_up(capsys):
+    ledger = Ledger()
+    simulate(STARTING_PLAN, BRIDGES, START, END, engine="loop", ledger=ledger)
+    totals = ledger.transfer_totals_by_year()
+    assert totals.values.sum() == pytest.approx(ledger.amounts.sum())
+    salary = totals.values[:, totals.accounts.index("Salary")]
+    # Paid every month until retiring, but not on the first day, which the simulation starts after
+    assert salary[0] == pytest.approx(11 * 3000.0) and salary[1] == pytest.approx(12 * 3000.0) and salary[-1] == 0.0
+    assert ledger.to_pandas()["Amount"].sum() == pytest.approx(ledger.amounts.sum())
+
+
+@pytest.mark.parametrize("engine", ["vectorized", "events"])
+def test_only_the_loop_engine_fills_a_ledger(engine):
+    with pytest.raises(ValueError, match="loop"):
+        simulate(STARTING_PLAN, BRIDGES, START, END, engine=engine, ledger=Ledger())
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import lifechoices.montecarlo
+from lifechoices import (
+    APR, Account, CallbackBridge, DateBridge, Monthly, Normal, Period, Plan, ThresholdBridge, Uniform, monte_carlo,
+    simulate,
+)
+
+START, RETIRE, END = datetime(2020, 1, 1), datetime(2045, 1, 1), datetime(2060, 1, 1)
+
+
+def starting_plan():
+    # Big enough balances that float32 would lose the cents
+    return Plan(
+        [Account("Savings", 500000.0, APR(0.06, Period.YEARLY), START),
+         Account("Checkings", 10000.0, APR(0.01, Period.YEARLY), START)],
+        [Monthly("Salary", 4000.0, "Savings"), Monthly("Spending", 1500.0, None, "Checkings")],
+    )
+
+
+def retire(plan: Plan) -> Plan:
+    savings, checkings = plan.accounts
+    return Plan([savings, checkings], [Monthly("Drawdown", 3000.0, "Checkings", "Savings"), Monthly("Spending", 2500.0, None, "Checkings")])
+
+
+BRIDGES = [DateBridge("Retire", retire, RETIRE)]
+RANDOM = dict(apr={"Savings": Normal(0.07, 0.1), "Checkings": Uniform(0.0, 0.02)}, inflation=Uniform(0.02, 0.04))
+
+
+@pytest.mark.parametrize("resolution", ["daily", "month-end"])
+def test_fixed_rates_match_simulate(resolution, capsys):
+    # Every path draws the APRs of the plan, so every band is the simulation
+    result = monte_carlo(starting_plan(), BRIDGES, START, END, n_paths=3, apr={"Savings": 0.06, "Checkings": 0.01},
+                         percentiles=(5, 50), resolution=resolution, max_workers=1)
+    expected = simulate(starting_plan(), BRIDGES, START, END, resolution=resolution)
+    assert result.accounts == expected.accounts
+    np.testing.assert_array_equal(result.dates, expected.dates)
+    before = result.dates < np.datetime64(RETIRE, "us")
+    for p in (5, 50):
+        np.testing.assert_allclose(result.percentile(p).values[before], expected.values[before], rtol=1e-12)
+        np.testing.assert_allclose(result.percentile(p).values, expected.values, rtol=1e-9)
+
+
+def test_the_same_seed_gives_the_same_bands(monkeypatch, capsys):
+    kwargs = dict(n_paths=60, seed=7, resolution="weekly", **RANDOM)
+    one = monte_carlo(starting_plan(), BRIDGES, START, END, max_workers=1, **kwargs)
+    pooled = monte_carlo(starting_plan(), BRIDGES, START, END, max_workers=2, chunk_size=7, **kwargs)
+    assert np.array_equal(one.bands, pooled.bands, equal_nan=True)
+    # Taking the dates a few at a time gives the same percentiles as all at once
+    monkeypatch.setattr(lifechoices.montecarlo, "_BLOCK_BYTES", 8 * 60 * 2 * 5)
+    blocked = monte_carlo(starting_plan(), BRIDGES, START, END, max_workers=1, chunk_size=11, **kwargs)
+    np.testing.assert_allclose(blocked.bands, one.bands, rtol=1e-12)
+    other = monte_carlo(starting_plan(), BRIDGES, START, END, max_workers=1, **{**kwargs, "seed": 8})
+    assert not np.allclose(other.bands, one.bands, equal_nan=True)
+
+
+@pytest.mark.parametrize("bridge", [
+    CallbackBridge("Rich", retire, lambda data: data["Savings"] > 1e6),
+    ThresholdBridge("Rich", retire, "Savings", 1e6),
+])
+def test_conditional_bridges_are_refused(bridge):
+    with pytest.raises(ValueError):
+        monte_carlo(starting_plan(), [bridge], START, END, n_paths=2, max_workers=1)
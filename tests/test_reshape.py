@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lifechoices import APR, Account, DateBridge, Monthly, Period, Plan, plot_accounts, tall_to_wide, wide_to_tall
+
+START, END = datetime(2020, 1, 1), datetime(2023, 1, 1)
+
+
+def open_checkings(plan: Plan) -> Plan:
+    return Plan(list(plan.accounts) + [Account("Checkings", 500.0, APR(0.01, Period.YEARLY), START)], list(plan.transfers))
+
+
+PLAN = Plan([Account("Savings", 1000.0, APR(0.05, Period.YEARLY), START)], [Monthly("Salary", 100.0, "Savings")])
+BRIDGES = [DateBridge("Open", open_checkings, datetime(2021, 6, 1))]
+
+
+@pytest.fixture
+def wide(capsys):
+    # Checkings is missing from the rows before the bridge
+    return plot_accounts(PLAN, BRIDGES, START, END, tall_data=False)
+
+
+def test_rows_round_trip(wide, capsys):
+    tall = wide_to_tall(wide)
+    assert tall_to_wide(tall) == wide
+    # Which is what plot_accounts gives with and without tall_data, NaN for accounts that do not exist yet
+    expected = plot_accounts(PLAN, BRIDGES, START, END, tall_data=True)
+    assert tall["Account"] == expected["Account"] and tall["Date"] == expected["Date"]
+    np.testing.assert_array_equal(tall["Value"], expected["Value"])
+
+
+def test_frames_round_trip(wide):
+    frame = pd.DataFrame(wide)[["Date", "Savings", "Checkings"]]
+    tall = wide_to_tall(frame)
+    assert list(tall.columns) == ["Account", "Date", "Value"] and len(tall) == 2 * len(frame)
+    back = tall_to_wide(tall)
+    pd.testing.assert_frame_equal(back[["Date", "Savings", "Checkings"]], frame, check_dtype=False)
+    # Dates as the index work the same
+    pd.testing.assert_frame_equal(wide_to_tall(frame.set_index("Date")), tall)
+    # Rows out of order go through a pivot, and still come back in the order they first appear
+    shuffled = tall.iloc[np.random.default_rng(0).permutation(len(tall))]
+    by_date = tall_to_wide(shuffled).set_index("Date").loc[frame["Date"], ["Savings", "Checkings"]]
+    np.testing.assert_array_equal(by_date.to_numpy(), frame[["Savings", "Checkings"]].to_numpy())
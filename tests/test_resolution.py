@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from lifechoices import APR, Account, DateBridge, Monthly, Period, Plan, iter_accounts, plot_accounts
+from lifechoices.resolution import Resolution
+
+START = datetime(2019, 12, 20)
+N = 3 * 365 + 30
+
+
+def days(first_day=START, n=N):
+    return [first_day + timedelta(days=k) for k in range(n)]
+
+
+@pytest.mark.parametrize("name, recorded", [
+    ("daily", lambda day: True),
+    ("weekly", lambda day: (day - START).days % 7 == 0),
+    ("month-end", lambda day: (day + timedelta(days=1)).month != day.month),
+    ("year-end", lambda day: (day.month, day.day) == (12, 31)),
+])
+def test_masks(name, recorded):
+    resolution = Resolution(name, START)
+    # Starting the mask later still counts weeks from the first day of the simulation
+    for first_day in (START, START + timedelta(days=3)):
+        expected = [recorded(day) for day in days(first_day)]
+        assert resolution.mask(first_day, N).tolist() == expected
+        assert [day in resolution for day in days(first_day)] == expected
+        assert resolution.dates(first_day, N) == [day for day, kept in zip(days(first_day), expected) if kept]
+
+
+def test_dates_and_unknown_names():
+    resolution = Resolution([datetime(2020, 2, 29, 13), datetime(2021, 1, 1), datetime(2021, 1, 1, 5)], START)
+    assert resolution.dates(START, N) == [datetime(2020, 2, 29), datetime(2021, 1, 1)]
+    with pytest.raises(ValueError):
+        Resolution("hourly", START)
+
+
+def retire(plan: Plan) -> Plan:
+    return Plan(list(plan.accounts), [])
+
+
+PLAN = Plan([Account("Savings", 1000.0, APR(0.05, Period.YEARLY), START)], [Monthly("Salary", 100.0, "Savings")])
+BRIDGES = [DateBridge("Retire", retire, datetime(2021, 6, 1))]
+
+
+@pytest.mark.parametrize("engine", ["loop", "vectorized", "events"])
+@pytest.mark.parametrize("resolution", ["weekly", "month-end", "year-end"])
+def test_iter_accounts_keeps_the_recorded_days(engine, resolution, capsys):
+    end = START + timedelta(days=N)
+    daily = {row["Date"]: row for row in plot_accounts(PLAN, BRIDGES, START, end, tall_data=False, engine="loop")}
+    rows = list(iter_accounts(PLAN, BRIDGES, START, end, engine=engine, resolution=resolution))
+    assert [row["Date"] for row in rows] == [day for day in daily if day in Resolution(resolution, START)]
+    for row in rows:
+        assert row["Savings"] == pytest.approx(daily[row["Date"]]["Savings"], rel=1e-9)
+
+
+def test_iter_accounts_tall_and_lazy(capsys):
+    rows = iter_accounts(PLAN, BRIDGES, START, START + timedelta(days=N), tall_data=True, resolution="month-end")
+    first = next(rows)
+    assert set(first) == {"Account", "Date", "Value"} and first["Date"] == datetime(2019, 12, 31)
+    with pytest.raises(ValueError):
+        iter_accounts(PLAN, BRIDGES, START, START + timedelta(days=N), engine="fast")
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from lifechoices import APR, Account, DateBridge, Monthly, Period, Plan, plot_accounts, simulate
+
+START, END = datetime(2020, 1, 1), datetime(2026, 1, 1)
+
+
+def open_checkings(plan: Plan) -> Plan:
+    return Plan(list(plan.accounts) + [Account("Checkings", 500.0, APR(0.01, Period.YEARLY), START)], list(plan.transfers))
+
+
+PLAN = Plan([Account("Savings", 1000.0, APR(0.05, Period.YEARLY), START)], [Monthly("Salary", 100.0, "Savings")])
+BRIDGES = [DateBridge("Open", open_checkings, datetime(2022, 1, 1))]
+
+
+def test_to_pandas_is_a_view(capsys):
+    result = simulate(PLAN, BRIDGES, START, END)
+    wide = result.to_pandas()
+    tall = result.to_pandas(tall=True)
+    assert np.shares_memory(wide.to_numpy(), result.values)
+    assert np.shares_memory(tall["Value"].to_numpy(), result.values)
+    assert list(wide.columns) == list(result.accounts) and wide.index.name == "Date"
+    np.testing.assert_array_equal(wide.to_numpy(), result.values)
+    np.testing.assert_array_equal(tall["Value"].to_numpy(), result.values.reshape(-1))
+    assert isinstance(tall["Account"].dtype, pd.CategoricalDtype)
+    assert result.to_numpy() is result.values
+
+
+def test_rows_and_columns_are_what_plot_accounts_returns(capsys):
+    result = simulate(PLAN, BRIDGES, START, END, engine="loop")
+    # Checkings does not exist before the bridge, so it is NaN there and missing from the rows
+    assert np.isnan(result["Checkings"][0])
+    assert result.to_rows() == plot_accounts(PLAN, BRIDGES, START, END, tall_data=False)
+    assert result.bridges == (("Open", datetime(2022, 1, 1)),)
+    # Cut before the bridge, it is what simulating up to then gives, without the account the bridge opens
+    shorter = result.until(datetime(2021, 12, 31))
+    fresh = simulate(PLAN, BRIDGES, START, datetime(2021, 12, 31), engine="loop")
+    assert shorter.accounts == fresh.accounts == ("Savings",)
+    np.testing.assert_array_equal(shorter.dates, fresh.dates)
+    np.testing.assert_array_equal(shorter.values, fresh.values)
@@ -0,0 +1,71 @@
+from dataclasses import replace
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from lifechoices import (
+    APR, Account, CallbackBridge, DateBridge, Monthly, Period, Plan, ThresholdBridge, Weekly, run_scenarios, simulate,
+)
+
+START, END = datetime(2020, 1, 1, 9), datetime(2040, 1, 1)
+
+
+def starting_plan(spending=150.0, rate=0.05):
+    return Plan(
+        [Account("Checkings", 5000.0, APR(0.01, Period.YEARLY), START),
+         Account("Savings", 20000.0, APR(rate, Period.YEARLY), START),
+         Account("Loan", -30000.0, APR(0.04, Period.YEARLY), START)],
+        [Monthly("Salary", 3000.0, "Checkings"),
+         Weekly("Groceries", spending, None, "Checkings", dayOfWeek=5, APR=APR(0.03, Period.YEARLY)),
+         Monthly("Payment", 800.0, "Loan", "Checkings", dayOfMonth=15),
+         Monthly("Saving", 1000.0, "Savings", "Checkings", dayOfMonth=28)],
+    )
+
+
+def paid_off(plan: Plan) -> Plan:
+    return Plan([a for a in plan.accounts if a.name != "Loan"], [t for t in plan.transfers if t.name != "Payment"])
+
+
+def retire(plan: Plan) -> Plan:
+    checkings, savings = plan.accounts[:2]
+    return Plan([replace(checkings, amount=checkings.amount + savings.amount), replace(savings, amount=0.0)],
+                [t for t in plan.transfers if t.name not in ("Salary", "Saving")])
+
+
+def rich(plan: Plan) -> Plan:
+    return Plan(list(plan.accounts) + [Account("Brokerage", 0.0, APR(0.07, Period.YEARLY), START)], list(plan.transfers))
+
+
+BRIDGES = [ThresholdBridge("Paid off", paid_off, "Loan", 0.0), DateBridge("Retire", retire, datetime(2035, 1, 1))]
+SCENARIOS = {
+    "base": (starting_plan(), BRIDGES),
+    "frugal": (starting_plan(spending=80.0), BRIDGES),
+    "no bridges": (starting_plan(rate=0.08), []),
+    "callback": (starting_plan(), BRIDGES + [CallbackBridge("Rich", rich, lambda data: data.get("Savings", 0.0) > 150000.0)]),
+}
+
+
+@pytest.mark.parametrize("resolution", ["daily", "month-end"])
+def test_every_scenario_is_its_simulation(resolution, capsys):
+    results = run_scenarios(SCENARIOS, START, END, resolution)
+    assert results.scenarios == tuple(SCENARIOS)
+    for name, (plan, bridges) in SCENARIOS.items():
+        expected = simulate(plan, bridges, START, END, resolution=resolution)
+        result = results[name]
+        np.testing.assert_array_equal(result.dates, expected.dates)
+        for account in results.accounts:
+            if account in expected.accounts:
+                np.testing.assert_allclose(result[account], expected[account], rtol=1e-9, atol=1e-6)
+            else:
+                assert np.isnan(result[account]).all()
+    assert set(results.accounts) == {"Checkings", "Savings", "Loan", "Brokerage"}
+
+
+def test_a_list_of_scenarios_and_shared_schedules(capsys):
+    schedules = {}
+    first = run_scenarios(list(SCENARIOS.values())[:2], START, END, schedules=schedules)
+    again = run_scenarios(list(SCENARIOS.values())[:2], START, END, schedules=schedules)
+    assert first.scenarios == ("0", "1")
+    assert schedules
+    np.testing.assert_array_equal(first.values, again.values)
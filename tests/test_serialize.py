@@ -0,0 +1,112 @@
+import json
+import pickle
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from lifechoices import (
+    APR, Account, BiWeekly, CallbackBridge, DateBridge, Monthly, NYearly, Once, Period, Plan, ThresholdBridge, Yearly,
+    simulate,
+)
+from lifechoices.serialize import (
+    Actions, AddTransfers, ChangeAPR, MoveBalance, RemoveTransfers, ReplaceAccounts, plan_from_bytes, plan_from_dict,
+    plan_from_json, plan_hash, plan_to_bytes, plan_to_dict, plan_to_json, read_plan, save_plan,
+)
+
+START = datetime(2020, 10, 2)
+STARTING_PLAN = Plan(
+    [Account("Savings", 1000.0, APR(0.05, Period.YEARLY), START),
+     Account("Loan", -20000, APR(0.04, Period.MONTHLY), START)],
+    [Monthly("Salary", 1000, "Savings"),
+     Monthly("Payment", 500.0, "Loan", "Savings", dayOfMonth=15, APR=APR(0.02, Period.YEARLY)),
+     BiWeekly("Coffee", 20.0, None, "Savings", dayOfWeek=4),
+     Yearly("Bonus", 3000.0, "Savings", month=12, dayOfMonth=20),
+     NYearly("Car", 15000.0, None, "Savings", nyears=7, month=6, dayOfMonth=1, firstYear=2021),
+     Once("Gift", 5000.0, "Savings", date=datetime(2022, 3, 4))],
+)
+BRIDGES = [
+    ThresholdBridge("Paid off", Actions((RemoveTransfers(("Payment",)),
+                                         AddTransfers((Monthly("Investing", 500.0, "Brokerage", "Savings", dayOfMonth=15),)),
+                                         ReplaceAccounts((Account("Savings", 0.0, APR(0.05, Period.YEARLY), START),
+                                                          Account("Brokerage", 0.0, APR(0.07, Period.YEARLY), START))))),
+                    "Loan", 0.0),
+    DateBridge("Retirement", Actions((MoveBalance("Brokerage", "Savings"), ChangeAPR("Savings", APR(0.03, Period.YEARLY)))),
+               datetime(2045, 1, 1)),
+]
+
+
+def assert_simulates_the_same(plan, bridges):
+    expected = simulate(STARTING_PLAN, BRIDGES, START, datetime(2050, 1, 1))
+    result = simulate(plan, bridges, START, datetime(2050, 1, 1))
+    assert result.accounts == expected.accounts
+    np.testing.assert_array_equal(result.dates, expected.dates)
+    np.testing.assert_array_equal(result.values, expected.values)
+    assert result.bridges == expected.bridges
+
+
+@pytest.mark.parametrize("dump, load", [(plan_to_json, plan_from_json), (plan_to_bytes, plan_from_bytes)])
+def test_round_trip_simulates_the_same(dump, load, capsys):
+    plan, bridges = load(dump(STARTING_PLAN, BRIDGES))
+    assert plan == STARTING_PLAN
+    assert bridges == BRIDGES
+    assert_simulates_the_same(plan, bridges)
+
+
+@pytest.mark.parametrize("name", ["plan.json", "plan.lcplan"])
+def test_save_and_read(tmp_path, name, capsys):
+    save_plan(str(tmp_path / name), STARTING_PLAN, BRIDGES)
+    assert_simulates_the_same(*read_plan(str(tmp_path / name)))
+
+
+def test_hash_is_stable_across_round_trips():
+    h = plan_hash(STARTING_PLAN, BRIDGES)
+    assert plan_hash(*plan_from_json(plan_to_json(STARTING_PLAN, BRIDGES))) == h
+    assert plan_hash(*plan_from_bytes(plan_to_bytes(STARTING_PLAN, BRIDGES))) == h
+    # Ints and floats are written the same
+    assert plan_hash(Plan(STARTING_PLAN.accounts, [Monthly("Salary", 1000.0, "Savings")])) == \
+        plan_hash(Plan(STARTING_PLAN.accounts, [Monthly("Salary", 1000, "Savings")]))
+    assert plan_hash(STARTING_PLAN, BRIDGES[:1]) != h
+
+
+def python_bridge(plan):
+    return plan
+
+
+@pytest.mark.parametrize("bridge", [
+    CallbackBridge("Rich", python_bridge, lambda data: True),
+    DateBridge("Retirement", python_bridge, datetime(2045, 1, 1)),
+    DateBridge("Retirement", Actions((python_bridge,)), datetime(2045, 1, 1)),
+])
+def test_python_is_refused(bridge):
+    with pytest.raises(ValueError):
+        plan_to_json(STARTING_PLAN, [bridge])
+    with pytest.raises(ValueError):
+        plan_hash(STARTING_PLAN, [bridge])
+
+
+def test_unknown_types_and_versions_are_refused():
+    data = plan_to_dict(STARTING_PLAN, BRIDGES)
+    with pytest.raises(ValueError, match="version"):
+        plan_from_dict({**data, "version": 99})
+    with pytest.raises(ValueError, match="version"):
+        plan_from_dict({k: v for k, v in data.items() if k != "version"})
+    changed = json.loads(json.dumps(data))
+    changed["plan"]["transfers"][0]["type"] = "os.system"
+    with pytest.raises(ValueError, match="Unknown type"):
+        plan_from_dict(changed)
+    with pytest.raises(ValueError):
+        plan_from_bytes(b"not a plan")
+
+
+class Evil:
+    def __reduce__(self):
+        return (print, ("ran code from a plan file",))
+
+
+@pytest.mark.parametrize("payload", [Evil(), datetime(2020, 1, 1), {"version": 1, "plan": Plan([], [])}])
+def test_bytes_never_load_classes_or_globals(payload, capsys):
+    data = b"LCPLAN" + pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    with pytest.raises(ValueError, match="should not reference"):
+        plan_from_bytes(data)
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,128 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from lifechoices import APR, Account, CompiledPlan, Monthly, Period, Plan
+from lifechoices.service import ServiceThread, SimulationService
+
+START = datetime(2020, 1, 1)
+COMPILED = CompiledPlan.compile(
+    Plan([Account("Savings", 1000.0, APR(0.05, Period.YEARLY), START)], [Monthly("Salary", 100.0, "Savings")]),
+    [],
+)
+
+
+def blocked(executor):
+    """ Keeps the only thread of executor busy until the event returned is set, so what is submitted after waits. """
+    release = threading.Event()
+    executor.submit(release.wait)
+    return release
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_matching_calls_share_one_simulation():
+    async def main():
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        release = blocked(executor)
+        async with SimulationService(executor=executor) as service:
+            calls = [asyncio.ensure_future(service.simulate(COMPILED, START, datetime(2030, 1, 1))) for _ in range(3)]
+            await asyncio.sleep(0)
+            release.set()
+            results = await asyncio.gather(*calls)
+        executor.shutdown()
+        return service.stats, results
+
+    stats, results = run(main())
+    assert stats.calls == 3 and stats.coalesced == 2 and stats.simulated == 1
+    assert results[0] is results[1] is results[2]
+
+
+def test_a_newer_call_of_a_session_cancels_the_older():
+    async def main():
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        release = blocked(executor)
+        async with SimulationService(executor=executor) as service:
+            old = asyncio.ensure_future(service.simulate(COMPILED, START, datetime(2030, 1, 1), session="tab"))
+            await asyncio.sleep(0)
+            new = asyncio.ensure_future(service.simulate(COMPILED, datetime(2021, 1, 1), datetime(2030, 1, 1), session="tab"))
+            await asyncio.sleep(0)
+            release.set()
+            with pytest.raises(asyncio.CancelledError):
+                await old
+            result = await new
+        executor.shutdown()
+        return service.stats, result
+
+    stats, result = run(main())
+    assert stats.superseded == 1
+    assert result.dates[0] == np.datetime64(datetime(2021, 1, 1), "us")
+
+
+def test_queued_runs_nobody_waits_for_are_dropped():
+    async def main():
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        release = blocked(executor)
+        async with SimulationService(executor=executor) as service:
+            calls = []
+            for year in range(2020, 2025):
+                calls.append(asyncio.ensure_future(service.simulate(COMPILED, datetime(year, 1, 1), datetime(2030, 1, 1), session="tab")))
+                await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            # The runs of the superseded calls never started, and are dropped as soon as their callers are cancelled
+            dropped = service.stats.dropped
+            release.set()
+            results = await asyncio.gather(*calls, return_exceptions=True)
+        executor.shutdown(wait=True)
+        return service.stats, dropped, results
+
+    stats, dropped, results = run(main())
+    assert dropped == 4 and stats.dropped == 4
+    assert stats.superseded == 4 and stats.simulated == 1
+    assert all(isinstance(r, asyncio.CancelledError) for r in results[:-1])
+    assert not isinstance(results[-1], BaseException)
+
+
+def test_progressive_yields_the_coarse_result_first():
+    async def main():
+        async with SimulationService(coarse_resolution="month-end") as service:
+            return [result async for result in service.progressive(COMPILED, START, datetime(2025, 1, 1))]
+
+    coarse, full = run(main())
+    assert len(coarse.dates) == 60
+    assert len(full.dates) == (datetime(2025, 1, 1) - START).days + 1
+    # The month ends are rows of the daily result
+    np.testing.assert_array_equal(coarse.values, full.values[np.isin(full.dates, coarse.dates)])
+
+
+def test_service_thread_raises_cancelled_error_across_threads():
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    release = blocked(executor)
+    service = ServiceThread(executor=executor)
+    outcomes = [{}, {}]
+
+    def call(outcome, from_date):
+        try:
+            outcome["result"] = service.simulate(COMPILED, from_date, datetime(2030, 1, 1), session="tab")
+        except BaseException as e:
+            outcome["error"] = e
+
+    threads = [threading.Thread(target=call, args=(outcome, datetime(year, 1, 1))) for outcome, year in zip(outcomes, (2020, 2021))]
+    for k, thread in enumerate(threads, 1):
+        thread.start()
+        while service.service.stats.calls < k:
+            time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    service.close()
+    executor.shutdown()
+    assert isinstance(outcomes[0].get("error"), concurrent.futures.CancelledError)
+    assert outcomes[1]["result"].dates[0] == np.datetime64(datetime(2021, 1, 1), "us")
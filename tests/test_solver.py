@@ -0,0 +1,64 @@
+from dataclasses import replace
+from datetime import datetime
+
+import pytest
+
+from lifechoices import APR, Account, DateBridge, Monthly, Period, Plan, simulate
+from lifechoices.solver import BalanceConstraint, TransferAmount, solve
+
+FROM_DATE, TO_DATE = datetime(2020, 1, 1), datetime(2045, 1, 1)
+
+
+def retire(plan):
+    checkings, savings = plan.accounts
+    return Plan([replace(checkings, amount=checkings.amount + savings.amount), replace(savings, amount=0.0)],
+                [t for t in plan.transfers if t.name != "Salary"])
+
+
+def downsize_to(plan, rent):
+    return Plan(list(plan.accounts), [t for t in plan.transfers if t.name != "Rent"] + [Monthly("Rent", rent, None, "Checkings")])
+
+
+def downsize(plan):
+    return downsize_to(plan, 300.0)
+
+
+def starting_plan(spending=500.0, rent=1000.0):
+    return Plan(
+        [Account("Checkings", 20000.0, APR(0.02, Period.YEARLY), FROM_DATE),
+         Account("Savings", 50000.0, APR(0.05, Period.YEARLY), FROM_DATE)],
+        # Spending grows with inflation, and retiring carries it over as it has grown
+        [Monthly("Salary", 3000.0, "Checkings"),
+         Monthly("Spending", spending, None, "Checkings", APR=APR(0.03, Period.YEARLY)),
+         Monthly("Rent", rent, None, "Checkings")],
+    )
+
+
+BRIDGES = [DateBridge("Retire", retire, datetime(2035, 1, 1)), DateBridge("Downsize", downsize, datetime(2030, 1, 1))]
+CHECKINGS = BalanceConstraint("Checkings", minimum=0.0)
+
+
+def margin(plan):
+    result = simulate(plan, BRIDGES, FROM_DATE, TO_DATE)
+    return CHECKINGS.margin(result.accounts, result.dates, result.values)
+
+
+def test_solved_spending_holds_for_the_original_bridges(capsys):
+    spending = TransferAmount("Spending", lo=0.0, hi=5000.0)
+    result = solve(starting_plan(), BRIDGES, [spending], [CHECKINGS], FROM_DATE, TO_DATE)
+    assert result.feasible
+    found = result.values["Spending"]
+    assert margin(starting_plan(spending=found)) == pytest.approx(result.margin, abs=1e-6)
+    assert result.margin >= 0
+    assert margin(starting_plan(spending=found + 2 * spending.tolerance)) < 0
+
+
+def test_transfers_a_bridge_brings_in_get_the_amount(capsys):
+    # Downsizing brings in a Rent of its own, which the variable sets as well
+    rent = TransferAmount("Rent", lo=0.0, hi=5000.0)
+    result = solve(starting_plan(), BRIDGES, [rent], [CHECKINGS], FROM_DATE, TO_DATE)
+    assert result.feasible
+    found = result.values["Rent"]
+    bridges = [BRIDGES[0], DateBridge("Downsize", lambda plan: downsize_to(plan, found), datetime(2030, 1, 1))]
+    checked = simulate(starting_plan(rent=found), bridges, FROM_DATE, TO_DATE)
+    assert CHECKINGS.margin(checked.accounts, checked.dates, checked.values) == pytest.approx(result.margin, abs=1e-6)
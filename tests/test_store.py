@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from lifechoices import APR, Account, CompiledPlan, DateBridge, Monthly, Period, Plan, simulate
+from lifechoices.serialize import Actions, ChangeAPR, RemoveTransfers
+from lifechoices.store import SharedResultStore
+
+START, END = datetime(2020, 1, 1), datetime(2030, 1, 1)
+
+
+def plan(salary=100.0):
+    return Plan([Account("Savings", 1000.0, APR(0.05, Period.YEARLY), START)], [Monthly("Salary", salary, "Savings")])
+
+
+# Only data, so it is keyed by its content
+BRIDGES = [DateBridge("Retire", Actions((RemoveTransfers(("Salary",)), ChangeAPR("Savings", APR(0.02, Period.YEARLY)))), datetime(2025, 1, 1))]
+
+
+def retire(p: Plan) -> Plan:
+    return Plan(list(p.accounts), [])
+
+
+def assert_same(result, expected):
+    assert result.accounts == expected.accounts
+    np.testing.assert_array_equal(result.dates, expected.dates)
+    np.testing.assert_array_equal(result.values, expected.values)
+
+
+def test_a_store_on_the_same_directory_finds_the_result(tmp_path, capsys):
+    compiled = CompiledPlan.compile(plan(), BRIDGES)
+    first = SharedResultStore(str(tmp_path))
+    written = first.simulate(compiled, START, END)
+    assert (first.hits, first.misses) == (0, 1)
+
+    second = SharedResultStore(str(tmp_path))
+    found = second.simulate(compiled, START, END)
+    assert (second.hits, second.misses) == (1, 0)
+    assert isinstance(found.values, np.memmap)
+    expected = simulate(plan(), BRIDGES, START, END)
+    assert_same(written, expected)
+    assert_same(found, expected)
+    assert found.bridges == expected.bridges
+    # A shorter simulation is a slice of the stored one
+    assert_same(second.simulate(compiled, START, datetime(2024, 1, 1)), simulate(plan(), BRIDGES, START, datetime(2024, 1, 1)))
+    assert second.hits == 2
+    # Another plan is another entry
+    SharedResultStore(str(tmp_path)).simulate(CompiledPlan.compile(plan(200.0), BRIDGES), START, END)
+    assert second.simulate(CompiledPlan.compile(plan(200.0), BRIDGES), START, END).values[-1, 0] > found.values[-1, 0]
+
+
+def test_entries_used_longest_ago_are_evicted(tmp_path, capsys):
+    sizing = SharedResultStore(str(tmp_path / "sizing"))
+    sizing.simulate(CompiledPlan.compile(plan(), BRIDGES), START, END)
+    entry = sizing.nbytes()
+
+    store = SharedResultStore(str(tmp_path / "store"), max_bytes=int(entry * 2.5), maxsize=0)
+    for salary in (100.0, 200.0, 300.0):
+        store.simulate(CompiledPlan.compile(plan(salary), BRIDGES), START, END)
+    assert store.nbytes() <= store.max_bytes
+    assert len([e for e in os.scandir(store.directory) if e.is_dir() and e.name != "locks"]) == 2
+    # The first one was evicted, the last one is still there
+    store.simulate(CompiledPlan.compile(plan(300.0), BRIDGES), START, END)
+    assert store.hits == 1
+    store.simulate(CompiledPlan.compile(plan(100.0), BRIDGES), START, END)
+    assert store.misses == 4
+
+
+def _simulate_in_process(directory, barrier, queue):
+    store = SharedResultStore(directory)
+    barrier.wait()
+    result = store.simulate(CompiledPlan.compile(plan(), BRIDGES), START, END)
+    queue.put((store.misses, float(result.values[-1, 0])))
+
+
+def test_processes_asking_at_once_simulate_once(tmp_path):
+    context = multiprocessing.get_context("fork")
+    n = 4
+    barrier, queue = context.Barrier(n), context.Queue()
+    processes = [context.Process(target=_simulate_in_process, args=(str(tmp_path), barrier, queue)) for _ in range(n)]
+    for p in processes:
+        p.start()
+    outcomes = [queue.get(timeout=60) for _ in processes]
+    for p in processes:
+        p.join(timeout=60)
+        assert p.exitcode == 0
+    assert sum(misses for misses, _ in outcomes) == 1
+    assert len({last for _, last in outcomes}) == 1
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".")]
+
+
+def test_python_bridges_need_a_version(tmp_path, capsys):
+    compiled = CompiledPlan.compile(plan(), [DateBridge("Retire", retire, datetime(2025, 1, 1))])
+    store = SharedResultStore(str(tmp_path))
+    with pytest.raises(ValueError, match="version"):
+        store.simulate(compiled, START, END)
+    store.simulate(compiled, START, END, version="1")
+    store.simulate(compiled, START, END, version="1")
+    assert (store.hits, store.misses) == (1, 1)
+    # Changing the version is how callers tell the store the functions changed
+    store.simulate(compiled, START, END, version="2")
+    assert store.misses == 2